@@ -24,6 +24,7 @@ from interface.settings import settings
 from interface.app import create_app
 from interface.runner import runner
 from interface.git import get_forge
+from interface.db.keys import get_key_pool
 
 
 class Init:
@@ -41,6 +42,7 @@ if __name__ == "__main__":
     app = create_app()
 
     Init(app=app)
+    get_key_pool().start(app)
     # worker = runner.init_app(app)
     port = int(settings.SERVER.url.split(":").pop())
     app.run(threaded=True, host="0.0.0.0", port=port)
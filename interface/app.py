@@ -25,6 +25,7 @@ from interface.well_known import bp as well_known_bp
 from interface.user import bp as user_bp
 from interface.repo import bp as repo_bp
 from interface.issue import bp as issue_bp
+from interface.forges import http_cache
 from interface.forges.gitea.admin import get_db_user
 
 
@@ -35,6 +36,7 @@ def create_app(test_config=None):
 
     app.config.from_mapping(
         DATABASE=os.path.join(app.instance_path, "interface.db"),
+        HTTP_CACHE=os.path.join(app.instance_path, "http-cache.db"),
     )
 
     if test_config is None:
@@ -48,6 +50,7 @@ def create_app(test_config=None):
         pass
 
     db.init_app(app)
+    http_cache.init_app(app)
     with app.app_context():
         get_db_user()
 
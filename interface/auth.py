@@ -12,38 +12,89 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import base64
+import hashlib
+
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 
 
 class RSAKeyPair:
-    def __init__(self):
-        self.key = rsa.generate_private_key(
+    """
+    RSA key pair of an actor.
+
+    Use generate() to create a new key pair and from_pem() to load a stored
+    one. Stored keys are parsed only when an operation needs the private key.
+    """
+
+    def __init__(
+        self, key: rsa.RSAPrivateKey = None, pem: str = None, public_pem: str = None
+    ):
+        # RSAKeyPair() generates a new key pair
+        if key is None and pem is None:
+            key = self.__generate_key()
+        self.__key = key
+        self.__pem = pem
+        self.__public_pem = public_pem
+
+    @staticmethod
+    def __generate_key() -> rsa.RSAPrivateKey:
+        return rsa.generate_private_key(
             public_exponent=65537,
             key_size=2048,
         )
 
+    @classmethod
+    def generate(cls) -> "RSAKeyPair":
+        """Generate new key pair"""
+        return cls(key=cls.__generate_key())
+
+    @classmethod
+    def from_pem(cls, pem: str, public_pem: str = None) -> "RSAKeyPair":
+        """
+        Load key pair from PEM encoded private key. When the public key is
+        already known, it is used as is instead of being derived from the
+        private key.
+        """
+        return cls(pem=pem, public_pem=public_pem)
+
+    @property
+    def key(self) -> rsa.RSAPrivateKey:
+        if self.__key is None:
+            self.__key = serialization.load_pem_private_key(
+                self.__pem.encode("utf-8"), password=None
+            )
+        return self.__key
+
     def public_key(self):
-        key = self.key.public_key().public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo,
-        )
-        #        return key.decode("ascii")
-        return key.decode("utf-8")
+        if self.__public_pem is None:
+            key = self.key.public_key().public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+            #        return key.decode("ascii")
+            self.__public_pem = key.decode("utf-8")
+        return self.__public_pem
 
     def private_key(self):
-        pem = self.key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption(),
-        )
-        return pem.decode("utf-8")
+        if self.__pem is None:
+            pem = self.key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.TraditionalOpenSSL,
+                encryption_algorithm=serialization.NoEncryption(),
+            )
+            self.__pem = pem.decode("utf-8")
+        return self.__pem
+
+    def fingerprint(self) -> str:
+        """SHA-256 of DER encoded public key, hex encoded"""
+        lines = self.public_key().splitlines()
+        body = "".join([line for line in lines if not line.startswith("-----")])
+        return hashlib.sha256(base64.b64decode(body)).hexdigest()
 
     @classmethod
     def load_private_from_str(cls, key: str) -> "RSAKeyPair":
-        x = cls()
-        x.key = serialization.load_pem_private_key(key.encode("utf-8"), password=None)
-        return x
+        return cls.from_pem(key)
 
     @staticmethod
     def load_public_from_str(key: str):
@@ -59,3 +110,8 @@ class RSAKeyPair:
     def from_json_key(key) -> str:
         key = key.replace("\\n", "\n")
         return key
+
+
+def generate_private_key_pem() -> str:
+    """Generate PEM encoded private key. Runs in key pool worker processes"""
+    return RSAKeyPair.generate().private_key()
@@ -0,0 +1,226 @@
+"""
+Cache shared by all workers of an interface
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from interface.settings import settings
+from interface.utils import since_epoch
+
+MEMORY = "memory"
+REDIS = "redis"
+
+CACHE_BACKEND = settings.SYSTEM.get("cache_backend", MEMORY)
+REDIS_URL = settings.SYSTEM.get("redis_url", "redis://localhost:6379/0")
+# For how long an expired value is served while it is being recomputed
+CACHE_STALE_TTL = settings.SYSTEM.get("cache_stale_ttl", 60)  # in seconds
+# Upper bound on the time taken to recompute a value
+CACHE_LOCK_TIMEOUT = settings.SYSTEM.get("cache_lock_timeout", 30)  # in seconds
+# Maximum number of values held by the memory backend
+CACHE_MAX_ENTRIES = settings.SYSTEM.get("cache_max_entries", 10000)
+
+
+class MemoryBackend:
+    """
+    Cache backend local to the process. Holds at most size values, the
+    least recently used value is evicted first when it is full.
+    """
+
+    def __init__(self, size: int = CACHE_MAX_ENTRIES):
+        self.size = size
+        self.entries = OrderedDict()
+        self.locks = {}
+        self.mutex = Lock()
+
+    def get(self, key: str):
+        """Get value. Returns None if value isn't available"""
+        with self.mutex:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, expires_in: int):
+        """Store value. Value is discarded after expires_in seconds"""
+        with self.mutex:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, time.time() + expires_in)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.mutex:
+            self.entries.pop(key, None)
+
+    def lock(self, key: str, timeout: int) -> bool:
+        """Try to acquire lock on key. Lock is released after timeout seconds"""
+        now = time.time()
+        with self.mutex:
+            if self.locks.get(key, 0) > now:
+                return False
+            self.locks[key] = now + timeout
+            return True
+
+    def unlock(self, key: str):
+        with self.mutex:
+            self.locks.pop(key, None)
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.locks.clear()
+
+
+class RedisBackend:
+    """Cache backend shared by all processes connected to a Redis server"""
+
+    def __init__(self, url: str):
+        # redis is only required when it is configured as the backend
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        """Get value. Returns None if value isn't available"""
+        value = self.redis.get(key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value, expires_in: int):
+        """Store value, must be JSON serializable. Value is discarded after expires_in seconds"""
+        self.redis.set(key, json.dumps(value), ex=max(1, int(expires_in)))
+
+    def delete(self, key: str):
+        self.redis.delete(key)
+
+    def lock(self, key: str, timeout: int) -> bool:
+        """Try to acquire lock on key. Lock is released after timeout seconds"""
+        return bool(self.redis.set(f"{key}:lock", 1, nx=True, ex=max(1, timeout)))
+
+    def unlock(self, key: str):
+        self.redis.delete(f"{key}:lock")
+
+    def clear(self):
+        for key in self.redis.scan_iter(f"{Cache.PREFIX}*"):
+            self.redis.delete(key)
+
+
+class Cache:
+    """
+    Cache of computed values with stale-while-revalidate semantics.
+
+    A value is fresh for ttl seconds. After that it is served stale for
+    stale_ttl more seconds, while a single caller (the one that acquires the
+    recompute lock) computes its replacement. Callers that find no value
+    wait for the one computing it instead of computing it themselves.
+    """
+
+    PREFIX = "interface:"
+    # Interval at which callers waiting on a value poll the backend
+    POLL_INTERVAL = 0.05  # in seconds
+
+    def __init__(
+        self,
+        backend,
+        stale_ttl: int = CACHE_STALE_TTL,
+        lock_timeout: int = CACHE_LOCK_TIMEOUT,
+    ):
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+
+    def key(self, *parts) -> str:
+        return self.PREFIX + ":".join([str(part) for part in parts])
+
+    def __compute(self, key: str, compute, ttl: int):
+        value = compute()
+        self.set(key, value, ttl)
+        return value
+
+    def get_or_compute(self, key: str, compute, ttl: int):
+        """
+        Get value stored at key. compute is invoked to (re)compute the value
+        when it is missing or is older than ttl seconds
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if since_epoch() - stored_at <= ttl:
+                return value
+            if not self.backend.lock(key, self.lock_timeout):
+                # someone else is already recomputing it
+                return value
+            try:
+                return self.__compute(key, compute, ttl)
+            finally:
+                self.backend.unlock(key)
+
+        deadline = time.time() + self.lock_timeout
+        while not self.backend.lock(key, self.lock_timeout):
+            time.sleep(self.POLL_INTERVAL)
+            entry = self.backend.get(key)
+            if entry is not None:
+                return entry[0]
+            if time.time() > deadline:
+                return compute()
+        try:
+            return self.__compute(key, compute, ttl)
+        finally:
+            self.backend.unlock(key)
+
+    def get(self, key: str):
+        """Get value stored at key, fresh or stale. Returns None if value isn't available"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        return entry[0]
+
+    def set(self, key: str, value, ttl: int):
+        """Store value that is fresh for ttl seconds"""
+        self.backend.set(key, [value, since_epoch()], ttl + self.stale_ttl)
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+
+__cache = None
+__cache_lock = Lock()
+
+
+def get_cache() -> Cache:
+    """Get cache configured in settings. Shared by all threads of the process"""
+    global __cache
+    if __cache is None:
+        with __cache_lock:
+            if __cache is None:
+                if CACHE_BACKEND == REDIS:
+                    backend = RedisBackend(REDIS_URL)
+                elif CACHE_BACKEND == MEMORY:
+                    backend = MemoryBackend()
+                else:
+                    raise ValueError(f"Unknown cache backend {CACHE_BACKEND}")
+                __cache = Cache(backend)
+    return __cache
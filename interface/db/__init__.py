@@ -12,7 +12,7 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from .conn import init_app, get_db, get_git_system, init_db
+from .conn import init_app, get_db, get_git_system, init_db, unit_of_work
 
 from .interfaces import DBInterfaces, get_db_interface
 from .repo import DBRepo
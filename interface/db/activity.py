@@ -14,13 +14,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from enum import Enum, unique
 from dataclasses import dataclass
-from functools import lru_cache
+
+import click
+from flask.cli import with_appcontext
 
 from interface.settings import settings
 
+from interface.cache import get_cache
 from interface.utils import since_epoch
-from .conn import get_db
-from .cache import RecordCount, CACHE_TTL
+from .conn import get_db, commit, batches
+from .cache import RecordCount, CACHE_TTL, cache_key
 
 
 @unique
@@ -37,35 +40,52 @@ class ActivityType(Enum):
         return self.name
 
 
+DAY = 60 * 60 * 24  # in seconds
+
+
 class ActiveUsersinPeriod:
+    """
+    Number of users that have created an activity within a period.
+
+    Whole days are counted from the daily_active_users rollup, only the
+    partial day at the start of the period is read from activities.
+    """
+
     def __init__(self, since: int):
         self.since = since
 
-    @lru_cache(maxsize=1)
-    def __count(self) -> (int, int):
+    def __count(self) -> int:
         conn = get_db()
         cur = conn.cursor()
         since = since_epoch() - self.since
+        since_day = since // DAY
         count = cur.execute(
             """
-             SELECT
-                COUNT(DISTINCT user_id)
-             FROM
-                 activities
-             WHERE
-                 created >= ?;
+            SELECT COUNT(*) FROM (
+                SELECT
+                    user_id
+                FROM
+                    daily_active_users
+                WHERE
+                    day > ?
+                UNION
+                SELECT
+                    user_id
+                FROM
+                    activities
+                WHERE
+                    created >= ? AND created < ?
+            );
             """,
-            (since,),
+            (since_day, since, (since_day + 1) * DAY),
         ).fetchone()[0]
-        return (int(count), since_epoch())
+        return int(count)
 
     def count(self) -> int:
         """Get total number of records stored"""
-        (num, created_at) = self.__count()
-        if since_epoch() - created_at > CACHE_TTL:
-            self.__count.cache_clear()
-            (num, _) = self.__count()
-        return num
+        return get_cache().get_or_compute(
+            cache_key("active_users", self.since), self.__count, CACHE_TTL
+        )
 
 
 @dataclass
@@ -108,44 +128,60 @@ class DBActivity:
                 self.issue_id,
             ),
         )
-        conn.commit()
-        if self.issue_id:
-            data = cur.execute(
-                """
-                SELECT ID FROM activities
-                WHERE
-                    user_id = ?
-                AND
-                    activity = ?
-                AND
-                    created = ?
-                AND
-                    issue_id = ?
-                """,
-                (
-                    self.user_id,
-                    self.activity.value,
-                    self.created,
-                    self.issue_id,
-                ),
-            ).fetchone()
-            self.id = data[0]
-        else:
-            data = cur.execute(
-                """
-                SELECT ID FROM activities
-                WHERE
-                    user_id = ?
-                AND
-                    activity = ?
-                AND
-                    created = ?
-                AND
-                    comment_id = ?
+        self.id = cur.lastrowid
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO daily_active_users
+                (day, user_id)
+            VALUES
+                (?, ?)
+            """,
+            (self.created // DAY, self.user_id),
+        )
+        commit()
+
+    @classmethod
+    def save_many(cls, activities: "[DBActivity]"):
+        """Save activities to database with one INSERT statement per batch"""
+        conn = get_db()
+        cur = conn.cursor()
+        for batch in batches(activities, per_item=5):
+            params = []
+            for activity in batch:
+                params.extend(
+                    [
+                        activity.user_id,
+                        activity.activity.value,
+                        activity.created,
+                        activity.comment_id,
+                        activity.issue_id,
+                    ]
+                )
+            cur.execute(
+                f"""
+                INSERT INTO activities
+                    (user_id, activity, created, comment_id, issue_id)
+                VALUES
+                    {", ".join(["(?, ?, ?, ?, ?)"] * len(batch))}
                 """,
-                (self.user_id, self.activity.value, self.created, self.comment_id),
-            ).fetchone()
-            self.id = data[0]
+                params,
+            )
+            # rows inserted by a single statement get consecutive IDs
+            first_id = cur.lastrowid - len(batch) + 1
+            for offset, activity in enumerate(batch):
+                activity.id = first_id + offset
+        cur.executemany(
+            """
+            INSERT OR IGNORE INTO daily_active_users
+                (day, user_id)
+            VALUES
+                (?, ?)
+            """,
+            set(
+                [(activity.created // DAY, activity.user_id) for activity in activities]
+            ),
+        )
+        commit()
 
     @classmethod
     def load_with_db_id(cls, db_id: int) -> "DBActivity":
@@ -178,3 +214,52 @@ class DBActivity:
             id=db_id,
         )
         return val
+
+
+def backfill_active_users(days_per_batch: int = 30) -> int:
+    """
+    Populate daily_active_users from activities. Activities are processed
+    days_per_batch days at a time, committing after every batch so that the
+    database isn't locked for the whole run.
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    (first, last) = cur.execute(
+        """
+        SELECT
+            (SELECT MIN(created) FROM activities),
+            (SELECT MAX(created) FROM activities);
+        """
+    ).fetchone()
+    if first is None:
+        return 0
+
+    rows = 0
+    start = (first // DAY) * DAY
+    while start <= last:
+        end = start + days_per_batch * DAY
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO daily_active_users
+                (day, user_id)
+            SELECT DISTINCT
+                created / ?, user_id
+            FROM
+                activities
+            WHERE
+                created >= ? AND created < ?
+            """,
+            (DAY, start, end),
+        )
+        rows += cur.rowcount
+        commit()
+        start = end
+    return rows
+
+
+@click.command("backfill-active-users")
+@with_appcontext
+def backfill_active_users_command():
+    """Populate daily active users rollup from existing activities CLI handler"""
+    rows = backfill_active_users()
+    click.echo(f"Added {rows} daily active user records")
@@ -12,32 +12,42 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from functools import lru_cache
+from flask import current_app
 
 from interface.settings import settings
+from interface.cache import get_cache
 
-from interface.utils import since_epoch
 from .conn import get_db
 
 CACHE_TTL = settings.SYSTEM.cache_ttl  # in seconds
 CACHE_TTL = CACHE_TTL if CACHE_TTL is not None else 1800  # in seconds
 
 
+def cache_key(*parts) -> str:
+    """Cache key for a value computed from the database of the current app"""
+    return get_cache().key("db", current_app.config["DATABASE"], *parts)
+
+
 class RecordCount:
+    """
+    Number of rows in a table. Counts are kept exact by triggers on the table
+    (see table_stats migration), so reading them doesn't scan the table.
+    """
+
     def __init__(self, table_name: str):
         self.table_name = table_name
 
-    @lru_cache(maxsize=1)
-    def __count(self) -> (int, int):
+    def __count(self) -> int:
         conn = get_db()
         cur = conn.cursor()
-        count = cur.execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
-        return (int(count), since_epoch())
+        count = cur.execute(
+            "SELECT row_count FROM table_stats WHERE table_name = ?;",
+            (self.table_name,),
+        ).fetchone()[0]
+        return int(count)
 
     def count(self) -> int:
         """Get total number of records stored"""
-        (num, created_at) = self.__count()
-        if since_epoch() - created_at > CACHE_TTL:
-            self.__count.cache_clear()
-            (num, _) = self.__count()
-        return num
+        return get_cache().get_or_compute(
+            cache_key("record_count", self.table_name), self.__count, CACHE_TTL
+        )
@@ -17,7 +17,8 @@ from datetime import datetime
 from dateutil.parser import parse as date_parse
 
 
-from .conn import get_db
+from .conn import get_db, commit, unit_of_work, batches
+from .identity import get_identity_map
 from .users import DBUser
 from .repo import DBRepo
 from .issues import DBIssue
@@ -58,7 +59,8 @@ class DBComment:
         """
         comment = from_db
         if from_db is None:
-            comment = self.load_from_id(self.id)
+            with get_identity_map().fresh():
+                comment = self.load_from_id(self.id)
         if any([comment.body != self.body, comment.updated != self.updated]):
             conn = get_db()
             cur = conn.cursor()
@@ -73,7 +75,8 @@ class DBComment:
                 """,
                 (self.body, self.updated, self.comment_id),
             )
-            conn.commit()
+            commit()
+            get_identity_map().evict(DBComment, self.id)
             DBActivity(
                 user_id=self.user.id,
                 activity=ActivityType.UPDATE,
@@ -84,186 +87,324 @@ class DBComment:
     def save(self):
         """Save COmment to database"""
 
-        comment = self.load_from_comment_url(self.html_url)
-        if comment is not None:
-            self.id = comment.id
-            self.__update(from_db=comment)
+        with unit_of_work():
+            with get_identity_map().fresh():
+                comment = self.load_from_comment_url(self.html_url)
+            if comment is not None:
+                self.id = comment.id
+                self.__update(from_db=comment)
+                return
 
-        self.user.save()
-        self.belongs_to_issue.save()
+            self.user.save()
+            self.belongs_to_issue.save()
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO gitea_issue_comments
+            conn = get_db()
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO gitea_issue_comments
+                    (
+
+                        body, html_url, created, updated,
+                        comment_id, is_native, user,
+                        belongs_to_issue
+
+                    )
+                    VALUES (
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?
+                    )
+                """,
                 (
+                    self.body,
+                    self.html_url,
+                    self.created,
+                    self.updated,
+                    self.comment_id,
+                    self.is_native,
+                    self.user.id,
+                    self.belongs_to_issue.id,
+                ),
+            )
+            self.id = cur.lastrowid
+            commit()
+            DBActivity(
+                user_id=self.user.id,
+                activity=ActivityType.CREATE,
+                created=self.created,
+                comment_id=self.id,
+            ).save()
+
+    @classmethod
+    def save_many(cls, comments: "[DBComment]"):
+        """
+        Save comments to database.
+        Authors and issues are resolved in bulk, new and changed comments are
+        written with an executemany each and their activities are saved in
+        one statement.
+        """
+        with unit_of_work():
+            DBUser.save_many([comment.user for comment in comments])
+            DBIssue.save_many(
+                list(
+                    {
+                        id(c.belongs_to_issue): c.belongs_to_issue for c in comments
+                    }.values()
+                )
+            )
+
+            conn = get_db()
+            cur = conn.cursor()
+            # comments are unique by both html_url and comment_id, a stored
+            # comment may match on either of them
+            stored_urls = {}
+            stored_ids = {}
+            for (column, keys) in [
+                ("html_url", [comment.html_url for comment in comments]),
+                ("comment_id", [comment.comment_id for comment in comments]),
+            ]:
+                for batch in batches(list(dict.fromkeys(keys))):
+                    data = cur.execute(
+                        f"""
+                        SELECT
+                            ID, html_url, comment_id, body, updated
+                        FROM
+                            gitea_issue_comments
+                        WHERE
+                            {column} IN ({", ".join(["?"] * len(batch))})
+                        """,
+                        batch,
+                    ).fetchall()
+                    for row in data:
+                        stored_urls[row["html_url"]] = row
+                        stored_ids[row["comment_id"]] = row
+
+            created = {}
+            created_urls = {}
+            updated = {}
+            for comment in comments:
+                row = stored_ids.get(comment.comment_id)
+                if row is None:
+                    row = stored_urls.get(comment.html_url)
+                if row is None:
+                    # the same comment may be listed more than once
+                    if all(
+                        [
+                            comment.comment_id not in created,
+                            comment.html_url not in created_urls,
+                        ]
+                    ):
+                        created[comment.comment_id] = comment
+                        created_urls[comment.html_url] = comment.comment_id
+                    continue
+                comment.id = row["ID"]
+                if any(
+                    [row["body"] != comment.body, row["updated"] != comment.updated]
+                ):
+                    updated[comment.id] = comment
+
+            cur.executemany(
+                """
+                INSERT INTO gitea_issue_comments
+                    (
+                        body, html_url, created, updated,
+                        comment_id, is_native, user,
+                        belongs_to_issue
+                    )
+                    VALUES (
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?
+                    )
+                """,
+                [
+                    (
+                        comment.body,
+                        comment.html_url,
+                        comment.created,
+                        comment.updated,
+                        comment.comment_id,
+                        comment.is_native,
+                        comment.user.id,
+                        comment.belongs_to_issue.id,
+                    )
+                    for comment in created.values()
+                ],
+            )
+            cur.executemany(
+                """
+                UPDATE gitea_issue_comments
+                SET
+                    body = ?,
+                    updated = ?
+                WHERE
+                    ID = ?;
+                """,
+                [
+                    (comment.body, comment.updated, comment.id)
+                    for comment in updated.values()
+                ],
+            )
 
-                    body, html_url, created, updated,
-                    comment_id, is_native, user,
-                    belongs_to_issue 
+            for batch in batches(list(created.keys())):
+                data = cur.execute(
+                    f"""
+                    SELECT ID, comment_id FROM gitea_issue_comments
+                    WHERE comment_id IN ({", ".join(["?"] * len(batch))})
+                    """,
+                    batch,
+                ).fetchall()
+                for row in data:
+                    created[row["comment_id"]].id = row["ID"]
+            for comment in comments:
+                if comment.comment_id in created:
+                    comment.id = created[comment.comment_id].id
+                elif comment.html_url in created_urls:
+                    comment.id = created[created_urls[comment.html_url]].id
 
+            identity_map = get_identity_map()
+            activities = []
+            for comment in created.values():
+                activities.append(
+                    DBActivity(
+                        user_id=comment.user.id,
+                        activity=ActivityType.CREATE,
+                        created=comment.created,
+                        comment_id=comment.id,
+                    )
                 )
-                VALUES (
-                    ?, ?, ?, ?,
-                    ?, ?,
-                    (SELECT ID from gitea_users WHERE user_id  = ?),
-                    (SELECT ID from gitea_forge_issues WHERE html_url  = ?)
+            for comment in updated.values():
+                identity_map.evict(DBComment, comment.id)
+                activities.append(
+                    DBActivity(
+                        user_id=comment.user.id,
+                        activity=ActivityType.UPDATE,
+                        created=comment.updated,
+                        comment_id=comment.id,
+                    )
                 )
-            """,
-            (
-                self.body,
-                self.html_url,
-                self.created,
-                self.updated,
-                self.comment_id,
-                self.is_native,
-                self.user.user_id,
-                self.belongs_to_issue.html_url,
-            ),
-        )
-        conn.commit()
-        data = cur.execute(
-            """
-            SELECT ID from gitea_issue_comments WHERE html_url = ?
-            """,
-            (self.html_url,),
-        ).fetchone()
-        self.id = data[0]
-        self.__update()
-        DBActivity(
-            user_id=self.user.id,
-            activity=ActivityType.CREATE,
-            created=self.created,
-            comment_id=self.id,
-        ).save()
+            DBActivity.save_many(activities)
+
+    COLUMNS = [
+        "ID",
+        "body",
+        "html_url",
+        "created",
+        "updated",
+        "comment_id",
+        "is_native",
+    ]
 
     @classmethod
-    def load_from_comment_url(cls, comment_url: str) -> "DBComment":
-        """Load comment based on comment URL from database"""
-        conn = get_db()
-        cur = conn.cursor()
-        data = cur.execute(
-            """
-         SELECT
-             body,
-             belongs_to_issue,
-             created,
-             updated,
-             comment_id,
-             is_native,
-             user,
-             ID
-         FROM
-             gitea_issue_comments
-         WHERE
-             html_url = ?
-             """,
-            (comment_url,),
-        ).fetchone()
-        if data is None:
-            return None
+    def columns(cls, alias: str) -> str:
+        """Columns required by from_row, qualified with table alias"""
+        return ", ".join([f"{alias}.{col} AS {alias}_{col}" for col in cls.COLUMNS])
+
+    @classmethod
+    def from_row(
+        cls, row, alias: str, user: DBUser, belongs_to_issue: DBIssue
+    ) -> "DBComment":
+        """Hydrate comment from a row selected with columns(alias)"""
+        identity_map = get_identity_map()
+        comment = identity_map.get(cls, row[f"{alias}_ID"])
+        if comment is not None:
+            return comment
 
-        user = DBUser.load_with_db_id(data[6])
-        belongs_to_issue = DBIssue.load_with_id(data[1])
         comment = cls(
-            body=data[0],
-            html_url=comment_url,
-            created=data[2],
-            updated=data[3],
-            comment_id=data[4],
-            is_native=data[5],
+            body=row[f"{alias}_body"],
+            html_url=row[f"{alias}_html_url"],
+            created=row[f"{alias}_created"],
+            updated=row[f"{alias}_updated"],
+            comment_id=row[f"{alias}_comment_id"],
+            is_native=row[f"{alias}_is_native"],
             user=user,
             belongs_to_issue=belongs_to_issue,
         )
-        comment.id = data[7]
+        comment.id = row[f"{alias}_ID"]
         comment.__set_sqlite_to_bools()
-        return comment
+        return identity_map.add(comment, ("html_url", comment.html_url))
 
     @classmethod
-    def load_from_id(cls, db_id: int) -> "DBComment":
-        """Load comment based on ID assigned by database"""
+    def __load_one(cls, where: str, param) -> "DBComment":
+        """
+        Load comment, its author and the issue it belongs to(along with
+        the issue's repository, owner and author) in a single query
+        """
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
+            f"""
          SELECT
-             body,
-             belongs_to_issue,
-             created,
-             updated,
-             comment_id,
-             is_native,
-             user,
-             html_url
+             {cls.columns("c")},
+             {DBUser.columns("a")},
+             {DBIssue.columns("i")},
+             {DBRepo.columns("r")},
+             {DBUser.columns("o")},
+             {DBUser.columns("u")}
          FROM
-             gitea_issue_comments
+             gitea_issue_comments AS c
+         INNER JOIN gitea_users AS a ON a.ID = c.user
+         INNER JOIN gitea_forge_issues AS i ON i.ID = c.belongs_to_issue
+         INNER JOIN gitea_forge_repositories AS r ON r.ID = i.repository
+         INNER JOIN gitea_users AS o ON o.ID = r.owner_id
+         INNER JOIN gitea_users AS u ON u.ID = i.user_id
          WHERE
-             ID = ?
+             {where}
              """,
-            (db_id,),
+            (param,),
         ).fetchone()
         if data is None:
             return None
 
-        user = DBUser.load_with_db_id(data[6])
-        belongs_to_issue = DBIssue.load_with_id(data[1])
-        comment = cls(
-            body=data[0],
-            html_url=data[7],
-            created=data[2],
-            updated=data[3],
-            comment_id=data[4],
-            is_native=data[5],
-            user=user,
-            belongs_to_issue=belongs_to_issue,
+        return cls.from_row(
+            data,
+            "c",
+            user=DBUser.from_row(data, "a"),
+            belongs_to_issue=DBIssue.from_row(data, "i"),
         )
-        comment.__set_sqlite_to_bools()
-        return comment
+
+    @classmethod
+    def load_from_comment_url(cls, comment_url: str) -> "DBComment":
+        """Load comment based on comment URL from database"""
+        comment = get_identity_map().get(cls, ("html_url", comment_url))
+        if comment is not None:
+            return comment
+        return cls.__load_one("c.html_url = ?", comment_url)
+
+    @classmethod
+    def load_from_id(cls, db_id: int) -> "DBComment":
+        """Load comment based on ID assigned by database"""
+        comment = get_identity_map().get(cls, db_id)
+        if comment is not None:
+            return comment
+        return cls.__load_one("c.ID = ?", db_id)
 
     @classmethod
     def load_issue_comments(cls, issue: DBIssue) -> "[DBComment]":
-        """Load comments belonging to an issue from database"""
+        """
+        Load comments belonging to an issue from database.
+        Comments and their authors are fetched in a single query.
+        """
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
+            f"""
          SELECT
-             body,
-             html_url,
-             created,
-             updated,
-             comment_id,
-             is_native,
-             user,
-             ID
+             {cls.columns("c")},
+             {DBUser.columns("a")}
          FROM
-             gitea_issue_comments
+             gitea_issue_comments AS c
+         INNER JOIN gitea_users AS a ON a.ID = c.user
          WHERE
-             belongs_to_issue = ?
-         ORDER BY created
+             c.belongs_to_issue = ?
+         ORDER BY c.created
              """,
             (issue.id,),
         ).fetchall()
-        if data is None:
-            return None
 
         comments = []
-        for comment in data:
-            user = DBUser.load_with_db_id(comment[6])
-            obj = cls(
-                body=comment[0],
-                html_url=comment[1],
-                created=comment[2],
-                updated=comment[3],
-                comment_id=comment[4],
-                is_native=comment[5],
-                user=user,
-                belongs_to_issue=issue,
-            )
-            obj.id = comment[7]
-            obj.__set_sqlite_to_bools()
-            comments.append(obj)
+        for row in data:
+            user = DBUser.from_row(row, "a")
+            comments.append(cls.from_row(row, "c", user=user, belongs_to_issue=issue))
 
         if len(comments) == 0:
             return None
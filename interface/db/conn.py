@@ -15,6 +15,9 @@
 
 import sqlite3
 import os
+from contextlib import contextmanager
+from queue import LifoQueue, Empty, Full
+from threading import Lock
 
 import click
 from flask import current_app, g
@@ -26,16 +29,179 @@ from libgit import System
 from interface.settings import settings
 
 
+POOL_SIZE = settings.SYSTEM.get("db_pool_size", 8)
+BUSY_TIMEOUT = settings.SYSTEM.get("db_busy_timeout", 5000)  # in milliseconds
+MMAP_SIZE = settings.SYSTEM.get("db_mmap_size", 64 * 1024 * 1024)  # in bytes
+STATEMENT_CACHE_SIZE = settings.SYSTEM.get("db_statement_cache_size", 256)
+# SQLITE_MAX_VARIABLE_NUMBER of SQLite releases older than 3.32.0
+MAX_VARIABLES = 999
+
+
+def batches(items: list, per_item: int = 1):
+    """
+    Split items into batches small enough to be bound to a single statement
+    when every item takes per_item parameters
+    """
+    size = max(1, MAX_VARIABLES // per_item)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections to a single database file.
+
+    Connections are configured once, when they are opened, and are reused
+    across Flask app contexts and threads. A connection is only ever used by
+    the app context that acquired it, so check_same_thread is disabled.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE):
+        self.database = database
+        self.size = size
+        self.idle = LifoQueue(maxsize=size)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while a single writer commits
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT)};")
+        # NORMAL is durable across application crashes in WAL mode
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)};")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Get an idle connection or open a new one"""
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection):
+        """
+        Return connection to the pool. Uncommitted changes are rolled back.
+        Connections in excess of the pool size are closed.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self.idle.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                break
+
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def get_pool(database: str) -> ConnectionPool:
+    """Get connection pool of database"""
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = ConnectionPool(database)
+        return _pools[database]
+
+
+def close_pool(database: str):
+    """Close all idle connections to database and forget its pool"""
+    with _pools_lock:
+        pool = _pools.pop(database, None)
+    if pool is not None:
+        pool.close()
+
+
 def get_db() -> sqlite3.Connection:
     """Get database connection"""
     if "db" not in g:
-        g.db = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool(current_app.config["DATABASE"]).acquire()
     return g.db
 
 
+def commit():
+    """
+    Commit changes made on the connection returned by get_db.
+    When a unit of work is open, changes are committed when it closes instead.
+    """
+    if g.get("unit_of_work", 0) > 0:
+        return
+    get_db().commit()
+
+
+def after_commit(callback, *args):
+    """
+    Call callback with args once changes made so far on the connection
+    returned by get_db are committed. Outside of a unit of work they already
+    are, so it is called right away; callbacks registered within a unit of
+    work are dropped if the changes they follow are rolled back.
+    """
+    if g.get("unit_of_work", 0) > 0:
+        g.after_commit.append((callback, args))
+    else:
+        callback(*args)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Run all writes within the block in a single transaction.
+
+    Model save() calls made within the block join the transaction instead
+    of committing on their own. The outermost block commits when it exits
+    and rolls back if it raises. Nested blocks are savepoints: an exception
+    that escapes a nested block only discards that block's changes. The
+    outermost block takes the write lock when it opens, so other writers
+    wait (up to busy_timeout) instead of failing part way through.
+    """
+    conn = get_db()
+    depth = g.get("unit_of_work", 0)
+    savepoint = f"unit_of_work_{depth}"
+    if depth > 0:
+        conn.execute(f"SAVEPOINT {savepoint};")
+    else:
+        g.after_commit = []
+        if not conn.in_transaction:
+            # saves read before they write; a deferred transaction would fail
+            # with SQLITE_BUSY_SNAPSHOT when another connection commits in between
+            conn.execute("BEGIN IMMEDIATE;")
+    callbacks = len(g.after_commit)
+    g.unit_of_work = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        g.unit_of_work = depth
+        del g.after_commit[callbacks:]
+        if depth > 0:
+            conn.execute(f"ROLLBACK TO {savepoint};")
+            conn.execute(f"RELEASE {savepoint};")
+        else:
+            conn.rollback()
+        # objects loaded during the block may describe rows that no longer exist
+        g.pop("identity_map", None)
+        raise
+    g.unit_of_work = depth
+    if depth > 0:
+        conn.execute(f"RELEASE {savepoint};")
+    else:
+        conn.commit()
+        for (callback, args) in g.pop("after_commit"):
+            callback(*args)
+
+
 def get_git_system() -> System:
     """Get git system"""
     if "git_system" not in g:
@@ -47,7 +213,7 @@ def close_db(e=None):
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        get_pool(current_app.config["DATABASE"]).release(db)
 
 
 def init_db():
@@ -74,3 +240,9 @@ def init_app(app):
         init_db()
     app.teardown_appcontext(close_db)
     app.cli.add_command(migrate_db_command)
+
+    from .activity import backfill_active_users_command
+    from .keys import key_pool_command
+
+    app.cli.add_command(backfill_active_users_command)
+    app.cli.add_command(key_pool_command)
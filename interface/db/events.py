@@ -27,7 +27,7 @@ from interface.forges.payload import (
     CommentOnIssue,
 )
 from interface.utils import since_epoch
-from .conn import get_db
+from .conn import get_db, commit
 from .interfaces import DBInterfaces
 
 
@@ -87,7 +87,7 @@ class DBTask:
                 self.id,
             ),
         )
-        conn.commit()
+        commit()
 
     def set_completed(self):
         """Set job status to completed"""
@@ -128,18 +128,8 @@ class DBTask:
                         self.scheduled_by.url,
                     ),
                 )
-                conn.commit()
-                data = cur.execute(
-                    """
-                    SELECT ID FROM tasks
-                    WHERE
-                        job_id = ?
-                    AND
-                        scheduled_by = (SELECT ID FROM interfaces WHERE url = ?);
-                    """,
-                    (str(self.uuid), self.scheduled_by.url),
-                ).fetchone()
-                self.id = data[0]
+                self.id = cur.lastrowid
+                commit()
                 break
             except Exception as e:
                 self.uuid = uuid4()
@@ -247,16 +237,8 @@ class DBTaskJson:
             """,
             (json.dumps(asdict(self.message)), str(self.job_uuid)),
         )
-        conn.commit()
-        data = cur.execute(
-            """
-            SELECT ID FROM tasks_json
-            WHERE
-                task_id = (SELECT ID FROM tasks WHERE job_id =?)
-            """,
-            (str(self.job_uuid),),
-        ).fetchone()
-        self.id = data[0]
+        self.id = cur.lastrowid
+        commit()
 
     @classmethod
     def load_with_job_id(cls, job_id: UUID) -> "DBTaskJson":
@@ -275,9 +257,9 @@ class DBTaskJson:
              FROM
                  tasks_json
              WHERE
-                task_id = (SELECT ID FROM tasks WHERE job_id =?)
+                task_id = ?
             """,
-            (str(job_id),),
+            (task.id,),
         ).fetchone()
         if data is None:
             return None
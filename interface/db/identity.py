@@ -0,0 +1,74 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from contextlib import contextmanager
+
+from flask import g
+
+
+class IdentityMap:
+    """
+    Objects loaded from the database during the lifetime of an app context.
+
+    Entries are keyed by (model, database ID). Loaders that look rows up by
+    some other unique key (user_id, html_url, etc.) register that key as an
+    alias of the database ID.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.__bypass = 0
+
+    def get(self, model, key):
+        """Get already hydrated object. key is either a database ID or an alias"""
+        if self.__bypass > 0:
+            return None
+        return self.models.get(model, {}).get(key)
+
+    def add(self, obj, *aliases):
+        """Register object loaded from the database"""
+        if self.__bypass > 0 or obj.id is None:
+            return obj
+        entries = self.models.setdefault(type(obj), {})
+        entries[obj.id] = obj
+        for alias in aliases:
+            entries[alias] = obj
+        return obj
+
+    def evict(self, model, db_id):
+        """Remove object and all of its aliases. To be invoked after every write"""
+        entries = self.models.get(model)
+        if entries is None or db_id is None:
+            return
+        for key in [key for (key, obj) in entries.items() if obj.id == db_id]:
+            del entries[key]
+
+    @contextmanager
+    def fresh(self):
+        """
+        Read through to the database. Used when the stored row has to be
+        compared against an object that might have been mutated in memory.
+        """
+        self.__bypass += 1
+        try:
+            yield self
+        finally:
+            self.__bypass -= 1
+
+
+def get_identity_map() -> IdentityMap:
+    """Get identity map of the current app context"""
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
@@ -16,7 +16,7 @@ from dataclasses import dataclass
 from interface.settings import settings
 from flask import g
 
-from .conn import get_db
+from .conn import get_db, commit
 
 
 @dataclass
@@ -31,7 +31,7 @@ class DBInterfaces:
         conn = get_db()
         cur = conn.cursor()
         cur.execute("INSERT OR IGNORE INTO interfaces (url) VALUES (?);", (self.url,))
-        conn.commit()
+        commit()
 
     @classmethod
     def load_from_url(cls, url: str) -> "DBInterfaces":
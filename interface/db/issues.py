@@ -15,17 +15,19 @@
 from dataclasses import dataclass
 from datetime import datetime
 from dateutil.parser import parse as date_parse
-from sqlite3 import IntegrityError
 
 from interface.auth import RSAKeyPair
 from interface.utils import date_from_string, CONTENT_TYPE_ACTIVITY_JSON
 
-from .conn import get_db
+from .conn import get_db, commit, after_commit, unit_of_work, batches
+from .identity import get_identity_map
+from .keys import get_key_pool, save_key, key_columns, key_from_row
 from .users import DBUser
 from .repo import DBRepo
 from .interfaces import DBInterfaces
-from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN
+from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN, cache_webfinger
 from .activity import ActivityType, DBActivity
+from .render import ISSUE, invalidate_actor
 
 OPEN = "open"
 MERGED = "merged"
@@ -67,6 +69,14 @@ class DBIssue:
         self.is_native = bool(self.is_native)
         self.is_closed = bool(self.is_closed)
 
+    def __aliases(self) -> [tuple]:
+        """Keys other than database ID that this issue can be loaded with"""
+        return [
+            ("repo_scope_id", self.repository.id, str(self.repo_scope_id)),
+            ("html_url", self.html_url),
+            ("actor_name", self.actor_name()),
+        ]
+
     def state(self) -> str:
         """Get state of an issue"""
         # if is_merged is None, then issue is an Issue and not a PR
@@ -132,7 +142,8 @@ class DBIssue:
         """
         issue = from_db
         if from_db is None:
-            issue = self.load_with_id(db_id=self.id)
+            with get_identity_map().fresh():
+                issue = self.load_with_id(db_id=self.id)
         if any(
             [
                 issue.title != self.title,
@@ -164,7 +175,9 @@ class DBIssue:
                     self.id,
                 ),
             )
-            conn.commit()
+            commit()
+            get_identity_map().evict(DBIssue, self.id)
+            after_commit(invalidate_actor, ISSUE, self.actor_name())
             DBActivity(
                 user_id=self.user.id,
                 activity=ActivityType.UPDATE,
@@ -172,136 +185,329 @@ class DBIssue:
                 issue_id=self.id,
             ).save()
 
+    def __use_stored(self) -> bool:
+        """
+        Take ID, key, author and repository of the stored issue and write out
+        changes made to it. Returns False if it isn't stored
+        """
+        with get_identity_map().fresh():
+            issue = self.load(self.repository, self.repo_scope_id)
+        if issue is None:
+            return False
+        self.private_key = issue.private_key
+        self.user = issue.user
+        self.repository = issue.repository
+        self.id = issue.id
+        self.__update(from_db=issue)
+        return True
+
     def save(self):
         """Save Issue to database"""
 
-        issue = self.load(self.repository, self.repo_scope_id)
-        if issue is not None:
-            self.private_key = issue.private_key
-            self.user = issue.user
-            self.repository = issue.repository
-            self.id = issue.id
-            self.__update(from_db=issue)
-            return
-
         self.user.save()
         self.repository.save()
+        with unit_of_work():
+            if self.__use_stored():
+                return
 
-        conn = get_db()
-        cur = conn.cursor()
-        count = 0
-        while True:
-            try:
-                self.private_key = RSAKeyPair()
-
-                cur.execute(
-                    """
-                    INSERT INTO gitea_forge_issues
-                        (
-                            title, description, html_url, created,
-                            updated, is_closed, is_merged, is_native,
-                            repo_scope_id, user_id, repository, private_key
-                        )
-                        VALUES (
-                            ?, ?, ?, ?,
-                            ?, ?, ?, ?,
-                            ?,
-                            (SELECT ID FROM gitea_users WHERE user_id  = ?),
-                            ?,
-                            ?)
-                    """,
+        # generating a key may take a while, it mustn't hold the write lock
+        (spare,) = get_key_pool().take()
+        with unit_of_work():
+            # stored by someone else while we were waiting for the write lock
+            if self.__use_stored():
+                return
+
+            conn = get_db()
+            cur = conn.cursor()
+            self.private_key = get_key_pool().claim(spare)
+            key_id = save_key(self.private_key)
+            cur.execute(
+                """
+                INSERT INTO gitea_forge_issues
                     (
-                        self.title,
-                        self.description,
-                        self.html_url,
-                        self.created,
-                        self.updated,
-                        self.is_closed,
-                        self.is_merged,
-                        self.is_native,
-                        self.repo_scope_id,
-                        self.user.user_id,
-                        self.repository.id,
-                        self.private_key.private_key(),
-                    ),
-                )
-                conn.commit()
+                        title, description, html_url, created,
+                        updated, is_closed, is_merged, is_native,
+                        repo_scope_id, user_id, repository, key_id,
+                        actor_name
+                    )
+                    VALUES (
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?,
+                        ?)
+                """,
+                (
+                    self.title,
+                    self.description,
+                    self.html_url,
+                    self.created,
+                    self.updated,
+                    self.is_closed,
+                    self.is_merged,
+                    self.is_native,
+                    self.repo_scope_id,
+                    self.user.id,
+                    self.repository.id,
+                    key_id,
+                    self.actor_name(),
+                ),
+            )
+            self.id = cur.lastrowid
+            commit()
+            after_commit(invalidate_actor, ISSUE, self.actor_name())
+            after_commit(cache_webfinger, self)
+            DBActivity(
+                user_id=self.user.id,
+                activity=ActivityType.CREATE,
+                created=self.created,
+                issue_id=self.id,
+            ).save()
+
+    @classmethod
+    def __load_stored(cls, urls: [str]) -> "{str: sqlite3.Row}":
+        """Stored rows of issues with html_urls, for save_many"""
+        cur = get_db().cursor()
+        stored = {}
+        for batch in batches(urls):
+            data = cur.execute(
+                f"""
+                SELECT
+                    i.ID, i.html_url, i.title, i.description,
+                    i.is_closed, i.is_merged, i.key_id, {key_columns("i")}
+                FROM
+                    gitea_forge_issues AS i
+                WHERE
+                    html_url IN ({", ".join(["?"] * len(batch))})
+                """,
+                batch,
+            ).fetchall()
+            for row in data:
+                stored[row["html_url"]] = row
+        return stored
+
+    @classmethod
+    def save_many(cls, issues: "[DBIssue]"):
+        """
+        Save issues to database.
+        Authors are resolved in bulk, new and changed issues are upserted with
+        a single executemany and their activities are saved in one statement.
+        """
+        DBUser.save_many([issue.user for issue in issues])
+        for repository in {id(i.repository): i.repository for i in issues}.values():
+            repository.save()
+
+        urls = list(dict.fromkeys([issue.html_url for issue in issues]))
+        # generating keys may take a while, it mustn't hold the write lock
+        spares = get_key_pool().take(len(urls) - len(cls.__load_stored(urls)))
+        with unit_of_work():
+            conn = get_db()
+            cur = conn.cursor()
+            stored = cls.__load_stored(urls)
+            created = {}
+            updated = {}
+            key_ids = {}
+            for issue in issues:
+                row = stored.get(issue.html_url)
+                if row is None:
+                    # the same issue may be listed more than once, the first
+                    # copy is inserted and the others take its ID and key
+                    if created.setdefault(issue.html_url, issue) is issue:
+                        # issues deleted since spares were taken
+                        if len(spares) == 0:
+                            spares = get_key_pool().take()
+                        issue.private_key = get_key_pool().claim(spares.pop())
+                        key_ids[issue.html_url] = save_key(issue.private_key)
+                    continue
+                issue.id = row["ID"]
+                issue.private_key = key_from_row(row, "i")
+                key_ids[issue.html_url] = row["key_id"]
+                is_merged = None if row["is_merged"] is None else bool(row["is_merged"])
+                if any(
+                    [
+                        row["title"] != issue.title,
+                        row["description"] != issue.description,
+                        bool(row["is_closed"]) != issue.is_closed,
+                        is_merged != issue.is_merged,
+                    ]
+                ):
+                    updated[issue.html_url] = issue
+
+            cur.executemany(
+                """
+                INSERT INTO gitea_forge_issues
+                    (
+                        title, description, html_url, created,
+                        updated, is_closed, is_merged, is_native,
+                        repo_scope_id, user_id, repository, key_id,
+                        actor_name
+                    )
+                    VALUES (
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?,
+                        ?, ?, ?, ?,
+                        ?)
+                ON CONFLICT(html_url) DO UPDATE SET
+                    title = excluded.title,
+                    description = excluded.description,
+                    updated = excluded.updated,
+                    is_closed = excluded.is_closed,
+                    is_merged = excluded.is_merged
+                """,
+                [
+                    (
+                        issue.title,
+                        issue.description,
+                        issue.html_url,
+                        issue.created,
+                        issue.updated,
+                        issue.is_closed,
+                        issue.is_merged,
+                        issue.is_native,
+                        issue.repo_scope_id,
+                        issue.user.id,
+                        issue.repository.id,
+                        key_ids[issue.html_url],
+                        issue.actor_name(),
+                    )
+                    for issue in list(created.values()) + list(updated.values())
+                ],
+            )
+
+            for batch in batches(list(created.keys())):
                 data = cur.execute(
-                    """
-                    SELECT ID FROM gitea_forge_issues
-                    WHERE html_url = ?
+                    f"""
+                    SELECT ID, html_url FROM gitea_forge_issues
+                    WHERE html_url IN ({", ".join(["?"] * len(batch))})
                     """,
-                    (self.html_url,),
-                ).fetchone()
-                if data is None:
-                    raise ValueError("Issue ID can't be none")
-                self.id = data[0]
-                DBActivity(
-                    user_id=self.user.id,
-                    activity=ActivityType.CREATE,
-                    created=self.created,
-                    issue_id=self.id,
-                ).save()
-
-                break
-            except IntegrityError as e:
-                count += 1
-                if count > 5:
-                    raise e
-                continue
-        self.__update()
+                    batch,
+                ).fetchall()
+                for row in data:
+                    created[row["html_url"]].id = row["ID"]
+            for issue in issues:
+                if issue.html_url in created:
+                    issue.id = created[issue.html_url].id
+                    issue.private_key = created[issue.html_url].private_key
+
+            identity_map = get_identity_map()
+            activities = []
+            for issue in list(created.values()) + list(updated.values()):
+                after_commit(invalidate_actor, ISSUE, issue.actor_name())
+            for issue in created.values():
+                after_commit(cache_webfinger, issue)
+                activities.append(
+                    DBActivity(
+                        user_id=issue.user.id,
+                        activity=ActivityType.CREATE,
+                        created=issue.created,
+                        issue_id=issue.id,
+                    )
+                )
+            for issue in updated.values():
+                identity_map.evict(DBIssue, issue.id)
+                activities.append(
+                    DBActivity(
+                        user_id=issue.user.id,
+                        activity=ActivityType.UPDATE,
+                        created=issue.updated,
+                        issue_id=issue.id,
+                    )
+                )
+            DBActivity.save_many(activities)
+
+    COLUMNS = [
+        "ID",
+        "title",
+        "description",
+        "html_url",
+        "created",
+        "updated",
+        "is_closed",
+        "is_merged",
+        "is_native",
+        "repo_scope_id",
+    ]
+
+    @classmethod
+    def columns(cls, alias: str) -> str:
+        """
+        Columns required by from_row, qualified with table alias.
+        Rows must also contain DBRepo.columns("r") of the issue's repository,
+        DBUser.columns("o") of the repository owner and DBUser.columns("u") of
+        the issue author. See select().
+        """
+        columns = [f"{alias}.{col} AS {alias}_{col}" for col in cls.COLUMNS]
+        return ", ".join(columns + [key_columns(alias)])
+
+    @classmethod
+    def select(cls, alias: str) -> str:
+        """
+        SELECT statement that fetches issue, repository, repository owner and
+        issue author in a single query. Callers append the WHERE clause.
+        """
+        return f"""
+        SELECT
+            {cls.columns(alias)},
+            {DBRepo.columns("r")},
+            {DBUser.columns("o")},
+            {DBUser.columns("u")}
+        FROM
+            gitea_forge_issues AS {alias}
+        INNER JOIN gitea_forge_repositories AS r ON r.ID = {alias}.repository
+        INNER JOIN gitea_users AS o ON o.ID = r.owner_id
+        INNER JOIN gitea_users AS u ON u.ID = {alias}.user_id
+        """
+
+    @classmethod
+    def from_row(cls, row, alias: str) -> "DBIssue":
+        """Hydrate issue, its repository and author from a row selected with select(alias)"""
+        identity_map = get_identity_map()
+        issue = identity_map.get(cls, row[f"{alias}_ID"])
+        if issue is not None:
+            return issue
+
+        owner = DBUser.from_row(row, "o")
+        issue = cls(
+            id=row[f"{alias}_ID"],
+            title=row[f"{alias}_title"],
+            description=row[f"{alias}_description"],
+            html_url=row[f"{alias}_html_url"],
+            created=row[f"{alias}_created"],
+            updated=row[f"{alias}_updated"],
+            is_closed=row[f"{alias}_is_closed"],
+            is_merged=row[f"{alias}_is_merged"],
+            is_native=row[f"{alias}_is_native"],
+            repo_scope_id=row[f"{alias}_repo_scope_id"],
+            user=DBUser.from_row(row, "u"),
+            repository=DBRepo.from_row(row, "r", owner=owner),
+            private_key=key_from_row(row, alias),
+        )
+        issue.__set_sqlite_to_bools()
+        return identity_map.add(issue, *issue.__aliases())
 
     @classmethod
     def load(cls, repository: DBRepo, repo_scope_id: str) -> "DBIssue":
         """Load issue from database"""
+        issue = get_identity_map().get(
+            cls, ("repo_scope_id", repository.id, str(repo_scope_id))
+        )
+        if issue is not None:
+            return issue
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
-         SELECT
-             ID,
-             title,
-             description,
-             html_url,
-             created,
-             updated,
-             is_closed,
-             is_merged,
-             is_native,
-             user_id,
-             private_key
-        FROM
-             gitea_forge_issues
-        WHERE
-            repo_scope_id = ?
-        AND
-            repository = ?
-        """,
+            f"""
+            {cls.select("i")}
+            WHERE
+                i.repo_scope_id = ?
+            AND
+                i.repository = ?
+            """,
             (repo_scope_id, repository.id),
         ).fetchone()
         if data is None:
             return None
-
-        user = DBUser.load_with_db_id(data[9])
-
-        issue = cls(
-            id=data[0],
-            title=data[1],
-            description=data[2],
-            html_url=data[3],
-            created=data[4],
-            updated=data[5],
-            is_closed=data[6],
-            is_merged=data[7],
-            is_native=data[8],
-            repo_scope_id=repo_scope_id,
-            user=user,
-            repository=repository,
-            private_key=RSAKeyPair.load_private_from_str(data[10]),
-        )
-
-        issue.__set_sqlite_to_bools()
-        return issue
+        return cls.from_row(data, "i")
 
     @classmethod
     def load_with_id(cls, db_id: str) -> "DBIssue":
@@ -309,106 +515,67 @@ class DBIssue:
         Load issue from database using database ID
         This ID very different from the one assigned by the forge
         """
+        issue = get_identity_map().get(cls, db_id)
+        if issue is not None:
+            return issue
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
-         SELECT
-             title,
-             description,
-             html_url,
-             created,
-             updated,
-             is_closed,
-             is_merged,
-             is_native,
-             repo_scope_id,
-             user_id,
-             repository,
-             private_key
-        FROM
-             gitea_forge_issues
-        WHERE
-            ID = ?
-        """,
+            f"""
+            {cls.select("i")}
+            WHERE
+                i.ID = ?
+            """,
             (db_id,),
         ).fetchone()
         if data is None:
             return None
-
-        user = DBUser.load_with_db_id(data[9])
-        repository = DBRepo.load_with_id(data[10])
-
-        issue = cls(
-            id=db_id,
-            title=data[0],
-            description=data[1],
-            html_url=data[2],
-            created=data[3],
-            updated=data[4],
-            is_closed=data[5],
-            is_merged=data[6],
-            is_native=data[7],
-            repo_scope_id=data[8],
-            user=user,
-            repository=repository,
-            private_key=RSAKeyPair.load_private_from_str(data[11]),
-        )
-        issue.__set_sqlite_to_bools()
-        return issue
+        return cls.from_row(data, "i")
 
     @classmethod
     def load_with_html_url(cls, html_url: str) -> "DBIssue":
         """
         Load issue from database using HTML URL
         """
+        issue = get_identity_map().get(cls, ("html_url", html_url))
+        if issue is not None:
+            return issue
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
-         SELECT
-             title,
-             description,
-             ID,
-             created,
-             updated,
-             is_closed,
-             is_merged,
-             is_native,
-             repo_scope_id,
-             user_id,
-             repository,
-             private_key
-        FROM
-             gitea_forge_issues
-        WHERE
-            html_url = ?
-        """,
+            f"""
+            {cls.select("i")}
+            WHERE
+                i.html_url = ?
+            """,
             (html_url,),
         ).fetchone()
         if data is None:
             return None
+        return cls.from_row(data, "i")
 
-        user = DBUser.load_with_db_id(data[9])
-        repository = DBRepo.load_with_id(data[10])
+    @classmethod
+    def load_with_actor_name(cls, name: str) -> "DBIssue":
+        """Load issue from database with its actor name"""
+        issue = get_identity_map().get(cls, ("actor_name", name))
+        if issue is not None:
+            return issue
 
-        issue = cls(
-            html_url=html_url,
-            title=data[0],
-            description=data[1],
-            id=data[2],
-            created=data[3],
-            updated=data[4],
-            is_closed=data[5],
-            is_merged=data[6],
-            is_native=data[7],
-            repo_scope_id=data[8],
-            user=user,
-            repository=repository,
-            private_key=RSAKeyPair.load_private_from_str(data[11]),
-        )
-        issue.__set_sqlite_to_bools()
-        return issue
+        conn = get_db()
+        cur = conn.cursor()
+        data = cur.execute(
+            f"""
+            {cls.select("i")}
+            WHERE
+                i.actor_name = ?
+            """,
+            (name,),
+        ).fetchone()
+        if data is None:
+            return None
+        return cls.from_row(data, "i")
 
     def actor_name(self) -> str:
         name = f"{self.repository.actor_name()}!issue!{self.repo_scope_id}"
@@ -499,7 +666,4 @@ class DBIssue:
 
     @classmethod
     def from_actor_name(cls, name) -> "DBIssue":
-        (owner, name, repo_scope_id) = cls.split_actor_name(name)
-        repo = DBRepo.load(name=name, owner=owner)
-        issue = cls.load(repo, repo_scope_id=repo_scope_id)
-        return issue
+        return cls.load_with_actor_name(name)
@@ -0,0 +1,234 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import multiprocessing
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+
+import click
+from flask.cli import with_appcontext
+
+from interface.auth import RSAKeyPair, generate_private_key_pem
+from interface.settings import settings
+
+from .conn import get_db, unit_of_work
+
+KEY_POOL_SIZE = settings.SYSTEM.get("key_pool_size", 32)
+KEY_POOL_WORKERS = settings.SYSTEM.get("key_pool_workers", 2)
+KEY_POOL_INTERVAL = settings.SYSTEM.get("key_pool_interval", 60)  # in seconds
+
+
+KEY_COLUMNS = ["private_key", "public_key"]
+
+
+def key_columns(alias: str) -> str:
+    """
+    Key columns of the actor selected with table alias, for use along with
+    columns() of actor models. Read with key_from_row()
+    """
+    return ", ".join(
+        [
+            f"(SELECT {col} FROM keys WHERE keys.ID = {alias}.key_id) AS {alias}_{col}"
+            for col in KEY_COLUMNS
+        ]
+    )
+
+
+def key_from_row(row, alias: str) -> RSAKeyPair:
+    """Load key pair of an actor selected with key_columns(alias)"""
+    return RSAKeyPair.from_pem(
+        row[f"{alias}_private_key"], public_pem=row[f"{alias}_public_key"]
+    )
+
+
+def save_key(key: RSAKeyPair) -> int:
+    """Save key pair to database. Returns database ID assigned to the key"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO keys (fingerprint, private_key, public_key) VALUES (?, ?, ?);
+        """,
+        (key.fingerprint(), key.private_key(), key.public_key()),
+    )
+    return cur.lastrowid
+
+
+@dataclass
+class SpareKey:
+    """Key handed out by KeyPool.take()"""
+
+    key: RSAKeyPair
+    # row in spare_keys, None when the key was generated inline
+    spare_id: int = None
+
+
+class KeyPool:
+    """
+    Keys generated ahead of time and stored in spare_keys, so that creating
+    an actor on the request path doesn't have to wait for key generation.
+
+    The pool is topped up from worker processes by a background thread,
+    started by the server and the job runner. When it runs dry, keys are
+    generated inline.
+    """
+
+    def __init__(self, size: int = KEY_POOL_SIZE, workers: int = KEY_POOL_WORKERS):
+        self.size = size
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.executor = None
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.shutdown_flag = Event()
+        self.thread = None
+
+    def depth(self) -> int:
+        """Number of keys in the pool"""
+        conn = get_db()
+        cur = conn.cursor()
+        return cur.execute(
+            "SELECT row_count FROM table_stats WHERE table_name = 'spare_keys';"
+        ).fetchone()[0]
+
+    def take(self, count: int = 1) -> "[SpareKey]":
+        """
+        Keys for count new actors, to be claimed with claim() within the
+        unit of work that stores them. Spare keys are only read and keys the
+        pool is short of are generated here, so call it before opening the
+        unit of work: generating a key takes a while and must not hold the
+        write lock.
+        """
+        conn = get_db()
+        cur = conn.cursor()
+        data = cur.execute(
+            "SELECT ID, private_key FROM spare_keys ORDER BY ID LIMIT ?;", (count,)
+        ).fetchall()
+        keys = [
+            SpareKey(key=RSAKeyPair.from_pem(row[1]), spare_id=row[0]) for row in data
+        ]
+        for _ in range(count - len(keys)):
+            self.misses += 1
+            keys.append(SpareKey(key=RSAKeyPair.generate()))
+        self.wakeup.set()
+        return keys
+
+    def claim(self, spare: "SpareKey") -> RSAKeyPair:
+        """Take key returned by take() out of the pool"""
+        if spare.spare_id is None:
+            return spare.key
+        cur = get_db().cursor()
+        cur.execute("DELETE FROM spare_keys WHERE ID = ?;", (spare.spare_id,))
+        # someone else took it first
+        if cur.rowcount != 1:
+            self.misses += 1
+            return RSAKeyPair.generate()
+        self.hits += 1
+        return spare.key
+
+    def pop(self) -> RSAKeyPair:
+        """Take a key out of the pool. Generates one if the pool is empty"""
+        (spare,) = self.take()
+        with unit_of_work():
+            return self.claim(spare)
+
+    def __get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                # forking a multithreaded process isn't safe
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self.executor
+
+    def top_up(self) -> int:
+        """Generate keys until the pool is full. Returns number of keys added"""
+        missing = self.size - self.depth()
+        if missing <= 0:
+            return 0
+        executor = self.__get_executor()
+        jobs = [executor.submit(generate_private_key_pem) for _ in range(missing)]
+        pems = [(job.result(),) for job in jobs]
+        with unit_of_work() as conn:
+            # other workers may have topped up the pool in the meantime
+            pems = pems[0 : max(self.size - self.depth(), 0)]
+            conn.executemany("INSERT INTO spare_keys (private_key) VALUES (?);", pems)
+        self.generated += len(pems)
+        return len(pems)
+
+    def stats(self) -> dict:
+        """Pool metrics"""
+        return {
+            "size": self.size,
+            "depth": self.depth(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+        }
+
+    def start(self, app):
+        """Top up the pool in the background until the process exits"""
+
+        def run():
+            while not self.shutdown_flag.is_set():
+                try:
+                    with app.app_context():
+                        self.top_up()
+                except Exception as e:
+                    print(f"failed to top up key pool: {e}")
+                self.wakeup.wait(KEY_POOL_INTERVAL)
+                self.wakeup.clear()
+
+        with self.lock:
+            if self.size <= 0 or self.thread is not None:
+                return
+            self.thread = Thread(target=run, name="key-pool", daemon=True)
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.shutdown_flag.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        atexit.unregister(self.stop)
+
+
+__key_pool = KeyPool()
+
+
+def get_key_pool() -> KeyPool:
+    """Get key pool of this process"""
+    return __key_pool
+
+
+@click.command("key-pool")
+@click.option("--fill", is_flag=True, help="Top up the pool before printing stats")
+@with_appcontext
+def key_pool_command(fill: bool):
+    """Key pool stats CLI handler"""
+    pool = get_key_pool()
+    if fill:
+        click.echo(f"Added {pool.top_up()} keys")
+    for (name, value) in pool.stats().items():
+        click.echo(f"{name}: {value}")
@@ -0,0 +1,92 @@
+"""
+Serialised actor documents, cached so that serving an actor doesn't have to
+load and render it from the database
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import json
+
+from flask import Response, redirect, request
+
+from interface.cache import get_cache
+from interface.settings import settings
+from interface.utils import CONTENT_TYPE_ACTIVITY_JSON
+
+from .cache import CACHE_TTL, cache_key
+
+# Bump when the shape of to_actor() changes, so that documents rendered by
+# an older release aren't served
+RENDER_VERSION = 1
+# For how long remote servers may reuse an actor document without revalidating
+ACTOR_MAX_AGE = settings.SYSTEM.get("actor_max_age", 300)  # in seconds
+
+USER = "u"
+REPO = "r"
+ISSUE = "i"
+
+
+def render_key(kind: str, name: str) -> str:
+    """Cache key of the actor document of kind, as in its URL, with actor name"""
+    return cache_key("actor", RENDER_VERSION, kind, name)
+
+
+def render_actor(actor, url: str) -> dict:
+    """
+    Serialise actor. url is the page on the forge that requests for anything
+    other than the actor document are redirected to.
+    """
+    body = json.dumps(actor.to_actor())
+    etag = hashlib.sha256(body.encode("utf-8")).hexdigest()[0:32]
+    return {"body": body, "etag": etag, "url": url}
+
+
+def get_rendered_actor(kind: str, name: str, render) -> dict:
+    """
+    Get actor document stored in cache. render is invoked to produce the
+    document with render_actor() when it is missing
+    """
+    return get_cache().get_or_compute(render_key(kind, name), render, CACHE_TTL)
+
+
+def invalidate_actor(kind: str, name: str):
+    """
+    Discard actor document. To be called, through after_commit, whenever
+    the actor is saved. With the default MemoryBackend only the cache of the
+    process that saved the actor is invalidated; other processes serve their
+    copy until it expires, so deployments running several processes should
+    use RedisBackend.
+    """
+    get_cache().delete(render_key(kind, name))
+
+
+def actor_response(rendered: dict) -> Response:
+    """
+    Respond with actor document returned by get_rendered_actor(). Requests
+    carrying its ETag in If-None-Match get 304 Not Modified, requests that
+    don't accept activity JSON are redirected to the forge.
+    """
+    if CONTENT_TYPE_ACTIVITY_JSON not in request.headers.get("Accept", ""):
+        return redirect(rendered["url"])
+
+    if rendered["etag"] in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        resp = Response(rendered["body"], content_type=CONTENT_TYPE_ACTIVITY_JSON)
+    resp.set_etag(rendered["etag"])
+    resp.headers["Cache-Control"] = f"public, max-age={ACTOR_MAX_AGE}"
+    resp.headers["Vary"] = "Accept"
+    return resp
@@ -13,14 +13,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from dataclasses import dataclass
-from sqlite3 import IntegrityError
 
 from interface.auth import RSAKeyPair
 from interface.utils import CONTENT_TYPE_ACTIVITY_JSON
 
-from .conn import get_db
-from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN
+from .conn import get_db, after_commit, unit_of_work
+from .identity import get_identity_map
+from .keys import get_key_pool, save_key, key_columns, key_from_row
+from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN, cache_webfinger
 from .users import DBUser
+from .render import REPO, invalidate_actor
 
 
 @dataclass
@@ -34,69 +36,110 @@ class DBRepo:
     id: int = None
     private_key: RSAKeyPair = None
 
+    def __use_stored(self) -> bool:
+        """
+        Take ID and key of the stored repository. Returns False if it isn't
+        stored
+        """
+        repo = self.load(self.name, self.owner.user_id)
+        if repo is None:
+            return False
+        self.private_key = repo.private_key
+        self.id = repo.id
+        return True
+
     def save(self):
         """Save repository to database"""
-        repo = self.load(self.name, self.owner.user_id)
-        if repo is not None:
-            self.private_key = repo.private_key
-            self.id = repo.id
+        if self.__use_stored():
             return
 
         self.owner.save()
 
-        conn = get_db()
-        cur = conn.cursor()
-        count = 0
-        while True:
-            try:
-                self.private_key = RSAKeyPair()
-                cur.execute(
-                    """
-                    INSERT INTO gitea_forge_repositories
-                        (owner_id, name, private_key, description, html_url) VALUES
-                        (?, ?, ?, ?, ?);
-                    """,
+        # generating a key may take a while, it mustn't hold the write lock
+        (spare,) = get_key_pool().take()
+        # the key isn't left behind when the repository can't be inserted
+        with unit_of_work() as conn:
+            # stored by someone else while we were waiting for the write lock
+            if self.__use_stored():
+                return
+            cur = conn.cursor()
+            self.private_key = get_key_pool().claim(spare)
+            key_id = save_key(self.private_key)
+            cur.execute(
+                """
+                INSERT INTO gitea_forge_repositories
                     (
-                        self.owner.id,
-                        self.name,
-                        self.private_key.private_key(),
-                        self.description,
-                        self.html_url,
-                    ),
-                )
-                conn.commit()
-                repo = self.load(self.name, self.owner.user_id)
-                self.id = repo.id
-                break
-            except IntegrityError as e:
-                count += 1
-                if count > 5:
-                    raise e
-                continue
+                        owner_id, name, key_id,
+                        description, html_url, actor_name
+                    ) VALUES
+                    (?, ?, ?, ?, ?, ?);
+                """,
+                (
+                    self.owner.id,
+                    self.name,
+                    key_id,
+                    self.description,
+                    self.html_url,
+                    self.actor_name(),
+                ),
+            )
+            self.id = cur.lastrowid
+            after_commit(invalidate_actor, REPO, self.actor_name())
+            after_commit(cache_webfinger, self)
+
+    COLUMNS = ["ID", "name", "description", "html_url"]
+
+    @classmethod
+    def columns(cls, alias: str) -> str:
+        """
+        Columns required by from_row, qualified with table alias.
+        For use in queries that JOIN gitea_forge_repositories.
+        """
+        columns = [f"{alias}.{col} AS {alias}_{col}" for col in cls.COLUMNS]
+        return ", ".join(columns + [key_columns(alias)])
+
+    @classmethod
+    def from_row(cls, row, alias: str, owner: DBUser) -> "DBRepo":
+        """Hydrate repository from a row selected with columns(alias)"""
+        identity_map = get_identity_map()
+        repo = identity_map.get(cls, row[f"{alias}_ID"])
+        if repo is not None:
+            return repo
+
+        resp = cls(
+            name=row[f"{alias}_name"],
+            owner=owner,
+            description=row[f"{alias}_description"],
+            html_url=row[f"{alias}_html_url"],
+        )
+        resp.id = row[f"{alias}_ID"]
+        resp.private_key = key_from_row(row, alias)
+        return identity_map.add(
+            resp, ("name", owner.user_id, resp.name), ("actor_name", resp.actor_name())
+        )
 
     @classmethod
     def load(cls, name: str, owner: str) -> "DBRepo":
         """Load repository from database"""
-        owner = DBUser.load(owner)
-        if owner is None:
-            return None
+        repo = get_identity_map().get(cls, ("name", owner, name))
+        if repo is not None:
+            return repo
 
         conn = get_db()
         cur = conn.cursor()
 
         data = cur.execute(
-            """
-                SELECT ID, private_key, description, html_url FROM gitea_forge_repositories
-                WHERE name = ? AND owner_id = ?;
+            f"""
+                SELECT {cls.columns("r")}, {DBUser.columns("o")}
+                FROM gitea_forge_repositories AS r
+                INNER JOIN gitea_users AS o ON o.ID = r.owner_id
+                WHERE r.name = ? AND o.user_id = ?;
             """,
-            (name, owner.id),
+            (name, owner),
         ).fetchone()
         if data is None:
             return None
-        resp = cls(name=name, owner=owner, description=data[2], html_url=data[3])
-        resp.id = data[0]
-        resp.private_key = RSAKeyPair.load_private_from_str(data[1])
-        return resp
+        return cls.from_row(data, "r", owner=DBUser.from_row(data, "o"))
 
     @classmethod
     def load_with_id(cls, db_id: str) -> "DBRepo":
@@ -104,23 +147,46 @@ class DBRepo:
         Load repository from database with database assigned ID>
         Database ID is different from forge assigned ID.
         """
+        repo = get_identity_map().get(cls, db_id)
+        if repo is not None:
+            return repo
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
-                SELECT name, owner_id, private_key, description, html_url
-                FROM gitea_forge_repositories
-                WHERE ID = ?;
+            f"""
+                SELECT {cls.columns("r")}, {DBUser.columns("o")}
+                FROM gitea_forge_repositories AS r
+                INNER JOIN gitea_users AS o ON o.ID = r.owner_id
+                WHERE r.ID = ?;
             """,
             (db_id,),
         ).fetchone()
         if data is None:
             return None
-        owner = DBUser.load_with_db_id(data[1])
-        resp = cls(name=data[0], owner=owner, description=data[3], html_url=data[4])
-        resp.private_key = RSAKeyPair.load_private_from_str(data[2])
-        resp.id = db_id
-        return resp
+        return cls.from_row(data, "r", owner=DBUser.from_row(data, "o"))
+
+    @classmethod
+    def load_with_actor_name(cls, name: str) -> "DBRepo":
+        """Load repository from database with its actor name"""
+        repo = get_identity_map().get(cls, ("actor_name", name))
+        if repo is not None:
+            return repo
+
+        conn = get_db()
+        cur = conn.cursor()
+        data = cur.execute(
+            f"""
+                SELECT {cls.columns("r")}, {DBUser.columns("o")}
+                FROM gitea_forge_repositories AS r
+                INNER JOIN gitea_users AS o ON o.ID = r.owner_id
+                WHERE r.actor_name = ?;
+            """,
+            (name,),
+        ).fetchone()
+        if data is None:
+            return None
+        return cls.from_row(data, "r", owner=DBUser.from_row(data, "o"))
 
     def actor_name(self) -> str:
         name = f"!{self.owner.user_id}!{self.name}"
@@ -139,9 +205,7 @@ class DBRepo:
 
     @classmethod
     def from_actor_name(cls, name) -> "DBRepo":
-        (owner, name) = cls.split_actor_name(name)
-        repo = cls.load(name=name, owner=owner)
-        return repo
+        return cls.load_with_actor_name(name)
 
     def actor_url(self) -> str:
         act_url = f"{INTERFACE_BASE_URL}/r/{self.actor_name()}"
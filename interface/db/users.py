@@ -13,14 +13,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from dataclasses import dataclass
-from sqlite3 import IntegrityError
 
 from interface.auth import RSAKeyPair
 from interface.utils import CONTENT_TYPE_ACTIVITY_JSON
 
-from .conn import get_db
+from .conn import get_db, after_commit, unit_of_work, batches
+from .identity import get_identity_map
+from .keys import get_key_pool, save_key, key_columns, key_from_row
 from .interfaces import DBInterfaces
-from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN
+from .render import USER, invalidate_actor
+from .webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN, cache_webfinger
 from .cache import RecordCount
 
 
@@ -40,66 +42,123 @@ class DBUser:
 
     count = RecordCount("gitea_users")
 
+    def __use_stored(self) -> bool:
+        """Take ID and key of the stored user. Returns False if it isn't stored"""
+        user = self.load(self.user_id)
+        if user is None:
+            return False
+        self.private_key = user.private_key
+        self.id = user.id
+        return True
+
     def save(self):
         """Save user to database"""
-        user = self.load(self.user_id)
-        if user is not None:
-            self.private_key = user.private_key
-            self.id = user.id
+        if self.__use_stored():
             return
 
-        conn = get_db()
-        cur = conn.cursor()
-        count = 0
-        while True:
-            try:
-                self.private_key = RSAKeyPair()
-                cur.execute(
-                    """
-                    INSERT INTO gitea_users
-                        (
-                            name, user_id, profile_url,
-                            avatar_url, private_key,
-                            description
-                        ) VALUES (
-                            ?, ?, ?, ?, 
-                            ?, ?
-                        );
-                    """,
+        # generating a key may take a while, it mustn't hold the write lock
+        (spare,) = get_key_pool().take()
+        # the key isn't left behind when the user can't be inserted
+        with unit_of_work() as conn:
+            # stored by someone else while we were waiting for the write lock
+            if self.__use_stored():
+                return
+            cur = conn.cursor()
+            self.private_key = get_key_pool().claim(spare)
+            key_id = save_key(self.private_key)
+            cur.execute(
+                """
+                INSERT INTO gitea_users
                     (
-                        self.name,
-                        self.user_id,
-                        self.profile_url,
-                        self.avatar_url,
-                        self.private_key.private_key(),
-                        self.description,
-                    ),
-                )
-                conn.commit()
-                self.id = self.load(self.user_id).id
-                break
-            except IntegrityError as e:
-                count += 1
-                if count > 5:
-                    raise e
-                continue
+                        name, user_id, profile_url,
+                        avatar_url, key_id,
+                        description
+                    ) VALUES (
+                        ?, ?, ?, ?, 
+                        ?, ?
+                    );
+                """,
+                (
+                    self.name,
+                    self.user_id,
+                    self.profile_url,
+                    self.avatar_url,
+                    key_id,
+                    self.description,
+                ),
+            )
+            self.id = cur.lastrowid
+            after_commit(invalidate_actor, USER, self.user_id)
+            after_commit(cache_webfinger, self)
+
+    @classmethod
+    def save_many(cls, users: "[DBUser]"):
+        """
+        Save users to database. Users that are already stored are looked up
+        in bulk, only the missing ones are inserted.
+        """
+        stored = cls.load_many([user.user_id for user in users])
+        for user in users:
+            from_db = stored.get(user.user_id)
+            if from_db is None:
+                user.save()
+                stored[user.user_id] = user
+            else:
+                user.private_key = from_db.private_key
+                user.id = from_db.id
+
+    COLUMNS = [
+        "ID",
+        "name",
+        "user_id",
+        "profile_url",
+        "avatar_url",
+        "description",
+    ]
+
+    @classmethod
+    def columns(cls, alias: str) -> str:
+        """
+        Columns required by from_row, qualified with table alias.
+        For use in queries that JOIN gitea_users.
+        """
+        columns = [f"{alias}.{col} AS {alias}_{col}" for col in cls.COLUMNS]
+        return ", ".join(columns + [key_columns(alias)])
+
+    @classmethod
+    def from_row(cls, row, alias: str) -> "DBUser":
+        """Hydrate user from a row selected with columns(alias)"""
+        identity_map = get_identity_map()
+        user = identity_map.get(cls, row[f"{alias}_ID"])
+        if user is not None:
+            return user
+
+        res = cls(
+            id=row[f"{alias}_ID"],
+            name=row[f"{alias}_name"],
+            user_id=row[f"{alias}_user_id"],
+            profile_url=row[f"{alias}_profile_url"],
+            avatar_url=row[f"{alias}_avatar_url"],
+            description=row[f"{alias}_description"],
+        )
+        res.private_key = key_from_row(row, alias)
+        return identity_map.add(res, ("user_id", res.user_id))
 
     @classmethod
     def load(cls, user_id: str) -> "DBUser":
         """Load user from database with the URL of the interface which signed it's creation"""
+        user = get_identity_map().get(cls, ("user_id", user_id))
+        if user is not None:
+            return user
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
+            f"""
              SELECT
-                 ID,
-                 name,
-                 profile_url,
-                 private_key,
-                 avatar_url,
-                 description
+                 {cls.columns("u")}
              FROM
-                 gitea_users
+                 gitea_users AS u
             WHERE
                 user_id = ?
             """,
@@ -107,17 +166,39 @@ class DBUser:
         ).fetchone()
         if data is None:
             return None
+        return cls.from_row(data, "u")
 
-        res = cls(
-            id=data[0],
-            name=data[1],
-            user_id=user_id,
-            profile_url=data[2],
-            avatar_url=data[4],
-            description=data[5],
-        )
-        res.private_key = RSAKeyPair.load_private_from_str(data[3])
-        return res
+    @classmethod
+    def load_many(cls, user_ids: [str]) -> "{str: DBUser}":
+        """Load users from database, keyed by user_id. Unknown users are left out"""
+        identity_map = get_identity_map()
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            user = identity_map.get(cls, ("user_id", user_id))
+            if user is None:
+                missing.append(user_id)
+            else:
+                users[user_id] = user
+
+        conn = get_db()
+        cur = conn.cursor()
+        for batch in batches(missing):
+            data = cur.execute(
+                f"""
+                 SELECT
+                     {cls.columns("u")}
+                 FROM
+                     gitea_users AS u
+                 WHERE
+                    user_id IN ({", ".join(["?"] * len(batch))})
+                """,
+                batch,
+            ).fetchall()
+            for row in data:
+                user = cls.from_row(row, "u")
+                users[user.user_id] = user
+        return users
 
     @classmethod
     def load_with_db_id(cls, db_id: str) -> "DBUser":
@@ -125,36 +206,25 @@ class DBUser:
         Load user from database with the database assigned ID.
         DB assigned ID is different from the one the forge assigns.
         """
+        user = get_identity_map().get(cls, db_id)
+        if user is not None:
+            return user
+
         conn = get_db()
         cur = conn.cursor()
         data = cur.execute(
-            """
+            f"""
              SELECT
-                 user_id,
-                 name,
-                 profile_url,
-                 private_key,
-                 avatar_url,
-                 description
+                 {cls.columns("u")}
              FROM
-                 gitea_users
+                 gitea_users AS u
              WHERE ID = ?
             """,
             (db_id,),
         ).fetchone()
         if data is None:
             return None
-
-        res = cls(
-            user_id=data[0],
-            name=data[1],
-            id=db_id,
-            profile_url=data[2],
-            avatar_url=data[4],
-            description=data[5],
-        )
-        res.private_key = RSAKeyPair.load_private_from_str(data[3])
-        return res
+        return cls.from_row(data, "u")
 
     def actor_url(self) -> str:
         act_url = f"{INTERFACE_BASE_URL}/u/{self.user_id}"
@@ -12,10 +12,98 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from interface.settings import settings
+import time
+from collections import OrderedDict
+from threading import Lock
 from urllib.parse import urlparse
 
+from interface.cache import get_cache
+from interface.error import Error
+from interface.settings import settings
 from interface.utils import trim_url
 
+from .cache import cache_key
+
 INTERFACE_BASE_URL = trim_url(settings.SERVER.url)
 INTERFACE_DOMAIN = urlparse(INTERFACE_BASE_URL).netloc
+
+
+# JRD of an actor doesn't change once it is created
+WEBFINGER_TTL = settings.SYSTEM.get("webfinger_ttl", 60 * 60 * 24)  # in seconds
+# Subjects the forge reported as missing are remembered for a short while only,
+# since they may be created on the forge at any time
+WEBFINGER_NEGATIVE_TTL = settings.SYSTEM.get("webfinger_negative_ttl", 300)
+WEBFINGER_NEGATIVE_SIZE = settings.SYSTEM.get("webfinger_negative_size", 4096)
+
+
+def webfinger_key(subject: str) -> str:
+    """Cache key of webfinger subject, "acct:<actor name>@<domain>" """
+    return cache_key("webfinger", subject)
+
+
+class NegativeCache:
+    """
+    Webfinger subjects the forge reported as missing, along with the error
+    it reported. Holds at most size subjects for ttl seconds each, the oldest
+    subject is evicted first when it is full.
+    """
+
+    def __init__(
+        self, size: int = WEBFINGER_NEGATIVE_SIZE, ttl: int = WEBFINGER_NEGATIVE_TTL
+    ):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def add(self, subject: str, error: Error):
+        if self.size <= 0:
+            return
+        key = webfinger_key(subject)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (error, time.time() + self.ttl)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def get(self, subject: str) -> Error:
+        """Get error reported for subject. Returns None if subject isn't known to be missing"""
+        key = webfinger_key(subject)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            (error, expires_at) = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            return error
+
+    def discard(self, subject: str):
+        with self.lock:
+            self.entries.pop(webfinger_key(subject), None)
+
+
+__negative_cache = NegativeCache()
+
+
+def get_negative_cache() -> NegativeCache:
+    """Get webfinger negative cache of this process"""
+    return __negative_cache
+
+
+def get_cached_webfinger(subject: str) -> dict:
+    """Get JRD of subject. Returns None if it isn't cached"""
+    return get_cache().get(webfinger_key(subject))
+
+
+def cache_webfinger(actor) -> dict:
+    """
+    Cache JRD of actor. To be called, through after_commit, whenever an
+    actor is created
+    """
+    jrd = actor.webfinger()
+    subject = actor.webfinger_subject()
+    get_cache().set(webfinger_key(subject), jrd, WEBFINGER_TTL)
+    get_negative_cache().discard(subject)
+    return jrd
@@ -72,6 +72,12 @@ F_D_FORGE_UNKNOWN_ERROR = Error(
     status=502,
 )
 
+F_D_FORGE_RATE_LIMITED = Error(
+    errcode="F_D_FORGE_RATE_LIMITED",
+    error="Software Forge is rate limiting requests, please try again later",
+    status=503,
+)
+
 
 def bad_req():
     """Empty response with 400 bad request status code"""
@@ -79,6 +79,12 @@ class Forge:
         """Get issues on a repository. Supports pagination via 'page' optional param"""
         raise NotImplementedError
 
+    def iter_issues(
+        self, owner: str, repo: str, since: datetime.datetime = None, *args, **kwargs
+    ):
+        """Iterate over all issues on a repository, fetching a page at a time"""
+        raise NotImplementedError
+
     def create_issue(self, issue: CreateIssue) -> str:
         """Creates issue on a repository. reurns html url of the newly created issue"""
         raise NotImplementedError
@@ -140,6 +146,18 @@ F_D_REPOSITORY_NOT_FOUND = Error(
     status=404,
 )
 
+F_D_USER_NOT_FOUND = Error(
+    errcode="F_D_USER_NOT_FOUND",
+    error="User not found",
+    status=404,
+)
+
+F_D_ISSUE_NOT_FOUND = Error(
+    errcode="F_D_ISSUE_NOT_FOUND",
+    error="Issue not found",
+    status=404,
+)
+
 F_D_FORGE_FORBIDDEN_OPERATION = Error(
     errcode="F_D_FORGE_FORBIDDEN_OPERATION",
     error="Forge reports operation is forbidden",
@@ -18,14 +18,13 @@ from urllib.parse import urlunparse, urlparse
 from dataclasses import asdict
 from dateutil.parser import parse as date_parse
 
-import requests
-
 from rfc3339 import rfc3339
 from interface.settings import settings
 
 from interface.forges.base import (
     Forge,
     F_D_REPOSITORY_NOT_FOUND,
+    F_D_USER_NOT_FOUND,
     F_D_FORGE_FORBIDDEN_OPERATION,
     F_D_REPOSITORY_EXISTS,
     F_D_INVALID_ISSUE_URL,
@@ -39,6 +38,13 @@ from interface.forges.payload import (
 )
 from interface.forges.notifications import Notification, NotificationResp, Comment
 from interface.forges.notifications import ISSUE, PULL, COMMIT, REPOSITORY
+from interface.forges.http import (
+    get_session,
+    set_default_headers,
+    map_concurrently,
+    paginate,
+    HTTP_PAGE_SIZE,
+)
 from interface.error import F_D_FORGE_UNKNOWN_ERROR, Error
 from interface.utils import trim_url, clean_url, get_rand
 
@@ -52,6 +58,7 @@ class Gitea(Forge):
     gitea_user_id: int
 
     def __init__(self):  # self, base_url: str, admin_user: str, admin_email):
+        set_default_headers(settings.GITEA.host, self._auth())
         self.html_client = HTMLClient()
         super().__init__(settings.GITEA.host)
         self.gitea_user_id = self.get_gitea_user()["id"]
@@ -80,6 +87,11 @@ class Gitea(Forge):
     def get_comments(issue_url: str) -> [GiteaComment]:
         return GiteaComment.from_issue_url(issue_url)
 
+    @staticmethod
+    def iter_comments(issue_url: str, page_size: int = HTTP_PAGE_SIZE):
+        """Iterate over all comments on an issue, fetching a page at a time"""
+        return GiteaComment.iter_issue_url(issue_url, page_size=page_size)
+
     def get_issues(
         self, owner: str, repo: str, since: datetime.datetime = None, *args, **kwargs
     ):
@@ -95,13 +107,33 @@ class Gitea(Forge):
         url = self._get_url(f"/repos/{owner}/{repo}/issues")
 
         headers = self._auth()
-        response = requests.request("GET", url, params=query, headers=headers)
+        response = get_session(url).request("GET", url, params=query, headers=headers)
         if response.status_code == 200:
             return response.json()
         if response.status_code == 404:
             raise F_D_REPOSITORY_NOT_FOUND
         raise F_D_FORGE_UNKNOWN_ERROR
 
+    def iter_issues(
+        self,
+        owner: str,
+        repo: str,
+        since: datetime.datetime = None,
+        page_size: int = HTTP_PAGE_SIZE,
+    ):
+        """Iterate over all issues on a repository, fetching a page at a time"""
+        query = {}
+        if since is not None:
+            query["since"] = rfc3339(since)
+
+        url = self._get_url(f"/repos/{owner}/{repo}/issues")
+        for response in paginate(url, params=query, page_size=page_size):
+            if response.status_code == 404:
+                raise F_D_REPOSITORY_NOT_FOUND
+            if response.status_code != 200:
+                raise F_D_FORGE_UNKNOWN_ERROR
+            yield from response.json()
+
     @staticmethod
     def get_owner_repo_from_url(url: str) -> (str, str):
         """Get (owner, repo) from repository URL"""
@@ -117,7 +149,7 @@ class Gitea(Forge):
         headers = self._auth()
         payload = asdict(issue)
         print(payload)
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = get_session(url).request("POST", url, json=payload, headers=headers)
         print(f"log: {response.status_code} {response.json()}")
         if response.status_code == 201:
             data = response.json()
@@ -146,7 +178,7 @@ class Gitea(Forge):
         url = self._get_url("/user/repos")
         payload = {"name": repo, "description": description}
         headers = self._auth()
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = get_session(url).request("POST", url, json=payload, headers=headers)
         if response.status_code == 201:
             return
         if response.status_code == 409:
@@ -157,7 +189,7 @@ class Gitea(Forge):
     def subscribe(self, owner: str, repo: str):
         url = self._get_url(format(f"/repos/%s/%s/subscription" % (owner, repo)))
         headers = self._auth()
-        response = requests.request("PUT", url, headers=headers)
+        response = get_session(url).request("PUT", url, headers=headers)
         if response.status_code == 200:
             return
         if response.status_code == 404:
@@ -182,10 +214,15 @@ class Gitea(Forge):
             state=subject["state"],
             id=n["id"],
             repo_url=n["repository"]["html_url"],
+            # older versions of Gitea don't send html_url of the subject
+            web_url=subject.get(
+                "html_url", subject["url"].replace("/api/v1/repos/", "/")
+            ),
         )
 
         if notification_type == PULL:
-            rn.pr_url = requests.request("GET", subject["url"]).json()["html_url"]
+            pr_url = subject["url"]
+            rn.pr_url = get_session(pr_url).request("GET", pr_url).json()["html_url"]
 
             rn.upstream = n["repository"]["description"]
             print(n["repository"]["description"])
@@ -194,7 +231,7 @@ class Gitea(Forge):
             comment_url = subject["latest_comment_url"]
             print(comment_url)
             if len(comment_url) != 0:
-                resp = requests.request("GET", comment_url)
+                resp = get_session(comment_url).request("GET", comment_url)
                 comment = resp.json()
 
                 url = ""
@@ -221,24 +258,23 @@ class Gitea(Forge):
         query["since"] = rfc3339(since)
         print("Checking type : ", type(query["since"]))
 
-        # Sending a request for a JSON notifications response
-        # to the notifications section
-        url = self._get_url("/notifications")
-        headers = self._auth()
-        response = requests.request("GET", url, params=query, headers=headers)
-        notifications = response.json()
-
         # Setting last_read to a string
         # to be parsed into a datetime
         last_read = query["since"]
         resp = []
 
-        for n in notifications:
-            # rn: Repository Notification
-            rn = self._into_notification(n)
-            if rn:
-                last_read = rn.updated_at
-                resp.append(rn)
+        # Sending requests for JSON notifications responses
+        # to the notifications section, a page at a time
+        url = self._get_url("/notifications")
+        for response in paginate(url, params=query):
+            if response.status_code != 200:
+                raise F_D_FORGE_UNKNOWN_ERROR
+            # details of all notifications on a page are fetched at once
+            for rn in map_concurrently(self._into_notification, response.json()):
+                # rn: Repository Notification
+                if rn:
+                    last_read = rn.updated_at
+                    resp.append(rn)
         return NotificationResp(notifications=resp, last_read=date_parse(last_read))
 
     def create_pull_request(self, owner: str, repo: str, pr: CreatePullrequest):
@@ -253,13 +289,13 @@ class Gitea(Forge):
         payload["labels"] = [0]
         payload["milestones"] = 0
 
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = get_session(url).request("POST", url, json=payload, headers=headers)
         return response.json()["html_url"]
 
     def get_gitea_repo(self, owner: str, repo: str):
         """Get repository details"""
         url = self._get_url(f"/repos/{owner}/{repo}")
-        response = requests.request("GET", url)
+        response = get_session(url).request("GET", url)
         if response.status_code == 200:
             return response.json()
         if response.status_code == 404:
@@ -269,7 +305,7 @@ class Gitea(Forge):
     def get_gitea_user(self):
         url = self._get_url("/user")
         headers = self._auth()
-        response = requests.request("GET", url, headers=headers)
+        response = get_session(url).request("GET", url, headers=headers)
         if response.status_code == 200:
             return response.json()
         raise Exception(
@@ -279,7 +315,7 @@ class Gitea(Forge):
     def get_user(self, name: str) -> ForgeUser:
         url = self._get_url(f"/users/{name}")
         headers = self._auth()
-        response = requests.get(url, headers=headers)
+        response = get_session(url).get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()
             username = data["username"]
@@ -295,6 +331,8 @@ class Gitea(Forge):
                 avatar_url=avatar_url,
                 description=description,
             )
+        if response.status_code == 404:
+            raise F_D_USER_NOT_FOUND
         err_msg = f"[ERROR] getting user info. status code: {response.status_code} {response.text}"
         raise Exception(err_msg)
 
@@ -302,7 +340,7 @@ class Gitea(Forge):
         """Fork a repository"""
         url = self._get_url(f"/repos/{owner}/{repo}/forks")
         headers = self._auth()
-        response = requests.request("POST", url, headers=headers)
+        response = get_session(url).request("POST", url, headers=headers)
         if response.status_code == 202:
             return repo
 
@@ -346,7 +384,7 @@ class Gitea(Forge):
         index = self.get_issue_index(comment.issue_url)
         url = self._get_url("/repos/{owner}/{repo}/issues/{index}")
         payload = {"body": comment.body}
-        _response = requests.request("POST", url, json=payload, headers=headers)
+        _response = get_session(url).request("POST", url, json=payload, headers=headers)
 
     def get_local_html_url(self, repo: str) -> str:
         path = f"/{settings.GITEA.username}/{repo}"
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import datetime
 from html.parser import HTMLParser
+from threading import Event, Lock, Thread
 from dataclasses import asdict
 from dateutil.parser import parse as date_parse
 from urllib.parse import urlunparse, urlparse
@@ -38,6 +39,9 @@ from interface.forges.notifications import ISSUE, PULL, COMMIT, REPOSITORY
 from interface.error import F_D_FORGE_UNKNOWN_ERROR, Error
 from interface.utils import trim_url, clean_url, get_rand
 
+# Interval at which the web UI session is renewed by logging in again
+SESSION_REFRESH_INTERVAL = settings.GITEA.get("session_refresh", 60 * 60)  # in seconds
+
 
 class ParseCSRFGiteaForm(HTMLParser):
     token: str = None
@@ -72,10 +76,34 @@ class HTMLClient:
         if all([self.host.scheme != "http", self.host.scheme != "https"]):
             print(self.host.scheme)
             raise Exception("scheme should be either http or https")
-        self.session = Session()
+        self.lock = Lock()
+        self.shutdown_flag = Event()
+        self.refresh_thread = None
         self.login()
         print(f"constructor {self.session.cookies}")
 
+    def start_session_refresh(self, interval: int = SESSION_REFRESH_INTERVAL):
+        """Log in again every interval seconds in the background"""
+
+        def run():
+            while not self.shutdown_flag.wait(interval):
+                try:
+                    self.login()
+                except Exception as e:
+                    print(f"failed to refresh Gitea session: {e}")
+
+        with self.lock:
+            if interval <= 0 or self.refresh_thread is not None:
+                return
+            self.refresh_thread = Thread(target=run, name="gitea-session", daemon=True)
+            self.refresh_thread.start()
+
+    def stop_session_refresh(self):
+        self.shutdown_flag.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
+
     @staticmethod
     def get_csrf_token(page: str) -> str:
         parser = ParseCSRFGiteaForm()
@@ -87,8 +115,13 @@ class HTMLClient:
         return urlunparse((self.host.scheme, self.host.netloc, path, "", "", ""))
 
     def login(self):
+        """
+        Log in on a new session and swap it in once it is authenticated,
+        so that requests in flight on the current session aren't disturbed
+        """
+        session = Session()
         url = self.get_url("/user/login")
-        resp = self.session.get(url)
+        resp = session.get(url)
         if resp.status_code != 200:
             print(resp.status_code, resp.text)
             raise Exception(resp.status_code)
@@ -100,9 +133,10 @@ class HTMLClient:
             "password": settings.GITEA.password,
             "remember": "on",
         }
-        resp = self.session.post(url, data=payload, allow_redirects=False)
-        print(f"login {self.session.cookies}")
+        resp = session.post(url, data=payload, allow_redirects=False)
+        print(f"login {session.cookies}")
         if resp.status_code == 302:
+            self.session = session
             return
 
         raise Exception(
@@ -119,7 +153,9 @@ class HTMLClient:
 
         def __inner(payload, count: int = 0):
             print(payload)
-            resp = self.session.get(url)
+            # CSRF token is bound to the session it was fetched with
+            session = self.session
+            resp = session.get(url)
             if resp.status_code != 200:
                 # Have to see source code for possible errors(wrong password? user doesn't exist?)
                 print(resp.status_code, resp.text)
@@ -128,7 +164,7 @@ class HTMLClient:
             csrf = self.get_csrf_token(resp.text)
             payload["_csrf"] = csrf
             print(f"payload in gitea: {payload}")
-            resp = self.session.post(url, data=payload, allow_redirects=False)
+            resp = session.post(url, data=payload, allow_redirects=False)
             if resp.status_code == 302:
                 return self.get_url(resp.headers["location"])
             if (
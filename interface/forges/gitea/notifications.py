@@ -30,7 +30,7 @@ from interface.forges.notifications import (
 )
 from interface.forges.gitea.utils import get_issue_index
 from interface.utils import clean_url, trim_url
-from interface.db import get_db, DBRepo, DBUser, DBIssue, DBInterfaces
+from interface.db import get_db, DBRepo, DBUser, DBIssue, DBComment, DBInterfaces
 
 from interface.forges.gitea.responses import (
     GiteaInternalTracker,
@@ -68,9 +68,14 @@ class GiteaNotification(NotificationResolver):
 
         if issue is None or issue.is_closed:
             issue_from_gitea = GiteaIssue.get_issue(self.subject.url)
-            issue_from_gitea.to_db_issue().save()
+            issue = issue_from_gitea.to_db_issue()
+            issue.save()
             if issue_from_gitea.comments > 0:
                 comments = GiteaComment.from_issue(issue_from_gitea)
+                # one bulk upsert rather than a save per comment
+                DBComment.save_many(
+                    [comment.to_db_comment(issue=issue) for comment in comments]
+                )
 
     #        if from_db is None:
 
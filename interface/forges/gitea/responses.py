@@ -15,8 +15,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from dataclasses import dataclass
 
-import requests
-
 # from flask import current_app
 from interface.settings import settings
 
@@ -33,6 +31,8 @@ from interface.settings import settings
 # from interface.forges.gitea.utils import get_issue_index
 # from interface.utils import clean_url, trim_url
 from interface.db import DBRepo, DBIssue, DBUser, DBInterfaces, DBComment
+from interface.forges.base import F_D_ISSUE_NOT_FOUND
+from interface.forges.http import get_session, paginate, HTTP_PAGE_SIZE
 from interface.utils import clean_url, trim_url, date_from_string, since_epoch
 
 from .utils import get_issue_index, get_owner_repo_from_url, get_issue_api_url
@@ -198,9 +198,11 @@ class GiteaIssue:
     @classmethod
     def get_issue(cls, owner: str, repo: str, issue_id) -> "GiteaIssue":
         url = get_issue_api_url(owner=owner, repo=repo, issue_id=issue_id)
-        response = requests.get(url)
+        response = get_session(url).get(url)
         if response.status_code == 200:
             return cls(**response.json())
+        if response.status_code == 404:
+            raise F_D_ISSUE_NOT_FOUND
 
         raise Exception(
             f"UNKNOWN ERROR while getting issue. Status code {response.status_code}, issue_url {url}"
@@ -251,25 +253,27 @@ class GiteaComment:
 
     @classmethod
     def from_issue_url(cls, issue_html_url: str) -> "[GiteaComment]":
-        comments = []
+        comments = list(cls.iter_issue_url(issue_html_url))
+        if len(comments) == 0:
+            return None
+        return comments
+
+    @classmethod
+    def iter_issue_url(
+        cls, issue_html_url: str, page_size: int = HTTP_PAGE_SIZE
+    ) -> "[GiteaComment]":
+        """Iterate over all comments on an issue, fetching a page at a time"""
         (owner, repo) = get_owner_repo_from_url(issue_html_url)
         issue_index = get_issue_index(issue_html_url)
         # TODO use Gitea's(Forge subclass) url bulder
         url = f"{trim_url(clean_url(settings.GITEA.host))}/api/v1/repos/{owner}/{repo}/issues/{issue_index}/comments"
-        resp = requests.get(url)
-
-        if resp.status_code == 200:
-            data = resp.json()
-            ## TODO this doesn't take pagination into account
-            for comment in data:
-                comments.append(cls(**comment))
-            if len(comments) == 0:
-                return None
-            return comments
-
-        raise Exception(
-            f"Error while fetching comments for issue: {issue_html_url} status_code {resp.status_code}"
-        )
+        for resp in paginate(url, page_size=page_size):
+            if resp.status_code != 200:
+                raise Exception(
+                    f"Error while fetching comments for issue: {issue_html_url} status_code {resp.status_code}"
+                )
+            for comment in resp.json():
+                yield cls(**comment)
 
     def belongs_to_pull_request(self) -> bool:
         return len(self.pull_request_url) == 0
@@ -277,7 +281,15 @@ class GiteaComment:
     def belongs_to_issue(self) -> bool:
         return len(self.issue_url) == 0
 
-    def to_db_comment(self) -> DBComment:
+    def to_db_comment(self, issue: DBIssue = None) -> DBComment:
+        """
+        issue is the issue the comment belongs to. It is looked up when
+        it isn't given; pass it when converting all comments of an issue
+        """
+        if issue is None:
+            issue = DBIssue.load_with_html_url(
+                self.issue_url if len(self.pull_request_url) == 0 else self.issue_url
+            )
         return DBComment(
             body=self.body,
             html_url=self.html_url,
@@ -285,8 +297,7 @@ class GiteaComment:
             created=since_epoch(date_from_string(self.created_at)),
             updated=since_epoch(date_from_string(self.updated_at)),
             comment_id=self.id,
-            is_native=None,
-            belongs_to_issue=DBIssue.load_with_html_url(
-                self.issue_url if len(self.pull_request_url) == 0 else self.issue_url
-            ),
+            # TODO verify if comment is native
+            is_native=True,
+            belongs_to_issue=issue,
         )
@@ -18,7 +18,6 @@ from urllib.parse import urlparse, urlunparse
 from dateutil.parser import parse as date_parse
 from dataclasses import asdict
 
-import requests
 from rfc3339 import rfc3339
 
 from interface.settings import settings
@@ -26,12 +25,14 @@ from . import utils
 from .base import CreateIssue, Forge, RepositoryInfo, CreatePullrequest
 from .notifications import Notification, Comment, NotificationResp
 from .notifications import ISSUE, REPOSITORY, PULL
+from .http import get_session, set_default_headers, map_concurrently
 
 
 class GitHub(Forge):
     def __init__(self):
         """Initializes the class variables"""
         self.host = urlparse(utils.clean_url(settings.GITHUB.host))
+        set_default_headers(settings.GITHUB.host, self._auth())
 
     def _get_url(self, path: str) -> str:
         """Retrieves the forge url"""
@@ -68,7 +69,7 @@ class GitHub(Forge):
         # Requesting the issues present in the repo
         # GitHub provides a paginated response for 30
         # issues at a time
-        response = requests.request("GET", url)
+        response = get_session(url).request("GET", url)
 
         # returning the responses in the form of JSON
         return response.json()
@@ -82,7 +83,7 @@ class GitHub(Forge):
         payload = asdict(issue)
 
         # Sending in a POST request
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = get_session(url).request("POST", url, json=payload, headers=headers)
 
         # Returns the response with a JSON output
         return response.json()
@@ -101,7 +102,7 @@ class GitHub(Forge):
         """Get repository details"""
 
         url = self._get_url(format("/repos/%s/%s" % (owner, repo)))
-        response = requests.request("GET", url)
+        response = get_session(url).request("GET", url)
         data = response.json()
         info = self._into_repository(data)
         print("Payload deets", asdict(info))
@@ -112,13 +113,13 @@ class GitHub(Forge):
         url = self._get_url("/users/repos/")
         payload = {"name": repo, "description": description}
         headers = self._auth()
-        _response = requests.request("POST", url, json=payload, headers=headers)
+        _response = get_session(url).request("POST", url, json=payload, headers=headers)
 
     def subscribe(self, owner: str, repo: str):
         """Subscribes/watches a repository"""
         url = self._get_url(format("/repos/%s/%s/subscription" % (owner, repo)))
         headers = self._auth()
-        _response = requests.request("PUT", url, headers=headers)
+        _response = get_session(url).request("PUT", url, headers=headers)
 
     def _into_notification(self, n) -> Notification:
         # rn: Repository Notification
@@ -134,12 +135,16 @@ class GitHub(Forge):
             state=subject["state"],
             id=n["id"],
             repo_url=n["repository"]["html_url"],
+            web_url=subject["url"]
+            .replace("api.github.com/repos/", "github.com/")
+            .replace("/pulls/", "/pull/"),
         )
 
         if notification_type == REPOSITORY:
             print(n)
         elif notification_type == PULL:
-            rn.pr_url = requests.request("GET", subject["url"]).json()["html_url"]
+            pr_url = subject["url"]
+            rn.pr_url = get_session(pr_url).request("GET", pr_url).json()["html_url"]
 
             rn.upstream = n["repository"]["description"]
             print(n["repository"]["description"])
@@ -147,7 +152,7 @@ class GitHub(Forge):
             comment_url = subject["latest_comment_url"]
             print(comment_url)
             if len(comment_url) != 0:
-                resp = requests.request("GET", comment_url)
+                resp = get_session(comment_url).request("GET", comment_url)
                 comment = resp.json()
 
                 pr_url = comment["pull_request_url"]
@@ -178,7 +183,7 @@ class GitHub(Forge):
         # to the notifications section
         url = self._get_url("/notifications")
         headers = self._auth()
-        response = requests.request("GET", url, params=query, headers=headers)
+        response = get_session(url).request("GET", url, params=query, headers=headers)
         notifications = response.json()
 
         # Setting last_read to a string
@@ -186,8 +191,8 @@ class GitHub(Forge):
         last_read = query["since"]
         val = []
 
-        for n in notifications:
-            rn = self._into_notification(n)
+        # details of all notifications are fetched at once
+        for rn in map_concurrently(self._into_notification, notifications):
             last_read = rn.updated_at
             val.append(rn)
         return NotificationResp(val, date_parse(last_read))
@@ -205,7 +210,7 @@ class GitHub(Forge):
         payload["labels"] = [0]
         payload["milestones"] = 0
 
-        response = requests.request("POST", url, json=payload, headers=headers)
+        response = get_session(url).request("POST", url, json=payload, headers=headers)
         print(response.json())
         return response.json()
 
@@ -0,0 +1,230 @@
+"""
+HTTP sessions shared by all requests made to a forge
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlparse
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from interface.settings import settings
+from interface.error import F_D_FORGE_RATE_LIMITED
+from interface.forges.http_cache import HTTPCache, get_http_cache
+from interface.forges.ratelimit import (
+    RateLimiter,
+    HTTP_RATE_LIMIT,
+    HTTP_MAX_RETRIES,
+    HTTP_MAX_BACKOFF,
+    THROTTLED,
+    backoff,
+    retry_after,
+)
+
+# Maximum number of idle keep-alive connections kept open to a host
+HTTP_POOL_SIZE = settings.SYSTEM.get("http_pool_size", 16)
+HTTP_CONNECT_TIMEOUT = settings.SYSTEM.get("http_connect_timeout", 5)  # in seconds
+HTTP_READ_TIMEOUT = settings.SYSTEM.get("http_read_timeout", 30)  # in seconds
+# Maximum number of requests made in parallel by map_concurrently
+HTTP_CONCURRENCY = settings.SYSTEM.get("http_concurrency", 8)
+# Number of items requested per page from paginated endpoints
+HTTP_PAGE_SIZE = settings.SYSTEM.get("http_page_size", 50)
+
+
+class ForgeSession(Session):
+    """
+    Session with a connection pool sized for concurrent use and default
+    timeouts. Safe to share between threads as long as no one mutates it
+    after set up. GET responses are revalidated against cache, when set.
+    Requests are paced by limiter, when set, and throttled requests are
+    retried after a jittered backoff. F_D_FORGE_RATE_LIMITED is raised when
+    the forge asks to wait for longer than HTTP_MAX_BACKOFF.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: (int, int) = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        cache: HTTPCache = None,
+        limiter: RateLimiter = None,
+        retries: int = HTTP_MAX_RETRIES,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter
+        self.retries = retries
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+    def send(self, request, **kwargs):
+        cacheable = all(
+            [
+                self.cache is not None,
+                request.method == "GET",
+                not kwargs.get("stream", False),
+                "If-None-Match" not in request.headers,
+                "If-Modified-Since" not in request.headers,
+            ]
+        )
+        if not cacheable:
+            return self.__send(request, **kwargs)
+
+        cached = self.cache.get(request.url)
+        if cached is not None:
+            request.headers.update(cached.conditional_headers())
+        resp = self.__send(request, **kwargs)
+        if resp.status_code == 304 and cached is not None:
+            return cached.into_response(resp)
+        if resp.status_code == 200:
+            self.cache.store(request.url, resp)
+        return resp
+
+    def __send(self, request, **kwargs):
+        write = request.method not in ["GET", "HEAD"]
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(write=write)
+            resp = super().send(request, **kwargs)
+            if self.limiter is not None:
+                self.limiter.update(resp)
+
+            # a write that got a 503 may have been carried out
+            retryable = resp.status_code == 429 or (
+                resp.status_code in THROTTLED and not write
+            )
+            if not retryable or attempt >= self.retries:
+                return resp
+
+            delay = retry_after(resp)
+            if delay is not None and delay > HTTP_MAX_BACKOFF:
+                # don't hold up every request to the host for that long
+                resp.close()
+                if self.limiter is not None:
+                    self.limiter.pause(HTTP_MAX_BACKOFF)
+                raise F_D_FORGE_RATE_LIMITED
+            if delay is None:
+                delay = backoff(attempt)
+            else:
+                # spread out clients that were told to come back at the same time
+                delay += backoff(0)
+            if self.limiter is not None:
+                self.limiter.pause(delay)
+            else:
+                time.sleep(delay)
+            resp.close()
+            attempt += 1
+
+
+__sessions = {}
+__sessions_lock = Lock()
+
+
+def __origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def get_session(url: str) -> ForgeSession:
+    """Get session of the host that url belongs to. Shared by all threads of the process"""
+    origin = __origin(url)
+    with __sessions_lock:
+        session = __sessions.get(origin)
+        if session is None:
+            limiter = RateLimiter() if HTTP_RATE_LIMIT > 0 else None
+            session = ForgeSession(cache=get_http_cache(), limiter=limiter)
+            __sessions[origin] = session
+        return session
+
+
+def set_default_headers(url: str, headers: dict):
+    """Send headers, authentication for instance, with every request to host of url"""
+    session = get_session(url)
+    with __sessions_lock:
+        session.headers.update(headers)
+
+
+def map_concurrently(fn, items: list, workers: int = HTTP_CONCURRENCY) -> list:
+    """
+    Apply fn, which is expected to make HTTP requests, to items using up to
+    workers threads. Results are in the order of items. The first exception
+    raised by fn is re-raised once all items are processed.
+    """
+    if len(items) <= 1 or workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def _next_page(response, url: str, params: dict) -> (str, dict):
+    """Request for the page after response. Returns None on the last page"""
+    if "Link" in response.headers:
+        next_page = response.links.get("next")
+        if next_page is None:
+            return None
+        # URL in Link header carries page and limit
+        return (next_page["url"], None)
+    # forge doesn't send Link headers: a short page is the last one
+    if params is None or len(response.json()) < params["limit"]:
+        return None
+    return (url, {**params, "page": params["page"] + 1})
+
+
+def paginate(
+    url: str, params: dict = None, page_size: int = HTTP_PAGE_SIZE, prefetch=True
+):
+    """
+    Iterate over responses of all pages of url, following Link headers.
+    When prefetch is set, the next page is fetched while the caller consumes
+    the current one. Pagination stops after a response that isn't 200 OK or
+    when the caller stops iterating.
+    """
+    session = get_session(url)
+    params = {"page": 1, **(params or {}), "limit": page_size}
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    try:
+        response = session.get(url, params=params)
+        while True:
+            next_page = None
+            if response.status_code == 200:
+                next_page = _next_page(response, url, params)
+            if next_page is None:
+                yield response
+                return
+
+            (url, params) = next_page
+            if executor is not None:
+                pending = executor.submit(session.get, url, params=params)
+            yield response
+            if pending is not None:
+                (response, pending) = (pending.result(), None)
+            else:
+                response = session.get(url, params=params)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
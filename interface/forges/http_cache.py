@@ -0,0 +1,263 @@
+"""
+On-disk cache of forge responses, revalidated with conditional requests
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from interface.db.conn import get_pool
+from interface.settings import settings
+
+# Location of the cache file. Defaults to http-cache.db in the instance folder
+HTTP_CACHE_PATH = settings.SYSTEM.get("http_cache_path", None)
+# Upper bound on the size of cached bodies. 0 disables the cache
+HTTP_CACHE_SIZE = settings.SYSTEM.get("http_cache_size", 64 * 1024 * 1024)  # in bytes
+# Number of cache hits after which their access times are written out
+ACCESS_FLUSH_SIZE = 64
+# Upper bound on the time access times of cache hits are held in memory
+ACCESS_FLUSH_INTERVAL = 30  # in seconds
+# Eviction frees this fraction of size, so that it doesn't run on every store
+EVICTION_HEADROOM = 0.1
+
+
+@dataclass
+class CachedResponse:
+    """Body of a response and the validators it was served with"""
+
+    url: str
+    etag: str
+    last_modified: str
+    headers: dict
+    body: bytes
+
+    def conditional_headers(self) -> dict:
+        """Headers that ask the forge to reply with 304 when nothing changed"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def into_response(self, not_modified: Response) -> Response:
+        """Response equivalent to the one that was cached, for a 304 reply"""
+        resp = Response()
+        resp.status_code = 200
+        resp.reason = "OK"
+        resp.url = self.url
+        resp.headers = CaseInsensitiveDict(self.headers)
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp._content = self.body
+        resp.request = not_modified.request
+        resp.connection = not_modified.connection
+        resp.elapsed = not_modified.elapsed
+        return resp
+
+
+class HTTPCache:
+    """
+    Cache of GET responses that carry an ETag or Last-Modified validator.
+    Least recently used responses are evicted once their bodies exceed
+    size bytes. The cache lives in its own SQLite file; it is disposable,
+    so its schema isn't managed by migrations.
+
+    Access times of cache hits are batched in memory, so recency is
+    approximate. The size of stored bodies is tracked as a running total,
+    which is recounted from the table only when it goes over size.
+    """
+
+    def __init__(self, path: str, size: int = HTTP_CACHE_SIZE):
+        self.path = path
+        self.size = size
+        self.lock = Lock()
+        self.accessed = {}
+        self.flushed_at = time.monotonic()
+        conn = get_pool(path).acquire()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    url TEXT PRIMARY KEY NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                );
+            """
+            )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS http_cache_accessed
+                    ON http_cache(accessed);
+            """
+            )
+            conn.commit()
+            self.total = self.__count(conn)
+        finally:
+            get_pool(path).release(conn)
+
+    @staticmethod
+    def __count(conn) -> int:
+        """Size of all stored bodies"""
+        row = conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache;").fetchone()
+        return row[0]
+
+    def __flush_accessed(self, conn):
+        """Write out access times of cache hits. Caller holds self.lock"""
+        if len(self.accessed) != 0:
+            conn.executemany(
+                "UPDATE http_cache SET accessed = ? WHERE url = ?;",
+                [(accessed, url) for (url, accessed) in self.accessed.items()],
+            )
+            self.accessed.clear()
+        self.flushed_at = time.monotonic()
+
+    def get(self, url: str) -> CachedResponse:
+        """Get response cached for url. Returns None if it isn't cached"""
+        conn = get_pool(self.path).acquire()
+        try:
+            row = conn.execute(
+                """
+                SELECT etag, last_modified, headers, body
+                FROM http_cache WHERE url = ?;
+            """,
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self.lock:
+                self.accessed[url] = time.time()
+                if any(
+                    [
+                        len(self.accessed) >= ACCESS_FLUSH_SIZE,
+                        time.monotonic() - self.flushed_at >= ACCESS_FLUSH_INTERVAL,
+                    ]
+                ):
+                    self.__flush_accessed(conn)
+                    conn.commit()
+        finally:
+            get_pool(self.path).release(conn)
+        return CachedResponse(
+            url=url,
+            etag=row["etag"],
+            last_modified=row["last_modified"],
+            headers=json.loads(row["headers"]),
+            body=row["body"],
+        )
+
+    def store(self, url: str, resp: Response):
+        """Cache resp, if it is cacheable, and evict least recently used responses"""
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        if "no-store" in resp.headers.get("Cache-Control", ""):
+            return
+        body = resp.content
+        if len(body) > self.size:
+            return
+
+        conn = get_pool(self.path).acquire()
+        try:
+            with self.lock:
+                replaced = conn.execute(
+                    "SELECT size FROM http_cache WHERE url = ?;", (url,)
+                ).fetchone()
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO http_cache
+                        (url, etag, last_modified, headers, body, size, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?);
+                """,
+                    (
+                        url,
+                        etag,
+                        last_modified,
+                        json.dumps(dict(resp.headers)),
+                        body,
+                        len(body),
+                        time.time(),
+                    ),
+                )
+                self.accessed.pop(url, None)
+                self.total += len(body) - (0 if replaced is None else replaced[0])
+                if self.total > self.size:
+                    self.__evict(conn)
+                conn.commit()
+        finally:
+            get_pool(self.path).release(conn)
+
+    def __evict(self, conn):
+        """Evict least recently used responses. Caller holds self.lock"""
+        self.__flush_accessed(conn)
+        # other processes sharing the file store responses too
+        self.total = self.__count(conn)
+        target = self.size * (1 - EVICTION_HEADROOM)
+        evicted = []
+        rows = conn.execute("SELECT url, size FROM http_cache ORDER BY accessed;")
+        for (url, size) in rows:
+            if self.total <= target:
+                break
+            evicted.append((url,))
+            self.total -= size
+        conn.executemany("DELETE FROM http_cache WHERE url = ?;", evicted)
+
+    def clear(self):
+        conn = get_pool(self.path).acquire()
+        try:
+            with self.lock:
+                conn.execute("DELETE FROM http_cache;")
+                conn.commit()
+                self.accessed.clear()
+                self.total = 0
+        finally:
+            get_pool(self.path).release(conn)
+
+
+__http_cache = None
+__http_cache_path = HTTP_CACHE_PATH
+__http_cache_lock = Lock()
+
+
+def init_app(app):
+    """Keep the cache in the instance folder of app, unless configured otherwise"""
+    global __http_cache_path
+    if HTTP_CACHE_PATH is None:
+        __http_cache_path = app.config["HTTP_CACHE"]
+
+
+def get_http_cache() -> HTTPCache:
+    """
+    Get HTTP cache configured in settings. Shared by all threads of the
+    process. Returns None when the cache is disabled or has no location yet
+    """
+    global __http_cache
+    if HTTP_CACHE_SIZE <= 0 or __http_cache_path is None:
+        return None
+    if __http_cache is None:
+        with __http_cache_lock:
+            if __http_cache is None:
+                __http_cache = HTTPCache(__http_cache_path)
+    return __http_cache
@@ -0,0 +1,151 @@
+"""
+Pace requests made to a forge to stay within its rate limits
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Condition
+
+from interface.settings import settings
+
+# Sustained number of requests made to a host per second. 0 disables pacing
+HTTP_RATE_LIMIT = settings.SYSTEM.get("http_rate_limit", 10)
+# Number of requests that can be made in a burst, after a quiet period
+HTTP_RATE_BURST = settings.SYSTEM.get("http_rate_burst", 20)
+# Number of times a throttled (429/503) request is retried
+HTTP_MAX_RETRIES = settings.SYSTEM.get("http_max_retries", 3)
+HTTP_BACKOFF = settings.SYSTEM.get("http_backoff", 1)  # in seconds
+HTTP_MAX_BACKOFF = settings.SYSTEM.get("http_max_backoff", 60)  # in seconds
+
+THROTTLED = [429, 503]
+
+
+def retry_after(resp) -> float:
+    """Seconds to wait before retrying, as asked by the forge. None if it didn't ask"""
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, base: float = HTTP_BACKOFF) -> float:
+    """Delay before retry attempt, with full jitter"""
+    return random.uniform(0, min(HTTP_MAX_BACKOFF, base * 2**attempt))
+
+
+class RateLimiter:
+    """
+    Token bucket that paces requests made to a single host.
+
+    Tokens refill at rate per second, up to burst. Requests that write
+    (anything but GET and HEAD) are handed tokens ahead of waiting reads so
+    that syncs can't starve them. The rate is lowered to what the forge
+    reports is left of its budget through X-RateLimit-* headers, and all
+    requests are held back for as long as it asks through Retry-After or
+    until the budget is replenished. No pause is longer than max_pause
+    seconds, so that a single response can't stall a host for hours.
+    """
+
+    def __init__(
+        self,
+        rate: float = HTTP_RATE_LIMIT,
+        burst: int = HTTP_RATE_BURST,
+        max_pause: float = HTTP_MAX_BACKOFF,
+    ):
+        self.rate = rate
+        self.max_pause = max_pause
+        self.configured_rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        # when the forge replenishes the budget it reported
+        self.reset_at = 0.0
+        self.waiting_writes = 0
+        self.cond = Condition()
+
+    def __refill(self, now: float):
+        if self.rate != self.configured_rate and now >= self.reset_at:
+            self.rate = self.configured_rate
+        elapsed = now - self.refilled_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.refilled_at = now
+
+    def acquire(self, write: bool = False):
+        """Block until a request can be made"""
+        with self.cond:
+            if write:
+                self.waiting_writes += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.__refill(now)
+                    if now < self.paused_until:
+                        delay = self.paused_until - now
+                    elif not write and self.waiting_writes > 0:
+                        delay = None
+                    elif self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    else:
+                        delay = (1 - self.tokens) / self.rate
+                    self.cond.wait(delay)
+            finally:
+                if write:
+                    self.waiting_writes -= 1
+                    self.cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold back all requests for seconds"""
+        seconds = min(seconds, self.max_pause)
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.cond.notify_all()
+
+    def update(self, resp):
+        """Adjust pace to rate limit headers of resp"""
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining = int(remaining)
+            # seconds until the budget is replenished; forges send an epoch
+            window = float(reset) - time.time()
+        except ValueError:
+            return
+
+        with self.cond:
+            now = time.monotonic()
+            self.__refill(now)
+            self.reset_at = now + max(0.0, window)
+            if remaining <= 0:
+                pause_until = min(self.reset_at, now + self.max_pause)
+                self.paused_until = max(self.paused_until, pause_until)
+            # spread what is left of the budget over the rest of the window
+            self.rate = min(self.configured_rate, remaining / max(1.0, window))
+            self.rate = max(self.rate, 1 / self.max_pause)
+            self.tokens = min(self.tokens, remaining)
+            self.cond.notify_all()
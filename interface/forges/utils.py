@@ -17,17 +17,18 @@ Utility functions to work with forges
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from urllib.parse import urlparse
-import requests
 
 from interface.utils import clean_url, trim_url
 
 from interface.db import DBUser
 
+from .http import get_session
+
 
 def get_patch(url: str) -> str:
     """Get patch from pull request"""
     url = f"{trim_url(url)}.patch"
-    resp = requests.get(url)
+    resp = get_session(url).get(url)
     if resp.status_code == 200:
         return resp.text
 
@@ -17,18 +17,21 @@ Helper class to interact with git repositories
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import datetime
+from threading import Lock
 from urllib.parse import urlparse
 import rfc3339
-from flask import g
 
 from libgit import InterfaceAdmin, Repo, Patch, System
 from interface.settings import settings
 
-from interface.db import get_db, get_git_system, DBUser, DBRepo, DBIssue
+from interface.db import get_db, get_git_system, unit_of_work
+from interface.db import DBUser, DBRepo, DBIssue
+from interface.db.cache import cache_key
 from interface.forges.utils import get_branch_name
 from interface.forges.base import Forge
 from interface.forges.gitea import Gitea
 from interface.forges.payload import RepositoryInfo
+from interface.singleflight import get_single_flight
 
 
 class Git:
@@ -96,22 +99,37 @@ class Git:
         if fork_exists:
             return fork_exists[0]
         fork_repo_name = self.forge.fork_inner(owner, repo)
-        cur.execute(
-            """
-            INSERT INTO forks 
-            (parent_owner, parent_repo_name, fork_repo_name)
-            VALUES (?,?,?);
-            """,
-            (owner, repo, fork_repo_name),
-        ).fetchone()
+        with unit_of_work():
+            cur.execute(
+                """
+                INSERT INTO forks
+                (parent_owner, parent_repo_name, fork_repo_name)
+                VALUES (?,?,?);
+                """,
+                (owner, repo, fork_repo_name),
+            ).fetchone()
         return fork_repo_name
 
 
+__forge = None
+__forge_lock = Lock()
+
+
 def get_forge() -> Git:
-    if "git" not in g:
-        forge = Gitea()
-        g.git = Git(forge, settings.GITEA.username, settings.SYSTEM.admin_email)
-    return g.git
+    """
+    Get forge client. It is set up (logged in, registered with northstar) on
+    first use and is shared by all threads of the process
+    """
+    global __forge
+    if __forge is None:
+        with __forge_lock:
+            if __forge is None:
+                forge = Gitea()
+                forge.html_client.start_session_refresh()
+                __forge = Git(
+                    forge, settings.GITEA.username, settings.SYSTEM.admin_email
+                )
+    return __forge
 
 
 def get_user(username: str) -> DBUser:
@@ -121,35 +139,48 @@ def get_user(username: str) -> DBUser:
     """
     user = DBUser.load(username)
     if user is None:
-        git = get_forge()
-        print(f"gettings user: {username}")
-        user = git.forge.get_user(username).to_db_user()
+        # only the forge's response is shared, each caller stores and loads
+        # the user on its own connection
+        user = get_single_flight().do(
+            cache_key("forge", "user", username), lambda: __fetch_user(username)
+        ).to_db_user()
         user.save()
     return user
 
 
-def __get_and_store_repo(owner: str, name: str) -> DBRepo:
+def __fetch_user(username: str):
     git = get_forge()
-    print(f" requesting data for user {owner}")
-    user = get_user(owner)
-    user.save()
-    repo_info = git.forge.get_repository(owner=owner, repo=name)
+    print(f"gettings user: {username}")
+    return git.forge.get_user(username)
+
+
+def __get_and_store_repo(owner: str, name: str) -> DBRepo:
+    repo_info = get_single_flight().do(
+        cache_key("forge", "repo", owner, name),
+        lambda: __fetch_repo(owner=owner, name=name),
+    )
     repo = DBRepo(
         name=repo_info.name,
         description=repo_info.description,
         html_url=repo_info.html_url,
-        owner=user,
+        owner=get_user(owner),
     )
     repo.save()
     return repo
 
 
+def __fetch_repo(owner: str, name: str) -> RepositoryInfo:
+    git = get_forge()
+    print(f" requesting data for user {owner}")
+    return git.forge.get_repository(owner=owner, repo=name)
+
+
 def get_repo_from_actor_name(name: str) -> DBRepo:
     """
     Get repo from database.
     When repo not available in DB, get from forge, store and return
     """
-    repo = DBRepo.from_actor_name(name)
+    repo = DBRepo.load_with_actor_name(name)
     if repo is None:
         (owner, repo_name) = DBRepo.split_actor_name(name)
         repo = __get_and_store_repo(owner=owner, name=repo_name)
@@ -172,10 +203,12 @@ def __get_and_store_issue(owner: str, repo: str, issue_id: int) -> DBRepo:
     issue_url = git.forge.get_issue_html_url(owner=owner, repo=repo, issue_id=issue_id)
     issue = DBIssue.load_with_html_url(issue_url)
     if issue is None:
-        issue = git.forge.get_issue(owner=owner, repo=repo, issue_id=issue_id)
+        issue = get_single_flight().do(
+            cache_key("forge", "issue", owner, repo, str(issue_id)),
+            lambda: git.forge.get_issue(owner=owner, repo=repo, issue_id=issue_id),
+        )
         is_closed = issue.state == "closed"
         user = issue.user.to_db_user()
-        user.save()
         repo = get_repo(name=issue.repository.name, owner=issue.repository.owner)
         issue = DBIssue(
             title=issue.title,
@@ -190,6 +223,8 @@ def __get_and_store_issue(owner: str, repo: str, issue_id: int) -> DBRepo:
             is_native=True,
             user=user,
         )
+        # saves its author too; not within a unit of work here, so that keys
+        # of new actors are taken without holding the write lock
         issue.save()
     return issue
 
@@ -199,8 +234,10 @@ def get_issue_from_actor_name(name: str) -> DBRepo:
     Get issue from database.
     When issue not available in DB, get from forge, store and return
     """
-    (owner, repo, issue_id) = DBIssue.split_actor_name(name)
-    issue = __get_and_store_issue(owner=owner, repo=repo, issue_id=issue_id)
+    issue = DBIssue.load_with_actor_name(name)
+    if issue is None:
+        (owner, repo, issue_id) = DBIssue.split_actor_name(name)
+        issue = __get_and_store_issue(owner=owner, repo=repo, issue_id=issue_id)
     return issue
 
 
@@ -16,23 +16,25 @@ Repository activity pub routes
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from flask import Blueprint, request, redirect
+from flask import Blueprint, request
 
+from interface.db.render import ISSUE, get_rendered_actor, render_actor, actor_response
 from interface.error import internal_server_error
 from interface.git import get_issue_from_actor_name
-from interface.utils import CONTENT_TYPE_ACTIVITY_JSON, activity_json
 
 bp = Blueprint("activity-pub-issue", __name__, url_prefix="/i/")
 
 
+def __render(issue_id) -> dict:
+    issue = get_issue_from_actor_name(issue_id)
+    return render_actor(issue, issue.html_url)
+
+
 @bp.route("<issue_id>", methods=["GET"])
 def actor(issue_id):
     """get actor data"""
-    issue = get_issue_from_actor_name(issue_id)
-    if "Accept" in request.headers:
-        if CONTENT_TYPE_ACTIVITY_JSON in request.headers["Accept"]:
-            return activity_json(issue.to_actor())
-    return redirect(issue.html_url)
+    rendered = get_rendered_actor(ISSUE, issue_id, lambda: __render(issue_id))
+    return actor_response(rendered)
 
 
 @bp.route("<issue_id>/inbox", methods=["POST"])
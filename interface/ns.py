@@ -17,12 +17,12 @@ Name service: find interfaces that can work with forges
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from urllib.parse import urlunparse, urlparse
-from functools import lru_cache
 
 import requests
 
 from interface.settings import settings
-from interface.utils import clean_url, since_epoch, trim_url
+from interface.cache import get_cache
+from interface.utils import clean_url, trim_url
 from interface.error import Error
 
 
@@ -56,21 +56,19 @@ class NameService:
         if resp.status_code == 200:
             print("registered interface")
 
-    @lru_cache(maxsize=30)
-    def __query_wrapped(self, forge_url: str) -> ([str], int):
+    def __query(self, forge_url: str) -> [str]:
         url = "forge/interfaces"
         url = self._get_url(url)
         payload = {"forge_url": forge_url}
         resp = requests.post(url, json=payload)
         interfaces = resp.json()
-        return (interfaces, since_epoch())
+        return interfaces
 
     def query(self, forge_url: str) -> [str]:
         """Get interfaces that service a forge"""
-        (interfaces, created_at) = self.__query_wrapped(forge_url)
-        if since_epoch() - created_at > self.__CACHE_TTL:
-            self.__query_wrapped.cache_clear()
-            print("purging cache")
-            (interfaces, _) = self.__query_wrapped(forge_url)
-
-        return interfaces
+        cache = get_cache()
+        return cache.get_or_compute(
+            cache.key("ns", self.ns.netloc, forge_url),
+            lambda: self.__query(forge_url),
+            self.__CACHE_TTL,
+        )
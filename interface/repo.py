@@ -16,23 +16,25 @@ Repository activity pub routes
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from flask import Blueprint, request, redirect
+from flask import Blueprint, request
 
+from interface.db.render import REPO, get_rendered_actor, render_actor, actor_response
 from interface.error import internal_server_error
 from interface.git import get_repo_from_actor_name
-from interface.utils import CONTENT_TYPE_ACTIVITY_JSON, activity_json
 
 bp = Blueprint("activity-pub-repo", __name__, url_prefix="/r/")
 
 
+def __render(repo_id) -> dict:
+    repo = get_repo_from_actor_name(repo_id)
+    return render_actor(repo, repo.html_url)
+
+
 @bp.route("<repo_id>", methods=["GET"])
 def actor(repo_id):
     """get actor data"""
-    repo = get_repo_from_actor_name(repo_id)
-    if "Accept" in request.headers:
-        if CONTENT_TYPE_ACTIVITY_JSON in request.headers["Accept"]:
-            return activity_json(repo.to_actor())
-    return redirect(repo.html_url)
+    rendered = get_rendered_actor(REPO, repo_id, lambda: __render(repo_id))
+    return actor_response(rendered)
 
 
 @bp.route("<repo_id>/inbox", methods=["POST"])
@@ -40,6 +40,13 @@ class RunNotification:
         """get mandatory fields"""
         raise NotImplementedError
 
+    def run(self):
+        """Do the forge and git I/O of the job. Runs outside of any transaction"""
+        raise NotImplementedError
+
+    def save(self):
+        """Store results of run(). Runs within a unit of work"""
+
 
 def resolve_notification(n: Notification) -> RunNotification:
     """Convert Notification into runnable unit of work"""
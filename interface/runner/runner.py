@@ -28,9 +28,10 @@ from flask import g
 
 from interface.settings import settings
 from interface.git import get_forge
-from interface.forges.notifications import PULL, ISSUE
+from interface.forges.notifications import Notification, PULL, ISSUE
 from interface.forges.utils import get_patch, get_branch_name
-from interface.db import get_db
+from interface.db import get_db, unit_of_work
+from interface.db.keys import get_key_pool
 from interface.runner.events import resolve_notification
 
 RUNNING = False
@@ -116,11 +117,23 @@ class Runner:
                     since=date_parse(last_run)
                 )
                 for n in notifications.notifications:
-                    resolve_notification(n).run()
+                    run_job(n)
 
             time.sleep(settings.SYSTEM.job_runner_delay)
 
 
+def run_job(n: Notification):
+    """
+    Run job of notification. Its forge and git I/O is done before the unit
+    of work is opened, so the write lock is only held while it stores results
+    """
+    job = resolve_notification(n)
+    job.run()
+    with unit_of_work():
+        job.save()
+
+
 def init_app(app):
+    get_key_pool().start(app)
     runner = Runner(app)
     return runner
@@ -0,0 +1,102 @@
+"""
+De-duplicate concurrent invocations of the same work
+"""
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Event, Lock
+
+from interface.settings import settings
+
+# For how long (in seconds) a failure is handed to callers instead of retrying
+SINGLE_FLIGHT_ERROR_TTL = settings.SYSTEM.get("single_flight_error_ttl", 5)
+
+
+class Flight:
+    """Work in progress"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one invocation of the work identified by a key at a time.
+    Callers that arrive while it is in progress wait for it and get its
+    result instead of doing the same work again. When the work fails, the
+    error is handed to callers for error_ttl seconds.
+    """
+
+    def __init__(self, error_ttl: int = SINGLE_FLIGHT_ERROR_TTL):
+        self.error_ttl = error_ttl
+        self.flights = {}
+        self.errors = {}
+        self.lock = Lock()
+
+    def do(self, key, work):
+        """Invoke work, unless an invocation with the same key is in progress"""
+        with self.lock:
+            error = self.errors.get(key)
+            if error is not None:
+                (error, expires_at) = error
+                if expires_at > time.time():
+                    raise error
+                del self.errors[key]
+
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = work()
+        except Exception as e:
+            flight.error = e
+            if self.error_ttl > 0:
+                now = time.time()
+                with self.lock:
+                    for (stale, (_, expires_at)) in list(self.errors.items()):
+                        if expires_at <= now:
+                            del self.errors[stale]
+                    self.errors[key] = (e, now + self.error_ttl)
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+    def forget(self, key):
+        """Discard error shared for key"""
+        with self.lock:
+            self.errors.pop(key, None)
+
+
+__single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get single flight group of this process"""
+    return __single_flight
@@ -24,6 +24,7 @@ from flask import Blueprint, jsonify, Response, request, redirect
 from interface.settings import settings
 
 from interface.db import DBIssue, DBUser, DBRepo, INTERFACE_DOMAIN
+from interface.db.render import USER, get_rendered_actor, render_actor, actor_response
 from interface.git import get_forge, get_user
 from interface.error import bad_req, internal_server_error
 from interface.utils import activity_json, CONTENT_TYPE_ACTIVITY_JSON
@@ -31,14 +32,16 @@ from interface.utils import activity_json, CONTENT_TYPE_ACTIVITY_JSON
 bp = Blueprint("activity-pub-user", __name__, url_prefix="/u/")
 
 
+def __render(username) -> dict:
+    user = get_user(username)
+    return render_actor(user, user.profile_url)
+
+
 @bp.route("<username>", methods=["GET"])
 def actor(username):
     """get actor data"""
-    user = get_user(username)
-    if "Accept" in request.headers:
-        if CONTENT_TYPE_ACTIVITY_JSON in request.headers["Accept"]:
-            return activity_json(user.to_actor())
-    return redirect(user.profile_url)
+    rendered = get_rendered_actor(USER, username, lambda: __render(username))
+    return actor_response(rendered)
 
 
 @bp.route("<username>/inbox", methods=["POST"])
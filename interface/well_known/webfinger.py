@@ -19,7 +19,12 @@ Webfinger route
 from flask import Blueprint, jsonify, request
 
 from interface.db import INTERFACE_DOMAIN
-from interface.git import get_issue, get_user, get_repo
+from interface.db.webfinger import (
+    cache_webfinger,
+    get_cached_webfinger,
+    get_negative_cache,
+)
+from interface.git import get_user, get_repo_from_actor_name, get_issue_from_actor_name
 from interface.error import Error, bad_req, internal_server_error
 
 bp = Blueprint("webfinger", __name__, url_prefix="/webfinger")
@@ -42,6 +47,7 @@ def webfinger():
         return bad_req()
     if any(["acct:" not in resource, "@" not in resource]):
         return bad_req()
+    subject = None
     try:
         parts = resource.split("acct:")
         parts = parts[1].split("@")
@@ -49,24 +55,30 @@ def webfinger():
         domain = parts[1]
         if domain != INTERFACE_DOMAIN:
             return bad_req()
+
+        subject = f"acct:{username}@{domain}"
+        jrd = get_cached_webfinger(subject)
+        if jrd is not None:
+            return set_jrd_json(jrd)
+        error = get_negative_cache().get(subject)
+        if error is not None:
+            return error.get_error_resp()
+
         if "!" not in username:
             user = get_user(username)
-            return set_jrd_json(user.webfinger())
+            return set_jrd_json(cache_webfinger(user))
 
         username_parts = username.split("!")
-        owner = username_parts[1]
-        name = username_parts[2]
-        repo = get_repo(name=name, owner=owner)
 
         if len(username_parts) == 3:
-            return set_jrd_json(repo.webfinger())
+            repo = get_repo_from_actor_name(username)
+            return set_jrd_json(cache_webfinger(repo))
 
         if len(username_parts) == 5:
-            repo_scope_id = username_parts[4]
             # "!owner!repo!<issue/pull>!id"
             if username_parts[3] == "issue":
-                issue = get_issue(owner=owner, repo=name, issue_id=repo_scope_id)
-                return set_jrd_json(issue.webfinger())
+                issue = get_issue_from_actor_name(username)
+                return set_jrd_json(cache_webfinger(issue))
 
             if username_parts[3] == "pull":
                 print("pull")
@@ -75,5 +87,8 @@ def webfinger():
     except Exception as e:
         print("caught exception {e}")
         if isinstance(e, Error):
+            if e.status == 404 and subject is not None:
+                # forge reported that the actor doesn't exist
+                get_negative_cache().add(subject, e)
             return e.get_error_resp()
         return internal_server_error()
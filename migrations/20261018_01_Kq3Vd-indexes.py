@@ -0,0 +1,46 @@
+"""
+indexes
+"""
+
+from yoyo import step
+
+__depends__ = {"20220116_01_Ur7VF-activities"}
+
+steps = [
+    step(
+        """
+        -- active users in period: COUNT(DISTINCT user_id) WHERE created >= ?
+        CREATE INDEX IF NOT EXISTS activities_created_user_id
+            ON activities(created, user_id);
+    """,
+        "DROP INDEX IF EXISTS activities_created_user_id;",
+    ),
+    step(
+        """
+        -- ON DELETE CASCADE from gitea_forge_issues and gitea_issue_comments
+        CREATE INDEX IF NOT EXISTS activities_issue_id ON activities(issue_id);
+    """,
+        "DROP INDEX IF EXISTS activities_issue_id;",
+    ),
+    step(
+        """
+        CREATE INDEX IF NOT EXISTS activities_comment_id ON activities(comment_id);
+    """,
+        "DROP INDEX IF EXISTS activities_comment_id;",
+    ),
+    step(
+        """
+        -- comment threads are loaded in order of creation
+        CREATE INDEX IF NOT EXISTS gitea_issue_comments_belongs_to_issue_created
+            ON gitea_issue_comments(belongs_to_issue, created);
+    """,
+        "DROP INDEX IF EXISTS gitea_issue_comments_belongs_to_issue_created;",
+    ),
+    step(
+        """
+        CREATE INDEX IF NOT EXISTS forks_parent
+            ON forks(parent_owner, parent_repo_name, fork_repo_name);
+    """,
+        "DROP INDEX IF EXISTS forks_parent;",
+    ),
+]
@@ -0,0 +1,57 @@
+"""
+table stats
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_01_Kq3Vd-indexes"}
+
+# tables whose number of rows is published in nodeinfo
+COUNTED_TABLES = ["gitea_users", "gitea_issue_comments", "activities"]
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS table_stats (
+            table_name TEXT PRIMARY KEY NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0
+        );
+    """,
+        "DROP TABLE IF EXISTS table_stats;",
+    ),
+]
+
+for table in COUNTED_TABLES:
+    steps.extend(
+        [
+            step(
+                f"""
+                INSERT INTO table_stats (table_name, row_count)
+                    VALUES ('{table}', (SELECT COUNT(*) FROM {table}));
+            """,
+                f"DELETE FROM table_stats WHERE table_name = '{table}';",
+            ),
+            step(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE table_stats SET row_count = row_count + 1
+                    WHERE table_name = '{table}';
+                END;
+            """,
+                f"DROP TRIGGER IF EXISTS {table}_count_insert;",
+            ),
+            step(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE table_stats SET row_count = row_count - 1
+                    WHERE table_name = '{table}';
+                END;
+            """,
+                f"DROP TRIGGER IF EXISTS {table}_count_delete;",
+            ),
+        ]
+    )
@@ -0,0 +1,22 @@
+"""
+daily active users
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_02_m7XcT-table-stats"}
+
+steps = [
+    step(
+        """
+        -- users that have created at least one activity on a given day
+        -- day = activities.created / (60 * 60 * 24)
+        CREATE TABLE IF NOT EXISTS daily_active_users (
+            day INTEGER NOT NULL,
+            user_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            PRIMARY KEY(day, user_id)
+        ) WITHOUT ROWID;
+    """,
+        "DROP TABLE IF EXISTS daily_active_users;",
+    ),
+]
@@ -0,0 +1,48 @@
+"""
+spare keys
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_03_Zp4wN-daily-active-users"}
+
+steps = [
+    step(
+        """
+        -- keys generated ahead of time, handed out to actors as they are created
+        CREATE TABLE IF NOT EXISTS spare_keys (
+            ID INTEGER PRIMARY KEY NOT NULL,
+            private_key TEXT NOT NULL
+        );
+    """,
+        "DROP TABLE IF EXISTS spare_keys;",
+    ),
+    step(
+        """
+        INSERT INTO table_stats (table_name, row_count) VALUES ('spare_keys', 0);
+    """,
+        "DELETE FROM table_stats WHERE table_name = 'spare_keys';",
+    ),
+    step(
+        """
+        CREATE TRIGGER IF NOT EXISTS spare_keys_count_insert
+        AFTER INSERT ON spare_keys
+        BEGIN
+            UPDATE table_stats SET row_count = row_count + 1
+            WHERE table_name = 'spare_keys';
+        END;
+    """,
+        "DROP TRIGGER IF EXISTS spare_keys_count_insert;",
+    ),
+    step(
+        """
+        CREATE TRIGGER IF NOT EXISTS spare_keys_count_delete
+        AFTER DELETE ON spare_keys
+        BEGIN
+            UPDATE table_stats SET row_count = row_count - 1
+            WHERE table_name = 'spare_keys';
+        END;
+    """,
+        "DROP TRIGGER IF EXISTS spare_keys_count_delete;",
+    ),
+]
@@ -0,0 +1,123 @@
+"""
+public keys
+"""
+
+from cryptography.hazmat.primitives import serialization
+from yoyo import step
+
+__depends__ = {"20261018_04_Rb8sE-spare-keys"}
+
+ACTOR_TABLES = ["gitea_users", "gitea_forge_repositories", "gitea_forge_issues"]
+
+
+def public_key(private_key: str) -> str:
+    key = serialization.load_pem_private_key(private_key.encode("utf-8"), password=None)
+    pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return pem.decode("utf-8")
+
+
+def backfill(conn):
+    cur = conn.cursor()
+    for table in ACTOR_TABLES:
+        cur.execute(f"SELECT ID, private_key FROM {table} WHERE public_key IS NULL;")
+        rows = cur.fetchall()
+        for (db_id, private_key) in rows:
+            cur.execute(
+                f"UPDATE {table} SET public_key = ? WHERE ID = ?;",
+                (public_key(private_key), db_id),
+            )
+
+
+# Tables as they were before this migration. They are rebuilt on rollback,
+# ALTER TABLE ... DROP COLUMN needs SQLite 3.35
+TABLES = {
+    "gitea_users": """
+        CREATE TABLE gitea_users_old(
+            ID INTEGER PRIMARY KEY NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            user_id VARCHAR(250) UNIQUE NOT NULL,
+            profile_url TEXT UNIQUE NOT NULL,
+            avatar_url TEXT NOT NULL,
+            description TEXT NOT NULL,
+            private_key TEXT UNIQUE NOT NULL
+        );
+    """,
+    "gitea_forge_repositories": """
+        CREATE TABLE gitea_forge_repositories_old(
+            owner_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            description TEXT NOT NULL,
+            ID INTEGER PRIMARY KEY NOT NULL,
+            html_url TEXT NOT NULL UNIQUE,
+            private_key TEXT UNIQUE NOT NULL,
+            UNIQUE(owner_id, name)
+        );
+    """,
+    "gitea_forge_issues": """
+        CREATE TABLE gitea_forge_issues_old(
+            ID INTEGER PRIMARY KEY NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            html_url TEXT NOT NULL UNIQUE,
+            private_key TEXT NOT NULL UNIQUE,
+            created INTEGER NOT NULL,
+            updated INTEGER NOT NULL,
+            is_closed BOOLEAN NOT NULL DEFAULT FALSE,
+            is_merged BOOLEAN DEFAULT NULL,
+            -- is_native:
+                -- false: issue is PR and not merged
+                -- true: issue is PR and merged
+                -- false && val(is_closed) == true: issue is PR and is closed
+            is_native BOOLEAN NOT NULL DEFAULT TRUE,
+            repo_scope_id INTEGER NOT NULL,
+            user_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            repository INTEGER REFERENCES gitea_forge_repositories(ID) ON DELETE CASCADE NOT NULL,
+            UNIQUE(repository, repo_scope_id)
+        );
+    """,
+}
+
+
+def drop_public_key(table: str):
+    def rollback(conn):
+        cur = conn.cursor()
+        columns = ", ".join(
+            [
+                row[1]
+                for row in cur.execute(f"PRAGMA table_info({table});").fetchall()
+                if row[1] != "public_key"
+            ]
+        )
+        cur.execute(TABLES[table])
+        cur.execute(
+            f"INSERT INTO {table}_old ({columns}) SELECT {columns} FROM {table};"
+        )
+        cur.execute(f"DROP TABLE {table};")
+        cur.execute(f"ALTER TABLE {table}_old RENAME TO {table};")
+        # triggers are dropped along with the table
+        if table == "gitea_users":
+            for action in ["insert", "delete"]:
+                cur.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS gitea_users_count_{action}
+                    AFTER {action.upper()} ON gitea_users
+                    BEGIN
+                        UPDATE table_stats SET row_count = row_count {"+" if action == "insert" else "-"} 1
+                        WHERE table_name = 'gitea_users';
+                    END;
+                    """
+                )
+
+    return rollback
+
+
+steps = [
+    step(
+        f"ALTER TABLE {table} ADD COLUMN public_key TEXT;",
+        drop_public_key(table),
+    )
+    for table in ACTOR_TABLES
+] + [step(backfill)]
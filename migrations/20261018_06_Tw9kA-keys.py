@@ -0,0 +1,163 @@
+"""
+keys
+
+Move key material out of actor tables into a table of its own. Actor tables
+are rebuilt(SQLite can't drop UNIQUE columns) to reference keys by ID.
+"""
+
+import base64
+import hashlib
+
+from yoyo import step
+
+__depends__ = {"20261018_05_Hn2fQ-public-keys"}
+
+
+def fingerprint(public_key: str) -> str:
+    body = "".join(
+        [line for line in public_key.splitlines() if not line.startswith("-----")]
+    )
+    return hashlib.sha256(base64.b64decode(body)).hexdigest()
+
+
+TABLES = {
+    "gitea_users": """
+        CREATE TABLE gitea_users_new(
+            ID INTEGER PRIMARY KEY NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            user_id VARCHAR(250) UNIQUE NOT NULL,
+            profile_url TEXT UNIQUE NOT NULL,
+            avatar_url TEXT NOT NULL,
+            description TEXT NOT NULL,
+            key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL
+        );
+    """,
+    "gitea_forge_repositories": """
+        CREATE TABLE gitea_forge_repositories_new(
+            owner_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            description TEXT NOT NULL,
+            ID INTEGER PRIMARY KEY NOT NULL,
+            html_url TEXT NOT NULL UNIQUE,
+            key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL,
+            UNIQUE(owner_id, name)
+        );
+    """,
+    "gitea_forge_issues": """
+        CREATE TABLE gitea_forge_issues_new(
+            ID INTEGER PRIMARY KEY NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            html_url TEXT NOT NULL UNIQUE,
+            key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL,
+            created INTEGER NOT NULL,
+            updated INTEGER NOT NULL,
+            is_closed BOOLEAN NOT NULL DEFAULT FALSE,
+            is_merged BOOLEAN DEFAULT NULL,
+            -- is_native:
+                -- false: issue is PR and not merged
+                -- true: issue is PR and merged
+                -- false && val(is_closed) == true: issue is PR and is closed
+            is_native BOOLEAN NOT NULL DEFAULT TRUE,
+            repo_scope_id INTEGER NOT NULL,
+            user_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            repository INTEGER REFERENCES gitea_forge_repositories(ID) ON DELETE CASCADE NOT NULL,
+            UNIQUE(repository, repo_scope_id)
+        );
+    """,
+}
+
+COLUMNS = {
+    "gitea_users": "ID, name, user_id, profile_url, avatar_url, description",
+    "gitea_forge_repositories": "owner_id, name, description, ID, html_url",
+    "gitea_forge_issues": """
+        ID, title, description, html_url, created, updated, is_closed,
+        is_merged, is_native, repo_scope_id, user_id, repository
+    """,
+}
+
+
+def move_keys(conn):
+    cur = conn.cursor()
+    for (table, create) in TABLES.items():
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN key_id INTEGER;")
+        cur.execute(f"SELECT ID, private_key, public_key FROM {table};")
+        for (db_id, private_key, public_key) in cur.fetchall():
+            cur.execute(
+                """
+                INSERT INTO keys (fingerprint, private_key, public_key)
+                VALUES (?, ?, ?);
+                """,
+                (fingerprint(public_key), private_key, public_key),
+            )
+            cur.execute(
+                f"UPDATE {table} SET key_id = ? WHERE ID = ?;", (cur.lastrowid, db_id)
+            )
+
+        cur.execute(create)
+        cur.execute(
+            f"""
+            INSERT INTO {table}_new ({COLUMNS[table]}, key_id)
+            SELECT {COLUMNS[table]}, key_id FROM {table};
+            """
+        )
+        cur.execute(f"DROP TABLE {table};")
+        cur.execute(f"ALTER TABLE {table}_new RENAME TO {table};")
+
+    create_triggers(cur)
+
+
+def restore_keys(conn):
+    cur = conn.cursor()
+    for (table, create) in TABLES.items():
+        # shape of the table before this migration
+        create = create.replace(f"{table}_new(", f"{table}_old(").replace(
+            "key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL",
+            "private_key TEXT UNIQUE NOT NULL, public_key TEXT",
+        )
+        columns = ", ".join(
+            [f"{table}.{column.strip()}" for column in COLUMNS[table].split(",")]
+        )
+        cur.execute(create)
+        cur.execute(
+            f"""
+            INSERT INTO {table}_old ({COLUMNS[table]}, private_key, public_key)
+            SELECT {columns}, keys.private_key, keys.public_key FROM {table}
+            INNER JOIN keys ON keys.ID = {table}.key_id;
+            """
+        )
+        cur.execute(f"DROP TABLE {table};")
+        cur.execute(f"ALTER TABLE {table}_old RENAME TO {table};")
+    create_triggers(cur)
+
+
+def create_triggers(cur):
+    # triggers are dropped along with the table
+    for action in ["insert", "delete"]:
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS gitea_users_count_{action}
+            AFTER {action.upper()} ON gitea_users
+            BEGIN
+                UPDATE table_stats SET row_count = row_count {"+" if action == "insert" else "-"} 1
+                WHERE table_name = 'gitea_users';
+            END;
+            """
+        )
+
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS keys (
+            ID INTEGER PRIMARY KEY NOT NULL,
+            -- SHA-256 of DER encoded public key, hex
+            fingerprint TEXT NOT NULL UNIQUE,
+            private_key TEXT NOT NULL,
+            public_key TEXT NOT NULL
+        );
+    """,
+        "DROP TABLE IF EXISTS keys;",
+    ),
+    step(move_keys, restore_keys),
+]
@@ -0,0 +1,120 @@
+"""
+actor names
+
+Store actor names of repositories and issues, so that actor URLs and
+webfinger subjects resolve with a single indexed lookup. Actor name of a user
+is its user_id, which is already unique.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_06_Tw9kA-keys"}
+
+# Tables as they were before this migration. They are rebuilt on rollback,
+# ALTER TABLE ... DROP COLUMN needs SQLite 3.35
+TABLES = {
+    "gitea_forge_repositories": """
+        CREATE TABLE gitea_forge_repositories_old(
+            owner_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            name VARCHAR(250) NOT NULL,
+            description TEXT NOT NULL,
+            ID INTEGER PRIMARY KEY NOT NULL,
+            html_url TEXT NOT NULL UNIQUE,
+            key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL,
+            UNIQUE(owner_id, name)
+        );
+    """,
+    "gitea_forge_issues": """
+        CREATE TABLE gitea_forge_issues_old(
+            ID INTEGER PRIMARY KEY NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            html_url TEXT NOT NULL UNIQUE,
+            key_id INTEGER REFERENCES keys(ID) UNIQUE NOT NULL,
+            created INTEGER NOT NULL,
+            updated INTEGER NOT NULL,
+            is_closed BOOLEAN NOT NULL DEFAULT FALSE,
+            is_merged BOOLEAN DEFAULT NULL,
+            -- is_native:
+                -- false: issue is PR and not merged
+                -- true: issue is PR and merged
+                -- false && val(is_closed) == true: issue is PR and is closed
+            is_native BOOLEAN NOT NULL DEFAULT TRUE,
+            repo_scope_id INTEGER NOT NULL,
+            user_id INTEGER REFERENCES gitea_users(ID) ON DELETE CASCADE NOT NULL,
+            repository INTEGER REFERENCES gitea_forge_repositories(ID) ON DELETE CASCADE NOT NULL,
+            UNIQUE(repository, repo_scope_id)
+        );
+    """,
+}
+
+
+def drop_actor_name(table: str):
+    def rollback(conn):
+        cur = conn.cursor()
+        columns = ", ".join(
+            [
+                row[1]
+                for row in cur.execute(f"PRAGMA table_info({table});").fetchall()
+                if row[1] != "actor_name"
+            ]
+        )
+        cur.execute(TABLES[table])
+        cur.execute(
+            f"INSERT INTO {table}_old ({columns}) SELECT {columns} FROM {table};"
+        )
+        cur.execute(f"DROP TABLE {table};")
+        cur.execute(f"ALTER TABLE {table}_old RENAME TO {table};")
+
+    return rollback
+
+
+steps = [
+    step(
+        """
+        ALTER TABLE gitea_forge_repositories ADD COLUMN actor_name TEXT;
+    """,
+        drop_actor_name("gitea_forge_repositories"),
+    ),
+    step(
+        """
+        -- "!<owner>!<name>", see DBRepo.actor_name
+        UPDATE gitea_forge_repositories
+        SET actor_name = (
+            SELECT '!' || user_id || '!' || gitea_forge_repositories.name
+            FROM gitea_users WHERE gitea_users.ID = owner_id
+        );
+    """
+    ),
+    step(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS gitea_forge_repositories_actor_name
+            ON gitea_forge_repositories(actor_name);
+    """,
+        "DROP INDEX IF EXISTS gitea_forge_repositories_actor_name;",
+    ),
+    step(
+        """
+        ALTER TABLE gitea_forge_issues ADD COLUMN actor_name TEXT;
+    """,
+        drop_actor_name("gitea_forge_issues"),
+    ),
+    step(
+        """
+        -- "!<owner>!<name>!issue!<repo_scope_id>", see DBIssue.actor_name
+        UPDATE gitea_forge_issues
+        SET actor_name = (
+            SELECT actor_name || '!issue!' || gitea_forge_issues.repo_scope_id
+            FROM gitea_forge_repositories
+            WHERE gitea_forge_repositories.ID = repository
+        );
+    """
+    ),
+    step(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS gitea_forge_issues_actor_name
+            ON gitea_forge_issues(actor_name);
+    """,
+        "DROP INDEX IF EXISTS gitea_forge_issues_actor_name;",
+    ),
+]
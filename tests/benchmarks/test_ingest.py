@@ -0,0 +1,136 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Ingest throughput benchmarks, run against the fake Gitea server.
+
+Skipped unless BENCHMARK is set:
+
+    BENCHMARK=1 pytest -s tests/benchmarks
+
+BENCHMARK_SCALE multiplies the number of users on the fake forge,
+BENCHMARK_LATENCY (in seconds) is added to every forge response and
+BENCHMARK_ROUNDS is the number of notification polls. When BENCHMARK_OUTPUT
+is set, results are appended to it as JSON lines, to compare runs.
+"""
+import json
+import os
+import time
+
+from dateutil.parser import parse as date_parse
+import pytest
+
+from interface.git import get_forge, get_issue
+from interface.settings import settings
+
+from tests.forges.gitea.fake_gitea import FakeGitea
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("BENCHMARK"), reason="set BENCHMARK=1 to run benchmarks"
+)
+
+SCALE = int(os.environ.get("BENCHMARK_SCALE", 1))
+LATENCY = float(os.environ.get("BENCHMARK_LATENCY", 0.005))  # in seconds
+ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", 5))
+OUTPUT = os.environ.get("BENCHMARK_OUTPUT")
+
+
+def percentile(latencies: [float], p: int) -> float:
+    """p-th percentile of latencies, nearest rank"""
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+def report(name: str, items: int, elapsed: float, latencies: [float]):
+    result = {
+        "name": name,
+        "items": items,
+        "per_second": items / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "scale": SCALE,
+        "latency_ms": LATENCY * 1000,
+    }
+    print(
+        f"\n{name}: {result['per_second']:.1f}/s over {items} items, "
+        f"p50 {result['p50_ms']:.2f}ms p99 {result['p99_ms']:.2f}ms"
+    )
+    if OUTPUT:
+        with open(OUTPUT, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+@pytest.fixture
+def fake_gitea(app, requests_mock):
+    fake = FakeGitea(
+        host=settings.GITEA.host,
+        users=4 * SCALE,
+        repos=5,
+        issues=20,
+        comments=5,
+        notifications=50,
+        latency=LATENCY,
+    ).start()
+    try:
+        with fake.route(requests_mock), app.app_context():
+            yield fake
+    finally:
+        fake.stop()
+
+
+def test_notifications(fake_gitea):
+    """Notification polls of the runner: list and hydrate notifications"""
+
+    forge = get_forge().forge
+    since = date_parse("2022-01-01T00:00:00+05:30")
+    latencies = []
+    count = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        poll = time.perf_counter()
+        notifications = forge.get_notifications(since=since).notifications
+        latencies.append(time.perf_counter() - poll)
+        assert len(notifications) == fake_gitea.notifications
+        count += len(notifications)
+    report("notifications", count, time.perf_counter() - start, latencies)
+
+
+def test_issue_ingest(fake_gitea):
+    """Issues fetched from the forge and stored, then looked up again"""
+
+    issues = fake_gitea.issue_numbers()
+    for name in ["issue ingest", "issue lookup"]:
+        latencies = []
+        start = time.perf_counter()
+        for (owner, repo, number) in issues:
+            fetch = time.perf_counter()
+            get_issue(owner, repo, number)
+            latencies.append(time.perf_counter() - fetch)
+        report(name, len(issues), time.perf_counter() - start, latencies)
+
+
+def test_issue_listing(fake_gitea):
+    """Issues and comments of every repository, page by page"""
+
+    forge = get_forge().forge
+    latencies = []
+    count = 0
+    start = time.perf_counter()
+    for (owner, repo) in fake_gitea.repo_names():
+        listing = time.perf_counter()
+        for issue in forge.iter_issues(owner, repo):
+            count += 1 + len(list(forge.iter_comments(issue["html_url"])))
+        latencies.append(time.perf_counter() - listing)
+    report("issue listing", count, time.perf_counter() - start, latencies)
@@ -21,6 +21,7 @@ from interface.settings import settings
 
 from interface.app import create_app
 from interface.db import get_db, init_db
+from interface.db.conn import close_pool
 
 
 from tests.test_utils import register_ns
@@ -45,6 +46,7 @@ def app():
 
     yield app
 
+    close_pool(db_path)
     os.close(db_fd)
     os.unlink(db_path)
 
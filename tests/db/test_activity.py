@@ -20,7 +20,7 @@ from interface.settings import settings
 
 from interface.db import get_db, DBActivity, ActivityType, DBComment
 from interface.db.cache import CACHE_TTL
-from interface.db.activity import ActiveUsersinPeriod
+from interface.db.activity import ActiveUsersinPeriod, DAY, backfill_active_users
 from interface.db.repo import DBRepo
 from interface.db.issues import DBIssue
 from interface.db.users import DBUser
@@ -148,3 +148,85 @@ def test_acitivty(client):
     )
     activity1.save()
     assert cmp_activity(activity1, DBActivity.load_with_db_id(db_id=activity1.id))
+
+    # activities with identical columns are still assigned their own IDs
+    duplicate = DBActivity(
+        user_id=user.id,
+        activity=ActivityType.CREATE,
+        comment_id=comment1.id,
+        created=activity1.created,
+    )
+    duplicate.save()
+    assert duplicate.id != activity1.id
+    assert cmp_activity(duplicate, DBActivity.load_with_db_id(db_id=duplicate.id))
+
+
+def test_active_users_rollup(app):
+    """Test active user counts from daily rollup match the activity log"""
+
+    with app.app_context():
+        conn = get_db()
+        now = since_epoch()
+        users = []
+        for index in range(5):
+            user = DBUser(
+                name=f"rollup{index}",
+                user_id=f"rollup{index}",
+                profile_url=f"https://git.batsense.net/rollup{index}",
+                avatar_url=f"https://git.batsense.net/rollup{index}",
+                description="description",
+            )
+            user.save()
+            users.append(user)
+        repo = DBRepo(
+            name="foo",
+            owner=users[0],
+            description="foo",
+            html_url="https://git.batsense.net/rollup0/foo",
+        )
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{repo.html_url}/issues/1",
+            created=now - 200 * DAY,
+            updated=now - 200 * DAY,
+            repo_scope_id=1,
+            repository=repo,
+            user=users[0],
+        )
+        issue.save()
+
+        ages = [DAY // 2, 3 * DAY, 29 * DAY + 600, 31 * DAY, 170 * DAY]
+        DBActivity.save_many(
+            [
+                DBActivity(
+                    user_id=user.id,
+                    activity=ActivityType.UPDATE,
+                    issue_id=issue.id,
+                    created=now - age,
+                )
+                for (user, age) in zip(users, ages)
+            ]
+        )
+        DBActivity(
+            user_id=users[1].id,
+            activity=ActivityType.UPDATE,
+            issue_id=issue.id,
+            created=now - 2 * DAY,
+        ).save()
+
+        def expected(period: int) -> int:
+            return conn.execute(
+                "SELECT COUNT(DISTINCT user_id) FROM activities WHERE created >= ?",
+                (since_epoch() - period,),
+            ).fetchone()[0]
+
+        for period in [DAY, 30 * DAY, 180 * DAY]:
+            assert ActiveUsersinPeriod(since=period).count() == expected(period)
+        assert ActiveUsersinPeriod(since=30 * DAY).count() == 3
+
+        conn.execute("DELETE FROM daily_active_users")
+        conn.commit()
+        assert backfill_active_users(days_per_batch=7) > 0
+        for period in [DAY, 30 * DAY, 180 * DAY]:
+            assert ActiveUsersinPeriod(since=period).count() == expected(period)
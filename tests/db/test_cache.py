@@ -22,6 +22,7 @@ from interface.db.repo import DBRepo
 from interface.db.issues import DBIssue
 from interface.db.users import DBUser
 from interface.db.webfinger import INTERFACE_BASE_URL, INTERFACE_DOMAIN
+from interface.utils import since_epoch
 
 
 def test_cache(client):
@@ -49,3 +50,46 @@ def test_cache(client):
     assert DBUser.count.count() == 1
     time.sleep(ttl)
     assert DBUser.count.count() == 2
+
+
+def test_table_stats(app):
+    """Test row counts maintained by triggers match the tables"""
+
+    def assert_counts(conn):
+        for table in ["gitea_users", "gitea_issue_comments", "activities"]:
+            stat = conn.execute(
+                "SELECT row_count FROM table_stats WHERE table_name = ?", (table,)
+            ).fetchone()[0]
+            assert stat == conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    with app.app_context():
+        conn = get_db()
+        user = DBUser(
+            name="stats",
+            user_id="stats",
+            profile_url="https://git.batsense.net/stats",
+            avatar_url="https://git.batsense.net/stats",
+            description="description",
+        )
+        repo = DBRepo(
+            name="foo",
+            owner=user,
+            description="foo",
+            html_url="https://git.batsense.net/stats/foo",
+        )
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{repo.html_url}/issues/1",
+            created=since_epoch(),
+            updated=since_epoch(),
+            repo_scope_id=1,
+            repository=repo,
+            user=user,
+        )
+        issue.save()
+        assert_counts(conn)
+
+        conn.execute("DELETE FROM activities WHERE issue_id = ?", (issue.id,))
+        conn.commit()
+        assert_counts(conn)
@@ -0,0 +1,95 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from interface.db import get_db, DBUser, DBRepo, DBIssue, DBComment
+from interface.utils import since_epoch
+
+
+def test_thread_hydration(app):
+    """Loading a comment thread costs a constant number of queries"""
+
+    with app.app_context():
+        owner = DBUser(
+            name="owner",
+            user_id="owner",
+            profile_url="https://git.batsense.net/owner",
+            avatar_url="https://git.batsense.net/owner",
+            description="description",
+        )
+        owner.save()
+        repo = DBRepo(
+            name="foo",
+            owner=owner,
+            description="foo",
+            html_url="https://git.batsense.net/owner/foo",
+        )
+        repo.save()
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{repo.html_url}/issues/1",
+            created=since_epoch(),
+            updated=since_epoch(),
+            repo_scope_id=1,
+            repository=repo,
+            user=owner,
+        )
+        issue.save()
+
+        for index in range(1, 11):
+            user_id = f"commenter{index % 4}"
+            author = DBUser(
+                name=user_id,
+                user_id=user_id,
+                profile_url=f"https://git.batsense.net/{user_id}",
+                avatar_url=f"https://git.batsense.net/{user_id}",
+                description="description",
+            )
+            DBComment(
+                body=f"comment {index}",
+                created=since_epoch() + index,
+                updated=since_epoch() + index,
+                is_native=True,
+                belongs_to_issue=issue,
+                user=author,
+                html_url=f"{issue.html_url}#issuecomment-{index}",
+                comment_id=index,
+            ).save()
+
+    with app.app_context():
+        queries = []
+        get_db().set_trace_callback(queries.append)
+
+        issue = DBIssue.load_with_html_url(issue.html_url)
+        comments = DBComment.load_issue_comments(issue)
+
+        get_db().set_trace_callback(None)
+        assert len(queries) == 2
+
+        assert issue.repository.owner.user_id == "owner"
+        assert issue.user.user_id == "owner"
+        assert [comment.comment_id for comment in comments] == list(range(1, 11))
+        for (index, comment) in enumerate(comments, start=1):
+            assert comment.user.user_id == f"commenter{index % 4}"
+            assert comment.belongs_to_issue is issue
+
+    with app.app_context():
+        queries = []
+        get_db().set_trace_callback(queries.append)
+        comment = DBComment.load_from_comment_url(f"{issue.html_url}#issuecomment-3")
+        get_db().set_trace_callback(None)
+        assert len(queries) == 1
+        assert comment.user.user_id == "commenter3"
+        assert comment.belongs_to_issue.html_url == issue.html_url
+        assert comment.belongs_to_issue.repository.name == "foo"
@@ -0,0 +1,93 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from interface.db import get_db, DBUser, DBRepo, DBIssue, DBComment
+from interface.db.identity import get_identity_map
+from interface.utils import since_epoch
+
+
+def test_identity_map(app):
+    """Test loads within an app context return already hydrated objects"""
+
+    with app.app_context():
+        username = "db_test_user"
+        profile_url = f"https://git.batsense.net/{username}"
+        user = DBUser(
+            name=username,
+            user_id=username,
+            profile_url=profile_url,
+            avatar_url=profile_url,
+            description="description",
+        )
+        user.save()
+
+        repo = DBRepo(
+            name="foo", owner=user, description="foo", html_url=f"{profile_url}/foo"
+        )
+        repo.save()
+
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{profile_url}/foo/issues/1",
+            created=since_epoch(),
+            updated=since_epoch(),
+            repo_scope_id=1,
+            repository=repo,
+            user=user,
+        )
+        issue.save()
+
+        for comment_id in range(1, 6):
+            DBComment(
+                body="test comment",
+                created=since_epoch(),
+                updated=since_epoch(),
+                is_native=True,
+                belongs_to_issue=issue,
+                user=user,
+                html_url=f"{issue.html_url}#issuecomment-{comment_id}",
+                comment_id=comment_id,
+            ).save()
+
+    with app.app_context():
+        from_db = DBUser.load(username)
+        assert from_db is DBUser.load(username)
+        assert from_db is DBUser.load_with_db_id(from_db.id)
+
+        repo = DBRepo.load("foo", username)
+        assert repo is DBRepo.load_with_id(repo.id)
+        assert repo.owner is from_db
+
+        issue = DBIssue.load_with_id(issue.id)
+        assert issue is DBIssue.load_with_html_url(issue.html_url)
+        assert issue is DBIssue.load(repo, issue.repo_scope_id)
+
+        comments = DBComment.load_issue_comments(issue)
+        assert len(comments) == 5
+        assert all([comment.user is from_db for comment in comments])
+
+        # writes invalidate matching entries
+        closed_at = since_epoch()
+        issue.set_closed(closed_at)
+        from_db = DBIssue.load_with_id(issue.id)
+        assert from_db.is_closed is True
+        assert from_db.updated == closed_at
+
+        with get_identity_map().fresh():
+            assert DBIssue.load_with_id(issue.id) is not from_db
+
+    with app.app_context():
+        # identity map is scoped to the app context
+        assert DBUser.load(username) is not from_db.user
@@ -17,6 +17,7 @@ from datetime import datetime
 import pytest
 
 from interface.db import get_db
+from interface.db.identity import get_identity_map
 from interface.db.repo import DBRepo
 from interface.db.issues import DBIssue, OPEN, MERGED, CLOSED
 from interface.utils import since_epoch
@@ -214,3 +215,7 @@ def test_issue(client):
     assert int(r_issue_id) == from_db.repo_scope_id
 
     cmp_issue(from_db, from_db.from_actor_name(actor["name"]))
+
+    with get_identity_map().fresh():
+        assert cmp_issue(from_db, DBIssue.load_with_actor_name(actor["name"]))
+    assert DBIssue.load_with_actor_name(f"{actor['name']}0") is None
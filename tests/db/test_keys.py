@@ -0,0 +1,217 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import sqlite3
+from sqlite3 import IntegrityError
+from threading import Thread
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from interface.auth import RSAKeyPair
+from interface.db import DBUser, DBRepo, DBIssue, get_db
+from interface.db.keys import KeyPool
+from interface.utils import since_epoch
+
+
+def test_key_pool(app):
+    """Test keys are handed out from the pool and generated inline when it's empty"""
+
+    pool = KeyPool(size=3, workers=1)
+    try:
+        with app.app_context():
+            assert pool.depth() == 0
+            assert pool.top_up() == 3
+            assert pool.top_up() == 0
+            assert pool.depth() == 3
+
+            keys = [pool.pop().private_key() for _ in range(3)]
+            assert len(set(keys)) == 3
+            assert pool.depth() == 0
+
+            assert pool.pop().private_key() not in keys
+            stats = pool.stats()
+            assert stats["hits"] == 3
+            assert stats["misses"] == 1
+            assert stats["generated"] == 3
+    finally:
+        pool.stop()
+
+
+def test_key_pool_concurrent_top_up(app):
+    """Test concurrent top ups don't overfill the pool"""
+
+    pools = [KeyPool(size=2, workers=1) for _ in range(2)]
+
+    def top_up(pool):
+        with app.app_context():
+            pool.top_up()
+
+    try:
+        threads = [Thread(target=top_up, args=(pool,)) for pool in pools]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            assert pools[0].depth() == 2
+            assert sum([pool.generated for pool in pools]) == 2
+    finally:
+        for pool in pools:
+            pool.stop()
+
+
+def test_key_generated_without_write_lock(app, monkeypatch):
+    """Test keys generated on a pool miss don't hold the write lock"""
+
+    generate = RSAKeyPair.generate
+    writes = []
+
+    def generate_and_write():
+        other = sqlite3.connect(app.config["DATABASE"], timeout=0.1)
+        other.execute("UPDATE table_stats SET row_count = row_count;")
+        other.commit()
+        other.close()
+        writes.append(1)
+        return generate()
+
+    monkeypatch.setattr(RSAKeyPair, "generate", generate_and_write)
+    with app.app_context():
+        repo = DBRepo(
+            name="foo",
+            owner=DBUser(
+                name="miss",
+                user_id="miss",
+                profile_url="https://git.batsense.net/miss",
+                avatar_url="https://git.batsense.net/miss",
+                description="description",
+            ),
+            description="foo",
+            html_url="https://git.batsense.net/miss/foo",
+        )
+        issues = [
+            DBIssue(
+                title="Test issue",
+                description="foo bar",
+                html_url=f"{repo.html_url}/issues/{index}",
+                created=since_epoch(),
+                updated=since_epoch(),
+                repo_scope_id=index,
+                repository=repo,
+                user=repo.owner,
+            )
+            for index in range(1, 4)
+        ]
+        issues[0].save()
+        DBIssue.save_many(issues)
+    # owner, repository and three issues
+    assert len(writes) == 5
+
+
+def test_actor_public_key(app, monkeypatch):
+    """Test actors are served without parsing private keys"""
+
+    with app.app_context():
+        user = DBUser(
+            name="keys",
+            user_id="keys",
+            profile_url="https://git.batsense.net/keys",
+            avatar_url="https://git.batsense.net/keys",
+            description="description",
+        )
+        repo = DBRepo(
+            name="foo",
+            owner=user,
+            description="foo",
+            html_url="https://git.batsense.net/keys/foo",
+        )
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{repo.html_url}/issues/1",
+            created=since_epoch(),
+            updated=since_epoch(),
+            repo_scope_id=1,
+            repository=repo,
+            user=user,
+        )
+        issue.save()
+        expected = [
+            actor.private_key.public_key() for actor in [user, repo, issue]
+        ]
+
+    def load_pem_private_key(*args, **kwargs):
+        raise AssertionError("private key parsed")
+
+    monkeypatch.setattr(serialization, "load_pem_private_key", load_pem_private_key)
+
+    with app.app_context():
+        issue = DBIssue.load_with_html_url(issue.html_url)
+        actors = [issue.user, issue.repository, issue]
+        for (actor, public_key) in zip(actors, expected):
+            assert actor.to_actor()["publicKey"]["publicKeyPem"] == public_key
+
+
+def test_keys_table(app):
+    """Test actor keys are stored in the keys table, one row per actor"""
+
+    with app.app_context():
+        user = DBUser(
+            name="keys_table",
+            user_id="keys_table",
+            profile_url="https://git.batsense.net/keys_table",
+            avatar_url="https://git.batsense.net/keys_table",
+            description="description",
+        )
+        repo = DBRepo(
+            name="foo",
+            owner=user,
+            description="foo",
+            html_url="https://git.batsense.net/keys_table/foo",
+        )
+        repo.save()
+
+        conn = get_db()
+        for (table, actor) in [
+            ("gitea_users", user),
+            ("gitea_forge_repositories", repo),
+        ]:
+            columns = [
+                row["name"] for row in conn.execute(f"PRAGMA table_info({table});")
+            ]
+            assert "private_key" not in columns
+            assert "public_key" not in columns
+
+            fingerprint = conn.execute(
+                f"""
+                SELECT keys.fingerprint FROM {table}
+                INNER JOIN keys ON keys.ID = {table}.key_id
+                WHERE {table}.ID = ?
+                """,
+                (actor.id,),
+            ).fetchone()[0]
+            assert fingerprint == actor.private_key.fingerprint()
+        assert user.private_key.fingerprint() != repo.private_key.fingerprint()
+
+        # keys of actors that can't be inserted aren't left behind
+        keys = conn.execute("SELECT COUNT(*) FROM keys;").fetchone()[0]
+        clash = DBRepo(
+            name="bar",
+            owner=user,
+            description="bar",
+            html_url=repo.html_url,
+        )
+        with pytest.raises(IntegrityError):
+            clash.save()
+        assert conn.execute("SELECT COUNT(*) FROM keys;").fetchone()[0] == keys
@@ -0,0 +1,118 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import ast
+import importlib
+import re
+from pathlib import Path
+
+from interface.db import get_db
+
+ROOT = Path(__file__).parent.parent.parent
+
+MODULES = [
+    f"interface.db.{path.stem}"
+    for path in sorted((ROOT / "interface" / "db").glob("*.py"))
+    if path.stem != "__init__"
+] + ["interface.git"]
+
+STATEMENT = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s", re.IGNORECASE)
+
+# Tables that only ever hold a handful of rows and intermediate results
+# of a query, scanning them is fine
+SMALL_TABLES = ["interface_jobs_run", "spare_keys", "CONSTANT ROW", "(subquery-"]
+
+
+class QueryCollector(ast.NodeVisitor):
+    """
+    Collect SQL statements from string literals and f-strings of a module.
+    f-strings are evaluated with `cls` bound to the enclosing class, so
+    statements built from columns()/select() can be checked too.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.classes = []
+        self.fragments = set()
+        self.queries = []
+
+    def visit_ClassDef(self, node):
+        self.classes.append(getattr(self.module, node.name, None))
+        self.generic_visit(node)
+        self.classes.pop()
+
+    def visit_Return(self, node):
+        # select() and columns() return fragments, not statements
+        self.fragments.add(id(node.value))
+        self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        # docstrings
+        self.fragments.add(id(node.value))
+        self.generic_visit(node)
+
+    def __add(self, node, query):
+        if id(node) in self.fragments or not isinstance(query, str):
+            return
+        if STATEMENT.match(query):
+            self.queries.append((node.lineno, query))
+
+    def visit_Constant(self, node):
+        self.__add(node, node.value)
+
+    def visit_JoinedStr(self, node):
+        scope = {"batch": [None], "cls": self.classes[-1] if self.classes else None}
+        try:
+            query = eval(
+                compile(ast.Expression(node), self.module.__file__, "eval"),
+                vars(self.module),
+                scope,
+            )
+        except Exception:
+            # depends on runtime state(e.g. self), nothing to check statically
+            return
+        self.__add(node, query)
+
+
+def get_queries() -> [(str, str)]:
+    queries = []
+    for name in MODULES:
+        module = importlib.import_module(name)
+        collector = QueryCollector(module)
+        collector.visit(ast.parse(Path(module.__file__).read_text()))
+        for lineno, query in collector.queries:
+            queries.append((f"{name}:{lineno}", query))
+    return queries
+
+
+def test_query_plan(app):
+    """Test no query scans a table that grows with usage"""
+
+    queries = get_queries()
+    assert len(queries) > 20
+
+    with app.app_context():
+        conn = get_db()
+        scans = []
+        for location, query in queries:
+            params = [None] * query.count("?")
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            for row in plan:
+                detail = row["detail"]
+                if not detail.startswith("SCAN"):
+                    continue
+                if any([detail.startswith(f"SCAN {t}") for t in SMALL_TABLES]):
+                    continue
+                scans.append(f"{location}: {detail}")
+        assert scans == []
@@ -15,6 +15,7 @@
 import pytest
 
 from interface.db import DBRepo, DBUser
+from interface.db.identity import get_identity_map
 
 from .test_user import cmp_user
 
@@ -100,3 +101,7 @@ def test_repo(client):
     assert r_repo_name == from_db.name
 
     cmp_repo(from_db, from_db.from_actor_name(actor["name"]))
+
+    with get_identity_map().fresh():
+        assert cmp_repo(from_db, DBRepo.load_with_actor_name(actor["name"]))
+    assert DBRepo.load_with_actor_name(f"!{user.user_id}!bar") is None
@@ -0,0 +1,169 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from interface.db import get_db, DBUser, DBRepo, DBIssue, DBComment
+from interface.db import DBActivity, ActivityType
+from interface.utils import since_epoch
+
+
+def get_user(user_id: str) -> DBUser:
+    return DBUser(
+        name=user_id,
+        user_id=user_id,
+        profile_url=f"https://git.batsense.net/{user_id}",
+        avatar_url=f"https://git.batsense.net/{user_id}",
+        description="description",
+    )
+
+
+def get_activities(conn, activity: ActivityType) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM activities WHERE activity = ?", (activity.value,)
+    ).fetchone()[0]
+
+
+def test_save_many(app):
+    """Test bulk upserts of issues and comments"""
+
+    with app.app_context():
+        owner = get_user("owner")
+        repo = DBRepo(
+            name="foo",
+            owner=owner,
+            description="foo",
+            html_url="https://git.batsense.net/owner/foo",
+        )
+        issues = [
+            DBIssue(
+                title=f"Test issue {index}",
+                description="foo bar",
+                html_url=f"{repo.html_url}/issues/{index}",
+                created=since_epoch(),
+                updated=since_epoch(),
+                repo_scope_id=index,
+                repository=repo,
+                user=owner if index % 2 == 0 else get_user(f"author{index}"),
+            )
+            for index in range(1, 6)
+        ]
+        # already stored issues are updated, not duplicated
+        issues[0].save()
+        # issues listed twice are inserted once
+        copy = DBIssue(
+            title=issues[1].title,
+            description=issues[1].description,
+            html_url=issues[1].html_url,
+            created=issues[1].created,
+            updated=issues[1].updated,
+            repo_scope_id=issues[1].repo_scope_id,
+            repository=repo,
+            user=issues[1].user,
+        )
+        DBIssue.save_many(issues + [copy])
+        assert copy.id == issues[1].id
+        assert copy.private_key is not None
+        assert issues[1].private_key is not None
+        assert copy.to_actor() == issues[1].to_actor()
+
+        comments = [
+            DBComment(
+                body=f"comment {index}",
+                created=since_epoch() + index,
+                updated=since_epoch() + index,
+                is_native=True,
+                belongs_to_issue=issues[0],
+                user=get_user(f"commenter{index % 3}"),
+                html_url=f"{issues[0].html_url}#issuecomment-{index}",
+                comment_id=index,
+            )
+            for index in range(1, 21)
+        ]
+        DBComment.save_many(comments)
+
+        conn = get_db()
+        assert (
+            conn.execute("SELECT COUNT(*) FROM gitea_forge_issues").fetchone()[0] == 5
+        )
+        assert (
+            conn.execute("SELECT COUNT(*) FROM gitea_issue_comments").fetchone()[0]
+            == 20
+        )
+        assert get_activities(conn, ActivityType.CREATE) == 25
+        assert get_activities(conn, ActivityType.UPDATE) == 0
+        for issue in issues:
+            assert issue.id == DBIssue.load_with_html_url(issue.html_url).id
+        for comment in comments:
+            assert comment.id == DBComment.load_from_comment_url(comment.html_url).id
+            assert comment.user.id is not None
+
+        # only changed rows are written and get an UPDATE activity
+        comments[0].body = "updated comment"
+        comments[0].updated += 100
+        issues[1].title = "updated title"
+        DBIssue.save_many(issues)
+        DBComment.save_many(comments)
+        assert get_activities(conn, ActivityType.UPDATE) == 2
+
+        # comments are matched on comment_id as well as html_url, and those
+        # listed twice are inserted once
+        moved = DBComment(
+            body="moved comment",
+            created=comments[1].created,
+            updated=comments[1].updated + 100,
+            is_native=True,
+            belongs_to_issue=issues[0],
+            user=comments[1].user,
+            html_url=f"{issues[0].html_url}#moved",
+            comment_id=comments[1].comment_id,
+        )
+        new = [
+            DBComment(
+                body="new comment",
+                created=since_epoch(),
+                updated=since_epoch(),
+                is_native=True,
+                belongs_to_issue=issues[0],
+                user=get_user("commenter0"),
+                html_url=f"{issues[0].html_url}#issuecomment-21",
+                comment_id=21,
+            )
+            for _ in range(2)
+        ]
+        DBComment.save_many([moved] + new)
+        assert moved.id == comments[1].id
+        assert new[0].id is not None
+        assert new[0].id == new[1].id
+        assert (
+            conn.execute("SELECT COUNT(*) FROM gitea_issue_comments").fetchone()[0]
+            == 21
+        )
+        assert get_activities(conn, ActivityType.UPDATE) == 3
+
+    with app.app_context():
+        assert DBIssue.load_with_id(issues[1].id).title == "updated title"
+        comment = DBComment.load_from_id(comments[0].id)
+        assert comment.body == "updated comment"
+        assert len(DBComment.load_issue_comments(issue=comment.belongs_to_issue)) == 21
+
+        activities = [
+            DBActivity(
+                user_id=owner.id, activity=ActivityType.FOLLOW, issue_id=issues[0].id
+            )
+            for _ in range(3)
+        ]
+        DBActivity.save_many(activities)
+        for activity in activities:
+            from_db = DBActivity.load_with_db_id(activity.id)
+            assert from_db.activity == ActivityType.FOLLOW
+        assert len(set([activity.id for activity in activities])) == 3
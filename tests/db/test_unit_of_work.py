@@ -0,0 +1,152 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import sqlite3
+import time
+from threading import Thread
+
+import pytest
+
+from interface.cache import get_cache
+from interface.db import get_db, unit_of_work, DBUser, DBRepo, DBIssue
+from interface.db.render import USER, render_key
+from interface.db.webfinger import get_cached_webfinger
+from interface.utils import since_epoch
+
+
+def get_user(username: str) -> DBUser:
+    profile_url = f"https://git.batsense.net/{username}"
+    return DBUser(
+        name=username,
+        user_id=username,
+        profile_url=profile_url,
+        avatar_url=profile_url,
+        description="description",
+    )
+
+
+def test_unit_of_work(app):
+    """Test saves within a unit of work are committed once"""
+
+    with app.app_context():
+        conn = get_db()
+        commits = []
+        conn.set_trace_callback(
+            lambda query: commits.append(query)
+            if query.strip().upper().startswith("COMMIT")
+            else None
+        )
+
+        user = get_user("uow_user")
+        repo = DBRepo(
+            name="foo",
+            owner=user,
+            description="foo",
+            html_url=f"{user.profile_url}/foo",
+        )
+        issue = DBIssue(
+            title="Test issue",
+            description="foo bar",
+            html_url=f"{repo.html_url}/issues/1",
+            created=since_epoch(),
+            updated=since_epoch(),
+            repo_scope_id=1,
+            repository=repo,
+            user=user,
+        )
+        with unit_of_work():
+            issue.save()
+            assert len(commits) == 0
+        assert len(commits) == 1
+        conn.set_trace_callback(None)
+
+        # failed unit of work is rolled back
+        with pytest.raises(ValueError):
+            with unit_of_work():
+                get_user("uow_rollback").save()
+                raise ValueError
+        assert DBUser.load("uow_rollback") is None
+
+        # nested unit of work only discards its own changes
+        with unit_of_work():
+            get_user("uow_outer").save()
+            with pytest.raises(ValueError):
+                with unit_of_work():
+                    get_user("uow_inner").save()
+                    raise ValueError
+
+    with app.app_context():
+        assert DBIssue.load_with_html_url(issue.html_url) is not None
+        assert DBUser.load("uow_outer") is not None
+        assert DBUser.load("uow_inner") is None
+
+
+def test_unit_of_work_concurrent_writer(app):
+    """Test a writer that commits during a unit of work doesn't fail it"""
+
+    def write():
+        conn = sqlite3.connect(app.config["DATABASE"], timeout=5)
+        conn.execute(
+            "UPDATE gitea_users SET description = 'other' WHERE user_id = 'uow_read';"
+        )
+        conn.commit()
+        conn.close()
+
+    with app.app_context():
+        get_user("uow_read").save()
+        writer = Thread(target=write)
+        with unit_of_work():
+            assert DBUser.load("uow_read") is not None
+            writer.start()
+            time.sleep(0.1)
+            # writer waits for the unit of work instead of committing first
+            assert writer.is_alive()
+            get_user("uow_write").save()
+        writer.join()
+        assert DBUser.load("uow_write") is not None
+
+
+def test_unit_of_work_after_commit(app):
+    """Test cached actors are invalidated only once saves are committed"""
+
+    with app.app_context():
+        key = render_key(USER, "uow_render")
+        get_cache().set(key, "stale", 60)
+        with pytest.raises(ValueError):
+            with unit_of_work():
+                get_user("uow_render").save()
+                raise ValueError
+        assert get_cache().get(key) == "stale"
+
+        with unit_of_work():
+            get_user("uow_render").save()
+            assert get_cache().get(key) == "stale"
+        assert get_cache().get(key) is None
+
+
+def test_unit_of_work_rollback_webfinger(app):
+    """Test JRDs of actors that were rolled back aren't cached"""
+
+    with app.app_context():
+        user = get_user("uow_webfinger")
+        with pytest.raises(ValueError):
+            with unit_of_work():
+                user.save()
+                raise ValueError
+        assert get_cached_webfinger(user.webfinger_subject()) is None
+
+        with unit_of_work():
+            user.save()
+            assert get_cached_webfinger(user.webfinger_subject()) is None
+        assert get_cached_webfinger(user.webfinger_subject()) == user.webfinger()
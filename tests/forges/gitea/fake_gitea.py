@@ -0,0 +1,359 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import copy
+import json
+import re
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from urllib.parse import urlparse, parse_qs
+
+from requests.adapters import HTTPAdapter
+
+from interface.forges.http import get_session
+from interface.settings import settings
+from interface.utils import clean_url, trim_url
+
+
+def __load(name: str):
+    with (Path(__file__).parent / name).open() as f:
+        return json.load(f)
+
+
+USER = __load("user-info.json")
+REPOSITORY = __load("get_repository.json")
+ISSUE = __load("get_issues.json")[0]
+COMMENT = __load("get-comments.json")[0]
+NOTIFICATION = __load("notifications.json")[0]
+
+CREATED_AT = "2022-01-19T01:34:26+05:30"
+
+
+class FakeGitea:
+    """
+    Gitea API server, running in a thread of the test process, that serves
+    synthetic data at configurable scale and latency.
+
+    Every one of users owns repos repositories with issues issues each, and
+    every issue has comments comments. The first notifications issues are
+    reported as notifications. URLs in responses point at host, which
+    defaults to the address the server listens on; see route to reach the
+    server through settings.GITEA.host.
+    """
+
+    def __init__(
+        self,
+        host: str = None,
+        users: int = 4,
+        repos: int = 2,
+        issues: int = 10,
+        comments: int = 3,
+        notifications: int = 10,
+        latency: float = 0.0,
+        max_page_size: int = 50,
+    ):
+        self.users = users
+        self.repos = repos
+        self.issues = issues
+        self.comments = comments
+        self.notifications = notifications
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.requests = 0
+        self.lock = Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.host = trim_url(clean_url(host)) if host is not None else self.url
+        self.thread = None
+
+    def start(self) -> "FakeGitea":
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @contextmanager
+    def route(self, requests_mock=None):
+        """
+        Send API requests made to settings.GITEA.host to this server. Web UI
+        requests are left alone. When requests_mock is active, it is told to
+        let API requests through.
+        """
+        host = trim_url(clean_url(settings.GITEA.host))
+        if requests_mock is not None:
+            requests_mock.get(re.compile(f"^{re.escape(host)}/api/v1/"), real_http=True)
+        session = get_session(host)
+        adapter = RouteAdapter(host, self.url)
+        session.mount(host, adapter)
+        try:
+            yield self
+        finally:
+            session.adapters.pop(host, None)
+            adapter.close()
+
+    # data
+
+    def user_names(self) -> [str]:
+        return [f"user{u}" for u in range(self.users)]
+
+    def repo_names(self) -> [(str, str)]:
+        return [(o, f"repo{r}") for o in self.user_names() for r in range(self.repos)]
+
+    def issue_numbers(self) -> [(str, str, int)]:
+        return [self.issue_number(i) for i in range(self.total_issues())]
+
+    def total_issues(self) -> int:
+        return self.users * self.repos * self.issues
+
+    def issue_number(self, index: int) -> (str, str, int):
+        """(owner, repo, number) of index-th issue"""
+        (repo_index, n) = divmod(index, self.issues)
+        (u, r) = divmod(repo_index, self.repos)
+        return (f"user{u}", f"repo{r}", n + 1)
+
+    def __user_index(self, owner: str) -> int:
+        if not owner.startswith("user"):
+            return None
+        try:
+            index = int(owner[len("user") :])
+        except ValueError:
+            return None
+        return index if index < self.users else None
+
+    def __repo_index(self, repo: str) -> int:
+        if not repo.startswith("repo"):
+            return None
+        try:
+            index = int(repo[len("repo") :])
+        except ValueError:
+            return None
+        return index if index < self.repos else None
+
+    def __exists(self, owner: str, repo: str = None, number: int = None) -> bool:
+        if self.__user_index(owner) is None:
+            return False
+        if repo is not None and self.__repo_index(repo) is None:
+            return False
+        return number is None or 1 <= number <= self.issues
+
+    def __issue_id(self, owner: str, repo: str, number: int) -> int:
+        u = self.__user_index(owner)
+        r = self.__repo_index(repo)
+        return (u * self.repos + r) * self.issues + number
+
+    def __comment_id(self, owner: str, repo: str, number: int, c: int) -> int:
+        return self.__issue_id(owner, repo, number) * max(1, self.comments) + c
+
+    def user(self, login: str) -> dict:
+        user = copy.deepcopy(USER)
+        index = self.__user_index(login)
+        # the bot keeps its id, it ends up in the process-wide forge client
+        user["id"] = USER["id"] if index is None else USER["id"] + index + 1
+        user["login"] = login
+        user["username"] = login
+        user["full_name"] = ""
+        user["email"] = f"{login}@example.org"
+        user["avatar_url"] = f"{self.host}/user/avatar/{login}/-1"
+        return user
+
+    def repository(self, owner: str, name: str) -> dict:
+        repo = copy.deepcopy(REPOSITORY)
+        repo["id"] = self.__user_index(owner) * self.repos + self.__repo_index(name)
+        repo["owner"] = self.user(owner)
+        repo["name"] = name
+        repo["full_name"] = f"{owner}/{name}"
+        repo["description"] = f"{name} of {owner}"
+        repo["fork"] = False
+        repo["parent"] = None
+        repo["html_url"] = f"{self.host}/{owner}/{name}"
+        repo["clone_url"] = f"{self.host}/{owner}/{name}.git"
+        repo["open_issues_count"] = self.issues
+        return repo
+
+    def issue(self, owner: str, repo: str, number: int) -> dict:
+        issue = copy.deepcopy(ISSUE)
+        issue["id"] = self.__issue_id(owner, repo, number)
+        issue["url"] = f"{self.host}/api/v1/repos/{owner}/{repo}/issues/{number}"
+        issue["html_url"] = f"{self.host}/{owner}/{repo}/issues/{number}"
+        issue["number"] = number
+        issue["user"] = self.user(owner)
+        issue["title"] = f"issue {number}"
+        issue["body"] = f"issue {number} of {owner}/{repo}"
+        issue["comments"] = self.comments
+        issue["created_at"] = CREATED_AT
+        issue["updated_at"] = CREATED_AT
+        issue["repository"] = {
+            "id": self.__user_index(owner) * self.repos + self.__repo_index(repo),
+            "name": repo,
+            "owner": owner,
+            "full_name": f"{owner}/{repo}",
+        }
+        return issue
+
+    def comment(self, owner: str, repo: str, number: int, c: int) -> dict:
+        comment = copy.deepcopy(COMMENT)
+        comment["id"] = self.__comment_id(owner, repo, number, c)
+        issue_url = f"{self.host}/{owner}/{repo}/issues/{number}"
+        comment["html_url"] = f"{issue_url}#issuecomment-{comment['id']}"
+        comment["issue_url"] = issue_url
+        comment["pull_request_url"] = ""
+        comment["user"] = self.user(owner)
+        comment["body"] = f"comment {c}"
+        comment["created_at"] = CREATED_AT
+        comment["updated_at"] = CREATED_AT
+        return comment
+
+    def notification(self, index: int) -> dict:
+        (owner, repo, number) = self.issue_number(index)
+        n = copy.deepcopy(NOTIFICATION)
+        n["id"] = index + 1
+        n["repository"] = self.repository(owner, repo)
+        api = f"{self.host}/api/v1/repos/{owner}/{repo}/issues"
+        latest_comment_url = ""
+        if self.comments > 0:
+            comment_id = self.__comment_id(owner, repo, number, self.comments - 1)
+            latest_comment_url = f"{api}/comments/{comment_id}"
+        n["subject"] = {
+            "title": f"issue {number}",
+            "url": f"{api}/{number}",
+            "latest_comment_url": latest_comment_url,
+            "type": "Issue",
+            "state": "open",
+        }
+        n["updated_at"] = CREATED_AT
+        return n
+
+    # HTTP
+
+    def __page(self, path: str, query: dict, items: int, item):
+        page = max(1, int(query.get("page", ["1"])[0]))
+        limit = int(query.get("limit", [str(self.max_page_size)])[0])
+        limit = max(1, min(limit, self.max_page_size))
+        start = (page - 1) * limit
+        body = [item(i) for i in range(start, min(items, start + limit))]
+        headers = {"X-Total-Count": str(items)}
+        links = []
+        if start + limit < items:
+            links.append(
+                f'<{self.host}{path}?page={page + 1}&limit={limit}>; rel="next"'
+            )
+        last = max(1, (items + limit - 1) // limit)
+        links.append(f'<{self.host}{path}?page={last}&limit={limit}>; rel="last"')
+        headers["Link"] = ", ".join(links)
+        return (200, body, headers)
+
+    def __dispatch(self, path: str, query: dict):
+        if path == "/api/v1/user":
+            return (200, self.user(settings.GITEA.username), {})
+
+        if path == "/api/v1/notifications":
+            count = min(self.notifications, self.total_issues())
+            return self.__page(path, query, count, self.notification)
+
+        match = re.fullmatch(r"/api/v1/users/([^/]+)", path)
+        if match:
+            (owner,) = match.groups()
+            if self.__exists(owner):
+                return (200, self.user(owner), {})
+            return (404, {"message": "user not found"}, {})
+
+        match = re.fullmatch(r"/api/v1/repos/([^/]+)/([^/]+)(/.*)?", path)
+        if match is None:
+            return (404, {"message": "not found"}, {})
+        (owner, repo, rest) = match.groups()
+        if not self.__exists(owner, repo):
+            return (404, {"message": "repository not found"}, {})
+
+        if rest is None:
+            return (200, self.repository(owner, repo), {})
+        if rest == "/issues":
+            return self.__page(
+                path, query, self.issues, lambda i: self.issue(owner, repo, i + 1)
+            )
+
+        match = re.fullmatch(r"/issues/comments/(\d+)", rest)
+        if match:
+            comment_id = int(match.group(1))
+            per_issue = max(1, self.comments)
+            (issue_id, c) = divmod(comment_id, per_issue)
+            number = issue_id - self.__issue_id(owner, repo, 0)
+            if self.__exists(owner, repo, number) and c < self.comments:
+                return (200, self.comment(owner, repo, number, c), {})
+            return (404, {"message": "comment not found"}, {})
+
+        match = re.fullmatch(r"/issues/(\d+)(/comments)?", rest)
+        if match is None:
+            return (404, {"message": "not found"}, {})
+        number = int(match.group(1))
+        if not self.__exists(owner, repo, number):
+            return (404, {"message": "issue not found"}, {})
+        if match.group(2) is None:
+            return (200, self.issue(owner, repo, number), {})
+        return self.__page(
+            path, query, self.comments, lambda c: self.comment(owner, repo, number, c)
+        )
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        with self.lock:
+            self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        parsed = urlparse(handler.path)
+        (status, body, headers) = self.__dispatch(parsed.path, parse_qs(parsed.query))
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json;charset=utf-8")
+        handler.send_header("Content-Length", str(len(payload)))
+        for (name, value) in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+class RouteAdapter(HTTPAdapter):
+    """Transport adapter that sends requests made to host to target instead"""
+
+    def __init__(self, host: str, target: str, *args, **kwargs):
+        self.host = host
+        self.target = target
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        url = request.url
+        request.url = self.target + url[len(self.host) :]
+        resp = super().send(request, *args, **kwargs)
+        resp.url = url
+        request.url = url
+        return resp
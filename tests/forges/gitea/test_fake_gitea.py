@@ -0,0 +1,62 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from dateutil.parser import parse as date_parse
+import pytest
+
+from interface.error import Error
+from interface.git import get_forge, get_issue, get_user
+from interface.settings import settings
+
+from tests.forges.gitea.fake_gitea import FakeGitea
+
+
+def test_fake_gitea(app, requests_mock):
+    """Test interface ingests data served by the fake Gitea server"""
+
+    fake = FakeGitea(
+        host=settings.GITEA.host,
+        users=2,
+        repos=2,
+        issues=3,
+        comments=2,
+        notifications=5,
+        max_page_size=2,
+    ).start()
+    try:
+        with fake.route(requests_mock), app.app_context():
+            forge = get_forge().forge
+            issues = list(forge.iter_issues("user1", "repo0"))
+            assert [issue["number"] for issue in issues] == [1, 2, 3]
+
+            (owner, repo, number) = fake.issue_numbers()[-1]
+            comments = list(forge.iter_comments(issues[2]["html_url"]))
+            assert [comment.body for comment in comments] == ["comment 0", "comment 1"]
+
+            notifications = forge.get_notifications(since=date_parse("2022-01-01"))
+            assert len(notifications.notifications) == 5
+            assert [n.id for n in notifications.notifications] == [1, 2, 3, 4, 5]
+            assert notifications.notifications[0].comment.body == "comment 1"
+
+            issue = get_issue(owner, repo, number)
+            assert issue.html_url == f"{fake.host}/{owner}/{repo}/issues/{number}"
+            assert issue.repository.owner.user_id == owner
+            assert get_user("user0").user_id == "user0"
+
+            with pytest.raises(Error):
+                forge.get_user("nobody")
+        assert fake.requests > 0
+    finally:
+        fake.stop()
@@ -12,6 +12,10 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import time
+from pathlib import Path
+from threading import Thread
 from urllib.parse import urlparse, urlunparse
 from dateutil.parser import parse
 
@@ -45,6 +49,7 @@ from interface.forges.base import (
 )
 from interface.error import F_D_FORGE_UNKNOWN_ERROR, Error
 from interface.forges.gitea import Gitea, HTMLClient
+from interface.db import DBComment
 from interface.forges.gitea.responses import GiteaComment
 from interface.forges.gitea.utils import get_issue_index, get_owner_repo_from_url
 
@@ -82,6 +87,7 @@ from tests.forges.gitea.test_utils import (
     ISSUE_URL,
     ISSUE_HTML_URL,
     SINGLE_ISSUE,
+    GET_ISSUES,
     COMMENTS,
     GET_COMMENTS_URL,
 )
@@ -154,6 +160,30 @@ def test_get_issues(requests_mock):
     signle_issue.repo_scope_id()
 
 
+def test_iter_issues(requests_mock):
+    """Test all pages of issues and comments are iterated over"""
+
+    g = Gitea()
+
+    url = f"{GITEA_HOST}/api/v1/repos/{REPOSITORY_OWNER}/{REPOSITORY_NAME}/issues"
+    requests_mock.get(f"{url}?page=1&limit=1", json=GET_ISSUES[0:1])
+    requests_mock.get(f"{url}?page=2&limit=1", json=GET_ISSUES[1:2])
+    requests_mock.get(f"{url}?page=3&limit=1", json=[])
+    issues = g.iter_issues(REPOSITORY_OWNER, REPOSITORY_NAME, page_size=1)
+    assert [issue["id"] for issue in issues] == [19, 18]
+
+    with pytest.raises(Error) as error:
+        list(g.iter_issues(NON_EXISTENT["owner"], NON_EXISTENT["repo"]))
+    assert pytest_expect_errror(error, F_D_REPOSITORY_NOT_FOUND)
+
+    requests_mock.get(f"{GET_COMMENTS_URL}?page=1&limit=1", json=COMMENTS[0:1])
+    requests_mock.get(f"{GET_COMMENTS_URL}?page=2&limit=1", json=COMMENTS[1:2])
+    requests_mock.get(f"{GET_COMMENTS_URL}?page=3&limit=1", json=[])
+    comments = list(g.iter_comments(ISSUE_HTML_URL, page_size=1))
+    assert comments == g.get_comments(ISSUE_HTML_URL)
+    assert [comment.id for comment in comments] == [c["id"] for c in COMMENTS]
+
+
 def test_get_comments(requests_mock):
     g = Gitea()
 
@@ -169,6 +199,26 @@ def test_get_comments(requests_mock):
     assert GiteaComment.from_issue(signle_issue) == comments
 
 
+def test_save_comments(app, requests_mock):
+    """Test comments of an issue are stored in bulk"""
+
+    with app.app_context():
+        issue = get_issue(
+            SINGLE_ISSUE["repository"]["owner"],
+            SINGLE_ISSUE["repository"]["name"],
+            SINGLE_ISSUE["number"],
+        )
+        comments = [
+            comment.to_db_comment(issue=issue)
+            for comment in Gitea().get_comments(ISSUE_HTML_URL)
+        ]
+        DBComment.save_many(comments)
+        assert [comment.comment_id for comment in comments] == [30, 31]
+        for comment in comments:
+            assert comment.id == DBComment.load_from_comment_url(comment.html_url).id
+            assert comment.belongs_to_issue.id == issue.id
+
+
 def test_create_issues(requests_mock):
 
     g = Gitea()
@@ -275,6 +325,17 @@ def test_html_web_client(requests_mock):
     )
     assert CSRF_SUCCESSFUL_REDIRECTION in urlparse(resp).path
 
+    # sessions are swapped in once they are authenticated, not logged in on
+    # while in use
+    session = html_client.session
+    html_client.login()
+    assert html_client.session is not session
+    session = html_client.session
+    requests_mock.post(f"{GITEA_HOST}/user/login", status_code=500)
+    with pytest.raises(Exception):
+        html_client.login()
+    assert html_client.session is session
+
 
 def test_fork(app, requests_mock):
     g = get_forge()
@@ -297,6 +358,34 @@ def test_git_cache_get_user(app, requests_mock):
     assert data.id == get_user(USER_INFO["username"]).id
 
 
+def test_git_cache_get_user_concurrent(app, requests_mock):
+    """Test concurrent lookups share the forge request, not the DB user"""
+
+    username = "flight"
+
+    def user_info(request, context):
+        time.sleep(0.2)
+        return {**USER_INFO, "id": 3, "login": username, "username": username}
+
+    forge = requests_mock.get(f"{GITEA_HOST}/api/v1/users/{username}", json=user_info)
+    get_forge()
+    users = []
+
+    def lookup():
+        with app.app_context():
+            users.append(get_user(username))
+
+    threads = [Thread(target=lookup) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert forge.call_count == 1
+    assert users[0] is not users[1]
+    assert users[0].id is not None
+    assert users[0].id == users[1].id
+
+
 def test_git_cache_get_repo(app, requests_mock):
     g = get_forge()
     data = get_user(USER_INFO["username"])
@@ -378,3 +467,40 @@ def test_git_cache_get_issue(app, requests_mock):
             issue_id,
         ).id
     )
+
+
+def test_get_notifications(client, requests_mock):
+    """Test notification details are fetched for every notification, in order"""
+
+    g = Gitea()
+    with open(Path(__file__).parent / "notifications.json") as f:
+        notifications = json.load(f)
+    requests_mock.get(f"{GITEA_HOST}/api/v1/notifications", json=notifications)
+    for n in notifications:
+        subject = n["subject"]
+        requests_mock.get(
+            subject["url"], json={"html_url": subject["url"].replace("/api/v1", "")}
+        )
+        if len(subject["latest_comment_url"]) != 0:
+            requests_mock.get(
+                subject["latest_comment_url"],
+                json={
+                    "id": 9,
+                    "body": "comment",
+                    "updated_at": n["updated_at"],
+                    "user": {"login": REPOSITORY_OWNER},
+                    "pull_request_url": "",
+                    "issue_url": subject["url"],
+                },
+            )
+
+    resp = g.get_notifications(since=parse("2021-10-23T16:31:07+05:30"))
+    assert [n.id for n in resp.notifications] == [n["id"] for n in notifications]
+    for (n, rn) in zip(notifications, resp.notifications):
+        subject = n["subject"]
+        assert rn.web_url == subject["url"].replace("/api/v1/repos", "")
+        if subject["type"] == "Pull":
+            assert rn.pr_url == subject["url"].replace("/api/v1", "")
+        elif len(subject["latest_comment_url"]) != 0:
+            assert rn.comment.id == 9
+            assert rn.comment.url == subject["url"]
@@ -84,6 +84,9 @@ def test_base_forge():
     with pytest.raises(NotImplementedError) as _:
         forge.get_issues("", "")
 
+    with pytest.raises(NotImplementedError) as _:
+        forge.iter_issues("", "")
+
     with pytest.raises(NotImplementedError) as _:
         issue = CreateIssue(
             title="",
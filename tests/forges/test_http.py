@@ -0,0 +1,112 @@
+""" Test interface handlers"""
+# Interface ---  API-space federation for software forges
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Lock
+
+import pytest
+
+from interface.forges.http import (
+    get_session,
+    map_concurrently,
+    paginate,
+    set_default_headers,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+
+def test_session(requests_mock):
+    """Test sessions are shared per host and apply defaults to every request"""
+
+    session = get_session("https://forge.example.org/api/v1/users/foo")
+    assert session is get_session("https://forge.example.org/api/v1/repos/foo/bar")
+    assert session is not get_session("https://other.example.org/api/v1/users/foo")
+    assert session is not get_session("http://forge.example.org/api/v1/users/foo")
+
+    set_default_headers("https://forge.example.org", {"Authorization": "token foo"})
+    url = "https://forge.example.org/api/v1/users/foo"
+    requests_mock.get(url, json={})
+    session.get(url, headers={"Accept": "application/json"})
+    request = requests_mock.last_request
+    assert request.headers["Authorization"] == "token foo"
+    assert request.headers["Accept"] == "application/json"
+    assert request.timeout == (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+    session.get(url, timeout=1)
+    assert requests_mock.last_request.timeout == 1
+
+
+def test_map_concurrently():
+    """Test items are processed in parallel and results keep their order"""
+
+    active = []
+    peak = []
+    lock = Lock()
+
+    def fn(item):
+        with lock:
+            active.append(item)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(item)
+        return item * 2
+
+    items = list(range(10))
+    assert map_concurrently(fn, items, workers=4) == [item * 2 for item in items]
+    assert max(peak) == 4
+
+    def fail(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    with pytest.raises(ValueError):
+        map_concurrently(fail, items, workers=4)
+
+
+def test_paginate(requests_mock):
+    """Test pages are followed through Link headers and by counting items"""
+
+    url = "https://forge.example.org/api/v1/repos/foo/bar/issues"
+
+    def link(page: int) -> dict:
+        return {"Link": f'<{url}?page={page}&limit=2>; rel="next"'}
+
+    requests_mock.get(f"{url}?page=1", json=[1, 2], headers=link(2))
+    requests_mock.get(f"{url}?page=2", json=[3, 4], headers=link(3))
+    requests_mock.get(f"{url}?page=3", json=[5], headers={"Link": ""})
+    for prefetch in [True, False]:
+        pages = paginate(url, page_size=2, prefetch=prefetch)
+        assert [r.json() for r in pages] == [[1, 2], [3, 4], [5]]
+    assert requests_mock.last_request.qs == {"page": ["3"], "limit": ["2"]}
+
+    # forge doesn't send Link headers
+    url = "https://forge.example.org/api/v1/repos/foo/bar/comments"
+    requests_mock.get(f"{url}?page=1", json=[1, 2])
+    requests_mock.get(f"{url}?page=2", json=[])
+    assert [r.json() for r in paginate(url, page_size=2)] == [[1, 2], []]
+
+    # caller stops early: nothing past the prefetched page is requested
+    requests_mock.reset_mock()
+    url = "https://forge.example.org/api/v1/repos/foo/bar/issues"
+    for page in paginate(url, page_size=2):
+        assert page.json() == [1, 2]
+        break
+    assert requests_mock.call_count <= 2
+
+    requests_mock.get(f"{url}?page=1", status_code=404)
+    assert [r.status_code for r in paginate(url, page_size=2)] == [404]
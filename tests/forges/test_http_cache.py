@@ -0,0 +1,67 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+
+from interface.forges.http import ForgeSession
+from interface.forges.http_cache import HTTPCache, get_http_cache
+
+
+def test_http_cache(app, requests_mock, tmp_path):
+    """Test responses are revalidated and served from cache on 304"""
+
+    assert get_http_cache() is None
+    assert os.path.dirname(app.config["HTTP_CACHE"]) == app.instance_path
+
+    session = ForgeSession(cache=HTTPCache(str(tmp_path / "http-cache.db"), 64))
+    url = "https://forge.example.org/api/v1/users/foo"
+    requests_mock.get(url, json={"login": "foo"}, headers={"ETag": '"v1"'})
+    assert session.get(url).json() == {"login": "foo"}
+    assert "If-None-Match" not in requests_mock.last_request.headers
+
+    requests_mock.get(url, status_code=304, headers={"ETag": '"v1"'})
+    resp = session.get(url)
+    assert requests_mock.last_request.headers["If-None-Match"] == '"v1"'
+    assert resp.status_code == 200
+    assert resp.json() == {"login": "foo"}
+    assert resp.headers["ETag"] == '"v1"'
+
+    date = "Sat, 18 Oct 2026 10:00:00 GMT"
+    requests_mock.get(url, json={"login": "bar"}, headers={"Last-Modified": date})
+    assert session.get(url).json() == {"login": "bar"}
+    session.get(url)
+    assert requests_mock.last_request.headers["If-Modified-Since"] == date
+    assert "If-None-Match" not in requests_mock.last_request.headers
+
+    # responses without validators, and those that aren't GETs, aren't cached
+    other = "https://forge.example.org/api/v1/users/baz"
+    requests_mock.get(other, json={"login": "baz"})
+    requests_mock.post(url, json={}, headers={"ETag": '"v2"'})
+    session.get(other)
+    session.post(url)
+    assert session.cache.get(other) is None
+    assert session.cache.get(url).last_modified == date
+
+    # least recently used response is evicted once bodies exceed 64 bytes
+    urls = [f"https://forge.example.org/api/v1/users/{i}" for i in range(3)]
+    for u in urls:
+        requests_mock.get(u, text="x" * 30, headers={"ETag": '"v1"'})
+        session.get(u)
+    assert session.cache.get(url) is None
+    assert session.cache.get(urls[0]) is None
+    assert session.cache.get(urls[1]) is not None
+    assert session.cache.get(urls[2]) is not None
+    assert session.cache.total == 60
+    assert HTTPCache(session.cache.path, 64).total == 60
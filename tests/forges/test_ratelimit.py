@@ -0,0 +1,112 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Thread
+
+import pytest
+from requests import Response
+
+from interface.error import F_D_FORGE_RATE_LIMITED, Error
+from interface.forges.http import ForgeSession
+from interface.forges.ratelimit import RateLimiter, retry_after
+
+from tests.test_errors import pytest_expect_errror
+
+
+def test_rate_limiter():
+    """Test requests are paced, writes go first and forge limits are obeyed"""
+
+    limiter = RateLimiter(rate=20, burst=2)
+    start = time.monotonic()
+    limiter.acquire()
+    limiter.acquire()
+    assert time.monotonic() - start < 0.04
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.04
+
+    order = []
+
+    def request(write: bool):
+        limiter.acquire(write=write)
+        order.append(write)
+
+    reader = Thread(target=request, args=(False,))
+    reader.start()
+    time.sleep(0.01)
+    writer = Thread(target=request, args=(True,))
+    writer.start()
+    reader.join()
+    writer.join()
+    assert order == [True, False]
+
+    resp = Response()
+    resp.headers["X-RateLimit-Remaining"] = "0"
+    resp.headers["X-RateLimit-Reset"] = str(time.time() + 0.2)
+    limiter.update(resp)
+    assert limiter.rate < 20
+    start = time.monotonic()
+    limiter.acquire(write=True)
+    assert time.monotonic() - start >= 0.15
+
+    # pauses asked for by the forge are bounded
+    limiter = RateLimiter(rate=20, burst=2, max_pause=0.2)
+    resp = Response()
+    resp.headers["X-RateLimit-Remaining"] = "0"
+    resp.headers["X-RateLimit-Reset"] = str(time.time() + 3600)
+    limiter.update(resp)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start < 1
+    limiter.pause(3600)
+    limiter.acquire()
+    assert time.monotonic() - start < 2
+
+    resp = Response()
+    resp.headers["Retry-After"] = "2"
+    assert retry_after(resp) == 2
+    resp.headers["Retry-After"] = "Sat, 18 Oct 2036 10:00:00 GMT"
+    assert retry_after(resp) > 0
+    resp.headers["Retry-After"] = "soon"
+    assert retry_after(resp) is None
+
+
+def test_retry_throttled(requests_mock):
+    """Test throttled requests are retried"""
+
+    session = ForgeSession(limiter=RateLimiter(rate=100, burst=10), retries=2)
+    url = "https://forge.example.org/api/v1/repos/foo/bar/issues"
+    throttled = {"status_code": 429, "headers": {"Retry-After": "0"}}
+    requests_mock.get(url, [throttled, {"json": []}])
+    assert session.get(url).status_code == 200
+    assert requests_mock.call_count == 2
+
+    requests_mock.get(url, [throttled, throttled, throttled, {"json": []}])
+    assert session.get(url).status_code == 429
+    assert requests_mock.call_count == 5
+
+    # writes aren't retried when the forge may have carried them out
+    requests_mock.post(url, [{"status_code": 503}, {"json": {}}])
+    assert session.post(url).status_code == 503
+    requests_mock.post(url, [throttled, {"json": {}}])
+    assert session.post(url).status_code == 200
+
+    # forge asks to wait for longer than we are willing to block for
+    requests_mock.get(url, [{"status_code": 429, "headers": {"Retry-After": "3600"}}])
+    start = time.monotonic()
+    with pytest.raises(Error) as error:
+        session.get(url)
+    assert pytest_expect_errror(error, F_D_FORGE_RATE_LIMITED)
+    assert time.monotonic() - start < 1
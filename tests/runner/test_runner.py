@@ -12,11 +12,14 @@
 # GNU Affero General Public License for more details.
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import sqlite3
 from datetime import datetime
+from threading import Event, Thread
 
 from dateutil.parser import parse as date_parse
 
 from interface.app import create_app
+from interface.db import get_db
 from interface.runner import runner
 
 from tests.test_utils import register_ns
@@ -37,3 +40,50 @@ def test_supported_version(app, client, requests_mock):
     now = datetime.now()
     worker._update_time(now)
     assert date_parse(worker.get_last_run()) == now
+
+
+def test_run_job(app, monkeypatch):
+    """Test jobs don't hold the write lock while they talk to forges"""
+
+    stalled = Event()
+    resume = Event()
+
+    class Job:
+        def run(self):
+            stalled.set()
+            resume.wait(5)
+
+        def save(self):
+            get_db().execute(
+                "UPDATE interface_jobs_run SET last_run = 'job' WHERE this_interface_url = 'a';"
+            )
+
+    monkeypatch.setattr(runner, "resolve_notification", lambda n: Job())
+
+    def job():
+        with app.app_context():
+            runner.run_job(None)
+
+    with app.app_context():
+        conn = get_db()
+        conn.execute(
+            """
+            INSERT INTO interface_jobs_run (this_interface_url, last_run)
+            VALUES ('a', 'b');
+            """
+        )
+        conn.commit()
+
+    thread = Thread(target=job)
+    thread.start()
+    assert stalled.wait(5)
+    other = sqlite3.connect(app.config["DATABASE"], timeout=0.1)
+    other.execute("UPDATE interface_jobs_run SET last_run = 'web' WHERE this_interface_url = 'a';")
+    other.commit()
+    resume.set()
+    thread.join()
+    last_run = other.execute(
+        "SELECT last_run FROM interface_jobs_run WHERE this_interface_url = 'a';"
+    ).fetchone()[0]
+    assert last_run == "job"
+    other.close()
@@ -27,3 +27,29 @@ def test_auth():
         keypair.private_key()
         == RSAKeyPair.load_private_from_str(keypair.private_key()).private_key()
     )
+
+
+def test_lazy_keypair(monkeypatch):
+    """Test stored keys are parsed only when the private key is needed"""
+    pem = RSAKeyPair.generate().private_key()
+
+    parsed = []
+    load_pem_private_key = serialization.load_pem_private_key
+
+    def count_parse(*args, **kwargs):
+        parsed.append(1)
+        return load_pem_private_key(*args, **kwargs)
+
+    monkeypatch.setattr(serialization, "load_pem_private_key", count_parse)
+
+    keypair = RSAKeyPair.from_pem(pem)
+    assert keypair.private_key() == pem
+    assert len(parsed) == 0
+
+    public_key = keypair.to_json_key()
+    assert len(parsed) == 1
+    assert keypair.to_json_key() == public_key
+    assert len(parsed) == 1
+    assert RSAKeyPair.load_public_from_str(public_key).public_numbers() == (
+        keypair.key.public_key().public_numbers()
+    )
@@ -0,0 +1,96 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Thread, Event
+
+import pytest
+
+from interface.cache import Cache, MemoryBackend, RedisBackend, REDIS_URL
+
+
+def get_backends():
+    backends = [MemoryBackend()]
+    try:
+        backend = RedisBackend(REDIS_URL)
+        backend.redis.ping()
+        backends.append(backend)
+    except Exception:
+        pass
+    return backends
+
+
+@pytest.mark.parametrize("backend", get_backends())
+def test_cache(backend):
+    """Test TTL, stale-while-revalidate and recompute lock"""
+
+    backend.clear()
+    cache = Cache(backend, stale_ttl=10, lock_timeout=5)
+    key = cache.key("test", "counter")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute(key, compute, ttl=1) == 1
+    assert cache.get_or_compute(key, compute, ttl=1) == 1
+    assert len(calls) == 1
+
+    time.sleep(2.1)
+    # stale value is served while someone else is recomputing it
+    assert backend.lock(key, 5)
+    assert cache.get_or_compute(key, compute, ttl=1) == 1
+    backend.unlock(key)
+    assert cache.get_or_compute(key, compute, ttl=1) == 2
+
+    # concurrent misses compute the value once
+    cache.delete(key)
+    calls.clear()
+    started = Event()
+
+    def slow_compute():
+        started.set()
+        time.sleep(0.3)
+        return compute()
+
+    results = []
+    threads = [
+        Thread(
+            target=lambda: results.append(cache.get_or_compute(key, slow_compute, 10))
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 5
+    assert len(calls) == 1
+    backend.clear()
+
+
+def test_memory_backend_size():
+    """Test least recently used values are evicted from a full memory backend"""
+
+    backend = MemoryBackend(size=2)
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    assert backend.get("a") == 1
+    backend.set("c", 3, 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+    assert len(backend.entries) == 2
@@ -16,13 +16,31 @@ import sqlite3
 
 import pytest
 from interface.db import get_db
+from interface.db.conn import close_pool
 
 
 def test_get_close_db(app):
     with app.app_context():
         db = get_db()
         assert db is get_db()
+        assert db.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        db.execute(
+            "INSERT INTO interfaces (url) VALUES (?);", ("https://rollback.example.com",)
+        )
 
+    # connection is returned to the pool and reused by the next app context
+    with app.app_context():
+        assert get_db() is db
+        # uncommitted changes are rolled back when the connection is released
+        assert (
+            db.execute(
+                "SELECT ID FROM interfaces WHERE url = ?;",
+                ("https://rollback.example.com",),
+            ).fetchone()
+            is None
+        )
+
+    close_pool(app.config["DATABASE"])
     with pytest.raises(sqlite3.ProgrammingError) as e:
         db.execute("SELECT 1")
 
@@ -40,3 +58,8 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=["migrate"])
     assert "applied" in result.output
     assert Recorder.called
+
+
+def test_backfill_active_users_command(runner):
+    result = runner.invoke(args=["backfill-active-users"])
+    assert "Added 0 daily active user records" in result.output
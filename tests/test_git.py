@@ -14,6 +14,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from threading import Thread
+
 from interface.settings import settings
 
 from interface.git import Git, get_forge
@@ -32,3 +34,21 @@ def test_git(app, client, requests_mock):
 
 
 #    git.git_clone(UPSTREAM)
+
+
+def test_forge_singleton(app, requests_mock):
+    """Test forge client is set up once and shared across app contexts and threads"""
+
+    with app.app_context():
+        git = get_forge()
+    calls = requests_mock.call_count
+
+    shared = []
+    thread = Thread(target=lambda: shared.append(get_forge()))
+    thread.start()
+    thread.join()
+    with app.app_context():
+        shared.append(get_forge())
+
+    assert all([forge is git for forge in shared])
+    assert requests_mock.call_count == calls
@@ -47,3 +47,31 @@ def test_issue_actor(client, requests_mock):
     resp = client.get(path, follow_redirects=False, headers={})
     assert resp.status_code == 302
     assert resp.headers["Location"] == issue.html_url
+
+
+def test_issue_actor_cache(client, requests_mock):
+    """Test issue actor document is served with ETag and refreshed on save"""
+
+    owner = SINGLE_ISSUE["repository"]["owner"]
+    repo = SINGLE_ISSUE["repository"]["name"]
+    issue_id = SINGLE_ISSUE["number"]
+    issue = get_issue(owner, repo, issue_id)
+    path = urlparse(issue.actor_url()).path
+
+    headers = {"Accept": CONTENT_TYPE_ACTIVITY_JSON}
+    resp = client.get(path, headers=headers)
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    assert "max-age" in resp.headers["Cache-Control"]
+
+    resp = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == etag
+
+    issue.description = "updated description"
+    issue.save()
+    resp = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.json["summary"] == "<p>updated description</p>"
@@ -0,0 +1,72 @@
+# Bridges software forges to create a distributed software development environment
+# Copyright © 2022 Aravinth Manivannan <realaravinth@batsense.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Thread, Event
+
+import pytest
+
+from interface.singleflight import SingleFlight
+
+
+def test_single_flight():
+    """Test concurrent callers share a single invocation and its error"""
+
+    group = SingleFlight(error_ttl=1)
+    started = Event()
+    release = Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    threads = [
+        Thread(target=lambda: results.append(group.do("key", work)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    # let the other callers join the flight in progress
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert group.do("key", work) == "result"
+    assert len(calls) == 2
+
+    def fail():
+        calls.append(1)
+        raise ValueError("forge unreachable")
+
+    calls.clear()
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            group.do("fail", fail)
+    assert len(calls) == 1
+    time.sleep(1.1)
+    with pytest.raises(ValueError):
+        group.do("fail", fail)
+    assert len(calls) == 2
+
+    group.forget("fail")
+    assert group.do("fail", lambda: "recovered") == "recovered"
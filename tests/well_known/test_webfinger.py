@@ -24,6 +24,7 @@ from tests.forges.gitea.test_utils import (
     ISSUE_URL,
     SINGLE_ISSUE,
     NON_EXISTENT,
+    GITEA_HOST,
 )
 
 
@@ -54,3 +55,30 @@ def test_get_webfinger(client, requests_mock):
         assert data == json.loads(json.dumps(actor.webfinger()))
         assert resp.status_code == 200
         assert resp.headers["Content-Type"] == JRD_JSON
+
+
+def test_webfinger_cache(client, requests_mock, monkeypatch):
+    """Test webfinger responses are served from cache"""
+
+    # JRD is cached when the actor is saved
+    user = get_user(REPOSITORY_OWNER)
+
+    def get_user_stub(username):
+        raise AssertionError("actor loaded")
+
+    monkeypatch.setattr("interface.well_known.webfinger.get_user", get_user_stub)
+    resp = client.get(f"/.well-known/webfinger?resource={user.webfinger_subject()}")
+    assert resp.status_code == 200
+    assert resp.json == json.loads(json.dumps(user.webfinger()))
+    monkeypatch.undo()
+
+    # subjects the forge reports as missing aren't looked up again
+    missing = requests_mock.get(
+        f"{GITEA_HOST}/api/v1/users/{NON_EXISTENT['owner']}", json={}, status_code=404
+    )
+    resource = f"acct:{NON_EXISTENT['owner']}@{INTERFACE_DOMAIN}"
+    for _ in range(3):
+        resp = client.get(f"/.well-known/webfinger?resource={resource}")
+        assert resp.status_code == 404
+        assert resp.json["errcode"] == "F_D_USER_NOT_FOUND"
+    assert missing.call_count == 1